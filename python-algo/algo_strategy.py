@@ -3,7 +3,6 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
 
 
 """
@@ -42,7 +41,12 @@ class AlgoStrategy(gamelib.AlgoCore):
         MP = 1
         SP = 0
         # This is a good place to do initial setup
-        self.scored_on_locations = []
+        # Counts where we get scored on, and other action frame events, in fixed size per-tile counters
+        self.events = gamelib.EventAggregator()
+        # Only frames with breaches are decoded and passed to on_frame_events
+        self.subscribe_frame_events("breach")
+        # Buffer warnings and gamelib.log messages, writing them once per turn with at most 20 per category
+        self.enable_debug_log()
 
     def on_turn(self, turn_state):
         """
@@ -56,6 +60,8 @@ class AlgoStrategy(gamelib.AlgoCore):
         game_state.attempt_spawn(DEMOLISHER, [24, 10], 3)
         gamelib.debug_write('Performing turn {} of your custom algo strategy'.format(game_state.turn_number))
         game_state.suppress_warnings(True)  #Comment or remove this line to enable warnings.
+        # Fold last turn's action frame events into the history before using them
+        self.events.end_turn()
 
         self.starter_strategy(game_state)
 
@@ -120,9 +126,9 @@ class AlgoStrategy(gamelib.AlgoCore):
         """
         This function builds reactive defenses based on where the enemy scored on us from.
         We can track where the opponent scored by looking at events in action frames 
-        as shown in the on_action_frame function
+        as shown in the on_frame_events function. Locations scored on most often come first.
         """
-        for location in self.scored_on_locations:
+        for location in self.events.locations(gamelib.events.BREACHES, player_index=1):
             # Build turret one space above so that it doesn't block our own edge spawn locations
             build_location = [location[0] + 2, location[1] + 2]
             game_state.attempt_spawn(TURRET, build_location)
@@ -181,16 +187,17 @@ class AlgoStrategy(gamelib.AlgoCore):
                 if (game_state.can_spawn(SUPPORT, [i, 12])):
                     game_state.attempt_spawn(SUPPORT, [i, 12])
     
-    def on_action_frame(self, turn_string):
+    def on_frame_events(self, turn_info, events):
         """
-        This is the action frame of the game. This function could be called 
-        hundreds of times per turn and could slow the algo down so avoid putting slow code here.
+        This is called for action frames containing the events we subscribed to in on_game_start.
+        Action frames could arrive hundreds of times per turn, subscribing means frames without 
+        breaches are skipped cheaply instead of being decoded here. Use on_action_frame instead if 
+        you need every frame in full. 
         Processing the action frames is complicated so we only suggest it if you have time and experience.
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
-        events = state["events"]
+        self.events.add_events(events)
         breaches = events["breach"]
         for breach in breaches:
             location = breach[0]
@@ -198,9 +205,8 @@ class AlgoStrategy(gamelib.AlgoCore):
             # When parsing the frame data directly, 
             # 1 is integer for yourself, 2 is opponent (StarterKit code uses 0, 1 as player_index instead)
             if not unit_owner_self:
-                gamelib.debug_write("Got scored on at: {}".format(location))
-                self.scored_on_locations.append(location)
-                gamelib.debug_write("All locations: {}".format(self.scored_on_locations))
+                # gamelib.log only formats messages it keeps, and writes them once per turn if enable_debug_log was called
+                gamelib.log.info("breach", "Got scored on at: {}", location)
 
     def offensive_strategy(self, game_state):
         interceptors = [[0, 13], [27, 13]]
@@ -13,17 +13,68 @@ Investigating it is useful for any player that wants to access information about
 The AlgoCore class in algocore.py handles communication with the game engine, and forms the bones of an algo. AlgoStrategy inherits from it. 
 Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. \n
 
+The AsyncAlgoCore class in async_algocore.py is a drop-in replacement for AlgoCore that reads engine messages with asyncio 
+while handlers run, accepts coroutine handlers and skips stale action frames when it falls behind. \n
+
 The Navigation class in navigation.py contains functions related to path-finding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
+The CommandEncoder class in commands.py queues builds and deploys for GameState, serializing each entry as it is added 
+so submit_turn sends both lines with a single write. It can also validate the payload before it is sent. \n
+
+The TurnBudget class in budget.py tracks how much of the turn's time allowance has been spent, AlgoCore restarts it as self.budget every turn. 
+AnytimeSearch uses it to deepen a search iteratively while always keeping the best plan found so far ready to submit. \n
+
+The BackgroundPrecompute class in background.py uses the idle time during action frames to compute paths, threat maps 
+and other data for the board expected next turn. AlgoCore hands the results to on_turn as self.precomputed. \n
+
+The TurnMetrics class in metrics.py records per-turn latency (parsing, on_turn, pathfinding, spawning, submitting, action frames) 
+to a JSON lines file when enabled with AlgoCore.enable_metrics(). \n
+
+The SlowTurnProfiler class in profiling.py runs on_turn under cProfile after a slow turn and saves the stats to disk, 
+enable it with AlgoCore.enable_slow_turn_profiling(). \n
+
+The EventAggregator class in events.py reduces action frame events to fixed size per-tile counters of breaches, 
+structure damage, deaths and damage dealt per spawn point, with a decayed history across turns. \n
+
+The ParallelEvaluator class in evaluator.py keeps a pool of worker processes warm for the whole game. 
+It can be used to score many candidate plans against the current game state in parallel while respecting a deadline. \n
+
+The BatchSimulator class in simulation.py simulates many candidate attacks against the current defence at once using numpy. 
+It is not imported by default, use 'from gamelib.simulation import BatchSimulator' if numpy is available. \n
+
+The ResourceProjection class in resources.py projects MP and SP for both players over the next turns in one pass, 
+so any horizon can be looked up in constant time. It also requires numpy and must be imported explicitly. \n
+
+The ReplayFile class in replay.py streams the frames of a .replay file and builds a GameState for any of them, 
+from either player's point of view, so analysis tools can use the same queries as an algo. \n
+
+The replay_transcript function in transcript.py feeds a transcript recorded with AlgoCore.record_transcript() back 
+to an algo offline and captures the commands it sends, useful for benchmarks and regression checks. \n
+
+The DebugLog class in log.py buffers warnings and gamelib.log messages, filters them by level, rate limits each category 
+and writes them once per turn. Enable it with AlgoCore.enable_debug_log(). \n
+
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
 
 from .algocore import AlgoCore
+from .async_algocore import AsyncAlgoCore
 from .util import debug_write
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .commands import CommandEncoder
+from .evaluator import ParallelEvaluator
+from .events import EventAggregator
+from .budget import TurnBudget, TurnBudgetExceeded, AnytimeSearch
+from .background import BackgroundPrecompute
+from .metrics import TurnMetrics
+from .profiling import SlowTurnProfiler
+from .transcript import replay_transcript
+from .replay import ReplayFile, ReplayFrame
+from .log import DebugLog
+from . import log
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "async_algocore", "game_state", "game_map", "navigation", "unit", "util", "evaluator", "budget", "background", "metrics", "profiling", "transcript", "replay", "log", "commands", "events"]
  
\ No newline at end of file
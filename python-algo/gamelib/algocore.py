@@ -1,7 +1,13 @@
 import json
+import time
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .budget import TurnBudget
+from .metrics import TurnMetrics
+from .profiling import SlowTurnProfiler
+from . import metrics
+from . import log
+from .util import get_command, debug_write, BANNER_TEXT, send_commands, get_turn_info, has_events, decode_events, start_recording, stop_recording
 
 class AlgoCore(object):
     """
@@ -10,10 +16,86 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * budget (:obj: TurnBudget): time budget for the current turn, restarted whenever a turn message arrives
+        * background (:obj: BackgroundPrecompute): optional, set it in on_game_start to precompute data during action frames
+        * precomputed (dict): results collected from background for the current turn, empty if none matched
+        * persistent_state (bool): if True, one GameState is kept for the whole game and updated from action frames
+        * game_state (:obj: GameState): the persistent GameState, only maintained when persistent_state is True
+        * frame_subscriptions (list): event kinds passed to subscribe_frame_events
+        * metrics (:obj: TurnMetrics): per-turn latency metrics, None unless enable_metrics was called
+        * profiler (:obj: SlowTurnProfiler): profiles turns after slow ones, None unless enable_slow_turn_profiling was called
+        * debug_log (:obj: DebugLog): buffered debug output flushed once per turn, None unless enable_debug_log was called
 
     """
     def __init__(self):
         self.config = None
+        self.budget = None
+        self.background = None
+        self.precomputed = {}
+        self.persistent_state = False
+        self.game_state = None
+        self.frame_subscriptions = []
+        self.metrics = None
+        self.profiler = None
+        self.debug_log = None
+
+    def enable_metrics(self, path="turn_metrics.jsonl"):
+        """
+        Record per-turn latency metrics and append them to a JSON lines file.
+        Records message parse time, GameState parse time, on_turn time, pathfinding calls and time,
+        can_spawn and attempt_spawn calls, submit time and action frame handling time.
+        The file is written once per turn and never to stdout. Can be called in __init__ or on_game_start.
+
+        Args:
+            path: The file to append to
+
+        """
+        self.metrics = TurnMetrics(path)
+        metrics.active = self.metrics
+
+    def enable_debug_log(self, level=log.INFO, rate_limit=20):
+        """
+        Buffer debug output and write it once per turn, after on_turn returns.
+        Warnings from GameState and GameMap and anything logged with gamelib.log are kept if they are
+        at least level, and each category may log at most rate_limit messages per turn.
+        debug_write still writes immediately. Can be called in __init__ or on_game_start.
+
+        Args:
+            level: The lowest level kept, one of gamelib.log.DEBUG, INFO, WARNING and ERROR
+            rate_limit: Messages kept per category per turn, None for no limit
+
+        """
+        self.debug_log = log.DebugLog(level, rate_limit)
+        log.active = self.debug_log
+
+    def record_transcript(self, path="transcript.txt"):
+        """
+        Save every message the engine sends to a file, exactly as received.
+        Call it in __init__ so the config message is recorded too.
+        The file can be fed back to any algo offline with gamelib.transcript.replay_transcript.
+
+        Args:
+            path: The file to write, it is overwritten
+
+        """
+        start_recording(path)
+
+    def enable_slow_turn_profiling(self, threshold=None, directory="profiles", top=30):
+        """
+        Profile on_turn with cProfile whenever the previous turn took longer than threshold.
+        Each profiled turn writes turn_<n>.pstats and a turn_<n>.txt summary of the top functions to directory.
+        Turns that follow fast turns run without the profiler, so this costs almost nothing until a turn is slow.
+        Can be called in __init__ or on_game_start.
+
+        Args:
+            threshold: Seconds, defaults to half of the turn budget's soft limit
+            directory: Where profile files are written
+            top: How many functions to list in the text summaries
+
+        """
+        self.profiler = SlowTurnProfiler(threshold, directory, top)
+        if threshold is None and self.budget is not None:
+            self.profiler.threshold = self.budget.soft_limit / 2
 
     def on_game_start(self, config):
         """
@@ -30,9 +112,9 @@ class AlgoCore(object):
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
+        If persistent_state is True, self.game_state has already been reconciled with this turn and can be used instead of a new GameState.
         """
-        send_command("[]")
-        send_command("[]")
+        send_commands("[]", "[]")
     
     def on_action_frame(self, action_frame_game_state):
         """
@@ -43,6 +125,31 @@ class AlgoCore(object):
         """
         pass
 
+    def subscribe_frame_events(self, *kinds):
+        """
+        Only decode the action frame events you need.
+        Once you subscribe, on_frame_events is called instead of on_action_frame, and only for frames
+        where at least one of the subscribed event lists is non empty. Empty frames are skipped with a
+        cheap scan of the raw string, and only the subscribed event lists are decoded.
+
+        Args:
+            kinds: Event names, for example "breach", "death" or "damage"
+
+        """
+        for kind in kinds:
+            if kind not in self.frame_subscriptions:
+                self.frame_subscriptions.append(kind)
+
+    def on_frame_events(self, turn_info, events):
+        """
+        Called for action frames with subscribed events, see subscribe_frame_events.
+
+        Args:
+            turn_info: The frame's turnInfo list, [1, turn number, frame number]
+            events: A dict mapping each subscribed event kind to its list of events for this frame
+
+        """
+        pass
 
     def start(self):
         """ 
@@ -57,39 +164,119 @@ class AlgoCore(object):
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
             game_state_string = get_command()
-            if "replaySave" in game_state_string:
+            if not self._handle_message(game_state_string):
+                break
+
+    def _handle_message(self, game_state_string):
+        """
+        Handles one message from the engine, calling the matching handler.
+        Used by start() and by AsyncAlgoCore.
+
+        Returns:
+            False once the end of game message has been handled, True otherwise
+
+        """
+        if "replaySave" in game_state_string:
+            """
+            This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
+            """
+            parsed_config = json.loads(game_state_string)
+            self.budget = TurnBudget(parsed_config)
+            if self.profiler is not None and self.profiler.threshold is None:
+                self.profiler.threshold = self.budget.soft_limit / 2
+            self._call_handler(self.on_game_start, parsed_config)
+        elif "turnInfo" in game_state_string:
+            message_start = time.perf_counter() if self.metrics is not None else 0
+            turn_info = get_turn_info(game_state_string)
+            stateType = int(turn_info[0])
+            # Only decode the whole message if something needs it, action frames arrive hundreds of times per turn
+            state = None
+            if self.background is not None or self.persistent_state:
+                state = json.loads(game_state_string)
+            if self.metrics is not None and stateType == 0:
+                self.metrics.begin_turn(int(turn_info[1]))
+                self.metrics.add_time("parse", time.perf_counter() - message_start)
+            if stateType == 0:
                 """
-                This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
+                This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
+                deploy phase. Printing is handled by the provided functions.
                 """
-                parsed_config = json.loads(game_state_string)
-                self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
-                if stateType == 0:
-                    """
-                    This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
-                    deploy phase. Printing is handled by the provided functions.
-                    """
-                    self.on_turn(game_state_string)
-                elif stateType == 1:
-                    """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
-                    """
-                    self.on_action_frame(game_state_string)
-                elif stateType == 2:
-                    """
-                    This is the end game message. This means the game is over so break and finish the program.
-                    """
-                    debug_write("Got end state, game over. Stopping algo.")
-                    break
+                self.budget.start()
+                if self.background is not None:
+                    self.precomputed = self.background.collect(state)
+                if self.persistent_state:
+                    self.__update_persistent_state(game_state_string)
+                if self.metrics is not None:
+                    turn_start = time.perf_counter()
+                    self.__run_turn(int(turn_info[1]), game_state_string)
+                    self.metrics.add_time("on_turn", time.perf_counter() - turn_start)
                 else:
-                    """
-                    Something is wrong? Received an incorrect or improperly formatted string.
-                    """
-                    debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
+                    self.__run_turn(int(turn_info[1]), game_state_string)
+            elif stateType == 1:
+                """
+                If stateType == 1, this game_state_string string represents a single frame of an action phase
+                """
+                if self.background is not None:
+                    self.background.submit_frame(state)
+                if self.persistent_state and self.game_state is not None:
+                    self.game_state.apply_frame(state)
+                if not self.frame_subscriptions:
+                    self._call_handler(self.on_action_frame, game_state_string)
+                elif has_events(game_state_string, self.frame_subscriptions):
+                    self._call_handler(self.on_frame_events, turn_info, decode_events(game_state_string, self.frame_subscriptions))
+                if self.metrics is not None:
+                    self.metrics.add_frame(time.perf_counter() - message_start)
+            elif stateType == 2:
+                """
+                This is the end game message. This means the game is over so stop and finish the program.
+                """
+                if self.debug_log is not None:
+                    self.debug_log.flush()
+                debug_write("Got end state, game over. Stopping algo.")
+                if self.background is not None:
+                    self.background.stop()
+                if self.metrics is not None:
+                    self.metrics.close()
+                stop_recording()
+                return False
             else:
                 """
                 Something is wrong? Received an incorrect or improperly formatted string.
                 """
-                debug_write("Got unexpected string : {}".format(game_state_string))
+                debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
+        else:
+            """
+            Something is wrong? Received an incorrect or improperly formatted string.
+            """
+            debug_write("Got unexpected string : {}".format(game_state_string))
+        return True
+
+    def _call_handler(self, handler, *args):
+        """
+        Calls on_game_start, on_turn, on_action_frame or on_frame_events. AsyncAlgoCore overrides it to run coroutine handlers.
+        """
+        return handler(*args)
+
+    def __run_turn(self, turn_number, game_state_string):
+        """
+        Calls on_turn, through the slow turn profiler when it is enabled, then flushes the debug log.
+        """
+        try:
+            if self.profiler is None:
+                self._call_handler(self.on_turn, game_state_string)
+            else:
+                self.profiler.run(turn_number, self._call_handler, self.on_turn, game_state_string)
+        finally:
+            if self.debug_log is not None:
+                self.debug_log.flush()
+
+    def __update_persistent_state(self, game_state_string):
+        """
+        Builds the persistent GameState on the first turn and reconciles it with each later turn message.
+        """
+        if self.game_state is None:
+            self.game_state = GameState(self.config, game_state_string)
+        else:
+            corrections = self.game_state.reconcile(game_state_string)
+            if corrections:
+                debug_write("Persistent game state needed {} corrections on turn {}".format(corrections, self.game_state.turn_number))
@@ -0,0 +1,141 @@
+import os
+import sys
+import stat
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
+
+from .algocore import AlgoCore
+from .util import debug_write, BANNER_TEXT, get_turn_info, has_events, _record
+
+# Action frames can be far larger than asyncio's default 64KB line limit
+MESSAGE_LIMIT = 2 ** 26
+
+
+class AsyncAlgoCore(AlgoCore):
+    """
+    An AlgoCore that keeps reading engine messages while your handlers run. \n
+    Subclass it instead of AlgoCore, everything else works the same.
+
+    Engine messages are read by an asyncio task, so the stdin pipe never backs up while a
+    handler is busy. Messages are handled one at a time and in order on a worker thread,
+    so each turn's response is written before the next message is handled.
+    on_turn, on_action_frame and on_frame_events can be plain functions or coroutines
+    (async def), coroutines run on the event loop and can await other work.
+
+    When handlers fall behind, an action frame is skipped if a newer frame of the same turn
+    is already waiting. Frames with subscribed events are never skipped, and nothing is
+    skipped while persistent_state is True since every frame's events are needed.
+
+    Attributes :
+        * coalesce_frames (bool): Set to False to handle every action frame
+        * coalesced_frames (int): Number of action frames skipped so far
+
+    """
+    def __init__(self):
+        super().__init__()
+        self.coalesce_frames = True
+        self.coalesced_frames = 0
+        self._pending = collections.deque()
+        self._arrived = None
+        self._loop = None
+
+    def start(self):
+        """
+        Start the event loop, returns when the end of game message has been handled.
+        """
+        debug_write(BANNER_TEXT)
+        if not asyncio.run(self._run()):
+            # Same as AlgoCore, exit for cleanup if the engine closed stdin early
+            exit()
+
+    def _call_handler(self, handler, *args):
+        """
+        Calls a handler from the worker thread, running it on the event loop if it is a coroutine.
+        """
+        result = handler(*args)
+        if asyncio.iscoroutine(result):
+            return asyncio.run_coroutine_threadsafe(result, self._loop).result()
+        return result
+
+    async def _run(self):
+        """
+        Handles messages in order until the end of game message, returns False if stdin closed first.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._arrived = asyncio.Event()
+        reader = asyncio.ensure_future(self._read_messages())
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gamelib-handler")
+        try:
+            while True:
+                while not self._pending:
+                    self._arrived.clear()
+                    await self._arrived.wait()
+                message = self._pending.popleft()
+                if message == "":
+                    debug_write("Got EOF, parent game process must have died, exiting for cleanup")
+                    return False
+                if self._is_stale(message):
+                    self.coalesced_frames += 1
+                    continue
+                if not await self._loop.run_in_executor(executor, self._handle_message, message):
+                    return True
+        finally:
+            reader.cancel()
+            executor.shutdown(wait=False)
+
+    async def _read_messages(self):
+        """
+        Reads engine messages into the pending queue until stdin closes.
+        If reading fails (for example a line longer than MESSAGE_LIMIT) it stops as if stdin closed.
+        """
+        try:
+            stream = await self._open_stdin()
+            while True:
+                if stream is not None:
+                    message = (await stream.readline()).decode()
+                else:
+                    # stdin is not a pipe, for example a file or a transcript being replayed
+                    message = await self._loop.run_in_executor(None, sys.stdin.readline)
+                _record(message)
+                self._pending.append(message)
+                self._arrived.set()
+                if message == "":
+                    return
+        except Exception as e:
+            # Otherwise _run would wait forever for a message that never arrives
+            debug_write("Could not read engine message: {!r}".format(e))
+            self._pending.append("")
+            self._arrived.set()
+
+    async def _open_stdin(self):
+        """
+        Connects an asyncio stream to stdin, returns None if stdin cannot be read asynchronously.
+        """
+        try:
+            mode = os.fstat(sys.stdin.fileno()).st_mode
+        except (OSError, ValueError, AttributeError):
+            return None
+        if not (stat.S_ISFIFO(mode) or stat.S_ISSOCK(mode) or stat.S_ISCHR(mode)):
+            return None
+        stream = asyncio.StreamReader(limit=MESSAGE_LIMIT)
+        try:
+            await self._loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stream), sys.stdin)
+        except (ValueError, OSError, AttributeError, NotImplementedError):
+            return None
+        return stream
+
+    def _is_stale(self, message):
+        """
+        True if message is an action frame that can be skipped because a newer frame of the same turn is waiting.
+        """
+        if not self.coalesce_frames or self.persistent_state or not self._pending:
+            return False
+        newer = self._pending[0]
+        if '"turnInfo"' not in message or '"turnInfo"' not in newer:
+            return False
+        turn_info = get_turn_info(message)
+        newer_info = get_turn_info(newer)
+        if int(turn_info[0]) != 1 or int(newer_info[0]) != 1 or turn_info[1] != newer_info[1]:
+            return False
+        return not (self.frame_subscriptions and has_events(message, self.frame_subscriptions))
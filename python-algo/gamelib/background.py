@@ -0,0 +1,249 @@
+import copy
+import json
+import threading
+
+from .util import debug_write
+
+STRUCTURE_LISTS = [0, 1, 2]
+REMOVE_LIST = 6
+UPGRADE_LIST = 7
+
+
+def board_signature(state):
+    """A hashable summary of the structures in a parsed turn or frame message.
+    Structures flagged for removal are left out, since they will be gone by the next turn.
+
+    Args:
+        state: A parsed (json.loads) turn or action frame message
+
+    Returns:
+        A frozenset of (player_index, type_index, x, y, upgraded) tuples
+
+    """
+    signature = []
+    for player_index, key in enumerate(["p1Units", "p2Units"]):
+        units = state[key]
+        removed = set((int(u[0]), int(u[1])) for u in units[REMOVE_LIST]) if len(units) > REMOVE_LIST else set()
+        upgraded = set((int(u[0]), int(u[1])) for u in units[UPGRADE_LIST]) if len(units) > UPGRADE_LIST else set()
+        for type_index in STRUCTURE_LISTS:
+            for u in units[type_index]:
+                location = (int(u[0]), int(u[1]))
+                if location not in removed:
+                    signature.append((player_index, type_index) + location + (location in upgraded,))
+    return frozenset(signature)
+
+
+def predicted_turn_string(frame):
+    """Turns an action frame into the turn message we expect next turn.
+    Mobile units are dropped, structures flagged for removal are removed and the turn number is advanced.
+
+    Args:
+        frame: A parsed action frame message
+
+    Returns:
+        A serialized turn string that can be passed to GameState
+
+    """
+    predicted = copy.copy(frame)
+    for key in ["p1Units", "p2Units"]:
+        units = frame[key]
+        removed = set((int(u[0]), int(u[1])) for u in units[REMOVE_LIST]) if len(units) > REMOVE_LIST else set()
+        new_units = []
+        for type_index, unit_list in enumerate(units):
+            if type_index in STRUCTURE_LISTS:
+                new_units.append([u for u in unit_list if (int(u[0]), int(u[1])) not in removed])
+            elif type_index == UPGRADE_LIST:
+                new_units.append([u for u in unit_list if (int(u[0]), int(u[1])) not in removed])
+            else:
+                new_units.append([])
+        predicted[key] = new_units
+    turn_info = frame["turnInfo"]
+    predicted["turnInfo"] = [0, int(turn_info[1]) + 1, -1] + list(turn_info[3:])
+    predicted["events"] = {}
+    return json.dumps(predicted)
+
+
+def edge_paths(game_state):
+    """Precompute task: the path from every open friendly edge location.
+
+    Returns:
+        A dict mapping (x, y) spawn locations to the path find_path_to_edge returns
+
+    """
+    game_map = game_state.game_map
+    paths = {}
+    for location in game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT):
+        if not game_state.contains_stationary_unit(location):
+            paths[tuple(location)] = game_state.find_path_to_edge(location)
+    return paths
+
+
+def threat_map(game_state, player_index=0):
+    """Precompute task: how much damage per frame enemy structures deal to a mobile unit on each tile.
+
+    Returns:
+        A dict mapping (x, y) locations to the summed attackDamageWalker of the structures in range
+
+    """
+    threats = {}
+    for location in game_state.game_map:
+        damage = sum(unit.damage_i for unit in game_state.get_attackers(location, player_index))
+        if damage > 0:
+            threats[tuple(location)] = damage
+    return threats
+
+
+class BackgroundPrecompute:
+    """Speculatively computes next turn's expensive data while action frames play out
+
+    Register tasks with register(). AlgoCore hands every action frame to
+    submit_frame(), and a background thread builds the board it expects next turn
+    (the structures still standing in the latest frame) and runs every task on it.
+    When the next turn message arrives AlgoCore calls collect(), which returns the
+    results if the real board matches the predicted one and an empty dict otherwise.
+    The results are available as self.precomputed inside on_turn.
+
+    Tasks are called as fn(game_state) and run on a thread, so they should treat
+    the game_state as read only and must not write to stdout.
+
+    Attributes :
+        * config (JSON): The game config
+        * tasks (dict): Registered tasks, name to function
+        * hits (int): Number of turns the prediction matched
+        * misses (int): Number of turns the prediction did not match
+
+    """
+    def __init__(self, config):
+        """ Setup the precompute facility and start its worker thread
+
+        Args:
+            config: The game config
+
+        """
+        self.config = config
+        self.tasks = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._latest = None
+        self._generation = 0
+        self._stopped = False
+        self._cache_signature = None
+        self._cache = {}
+        self._thread = threading.Thread(target=self._run, name="gamelib-precompute", daemon=True)
+        self._thread.start()
+
+    def register(self, name, fn):
+        """Add a task, its result will be stored under name in the precomputed dict
+
+        Args:
+            name: The key for the result
+            fn: A function taking a GameState
+
+        """
+        with self._lock:
+            self.tasks[name] = fn
+            self._cache_signature = None
+
+    def submit_frame(self, frame):
+        """Hand a parsed action frame to the worker, called by AlgoCore for every frame
+
+        Args:
+            frame: A parsed action frame message
+
+        """
+        with self._lock:
+            self._latest = frame
+            self._idle.clear()
+        self._wake.set()
+
+    def collect(self, state):
+        """Get the precomputed results for the board of a turn message
+
+        Args:
+            state: The parsed turn message
+
+        Returns:
+            A dict of task results if the predicted board matched, otherwise an empty dict
+
+        """
+        signature = board_signature(state)
+        with self._lock:
+            self._latest = None
+            # Abandons any computation in progress, its turn has arrived so it would only slow on_turn down
+            self._generation += 1
+            if self._cache_signature is not None and self._cache_signature == signature:
+                self.hits += 1
+                return dict(self._cache)
+            self.misses += 1
+            return {}
+
+    def wait(self, timeout=None):
+        """Block until the worker has handled every submitted frame
+
+        Returns:
+            True if the worker is idle
+
+        """
+        return self._idle.wait(timeout)
+
+    def stop(self):
+        """Stop the worker thread
+        """
+        self._stopped = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                frame = self._latest
+                self._latest = None
+                generation = self._generation
+                tasks = list(self.tasks.items())
+            if frame is None or self._stopped:
+                self._set_idle()
+                continue
+
+            signature = board_signature(frame)
+            if signature == self._cache_signature:
+                self._set_idle()
+                continue
+
+            try:
+                results = self._compute(frame, signature, tasks, generation)
+            except Exception as e:
+                debug_write("Background precompute failed: {}".format(repr(e)))
+                results = None
+
+            if results is not None:
+                with self._lock:
+                    if generation == self._generation:
+                        self._cache_signature = signature
+                        self._cache = results
+            self._set_idle()
+
+    def _compute(self, frame, signature, tasks, generation):
+        """Runs every task on the predicted board, returns None if a newer board or the turn itself arrived first
+        """
+        from .game_state import GameState
+        game_state = GameState(self.config, predicted_turn_string(frame))
+        game_state.suppress_warnings(True)
+        results = {}
+        for name, fn in tasks:
+            with self._lock:
+                latest = self._latest
+                collected = generation != self._generation
+            if self._stopped or collected or (latest is not None and board_signature(latest) != signature):
+                return None
+            results[name] = fn(game_state)
+        return results
+
+    def _set_idle(self):
+        with self._lock:
+            if self._latest is None:
+                self._idle.set()
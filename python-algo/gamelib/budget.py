@@ -0,0 +1,146 @@
+import time
+
+
+class TurnBudgetExceeded(Exception):
+    """Raised by TurnBudget.check() when the soft budget for the turn is spent
+    """
+    pass
+
+
+class TurnBudget:
+    """Tracks how much of the turn's time allowance has been used
+
+    AlgoCore creates one from the config and restarts it every time a turn message
+    arrives, so it is available as self.budget inside on_turn. Search code can call
+    remaining() to plan work, expired() to poll, or check() to abort deep inside a
+    search by raising TurnBudgetExceeded.
+
+    Attributes :
+        * soft_limit (float): Seconds we allow ourselves per turn, a safety fraction of waitTimeBotSoft
+        * hard_limit (float): Seconds after which the engine stops waiting, from waitTimeBotMax
+        * started_at (float): time.perf_counter() value when the turn started
+
+    """
+    def __init__(self, config=None, safety=0.8, soft_limit=None, hard_limit=None):
+        """ Read the time limits from the config
+
+        Args:
+            config: The game config, the limits are read from its timingAndReplay section
+            safety: Fraction of waitTimeBotSoft to allow, leaves room for submitting the turn
+            soft_limit: Seconds to use instead of the config's soft limit
+            hard_limit: Seconds to use instead of the config's hard limit
+
+        """
+        timing = config.get("timingAndReplay", {}) if config else {}
+        if soft_limit is None:
+            soft_limit = safety * timing.get("waitTimeBotSoft", 5000) / 1000
+        if hard_limit is None:
+            hard_limit = timing.get("waitTimeBotMax", 35000) / 1000
+        self.soft_limit = min(soft_limit, hard_limit)
+        self.hard_limit = hard_limit
+        self.started_at = time.perf_counter()
+
+    def start(self):
+        """Restart the budget, called by AlgoCore when a turn message arrives
+        """
+        self.started_at = time.perf_counter()
+
+    def elapsed(self):
+        """Seconds since the turn started
+        """
+        return time.perf_counter() - self.started_at
+
+    def remaining(self, hard=False):
+        """Seconds left before the soft (or hard) limit, never negative
+        """
+        limit = self.hard_limit if hard else self.soft_limit
+        return max(0.0, limit - self.elapsed())
+
+    def deadline(self):
+        """The time.time() value at which the soft budget runs out, for APIs that take an absolute deadline
+        """
+        return time.time() + self.remaining()
+
+    def expired(self):
+        """True once the soft budget is spent
+        """
+        return self.elapsed() >= self.soft_limit
+
+    def check(self):
+        """Raise TurnBudgetExceeded if the soft budget is spent
+        """
+        if self.expired():
+            raise TurnBudgetExceeded("Turn budget of {:.2f}s spent".format(self.soft_limit))
+
+
+class AnytimeSearch:
+    """Iterative deepening that always has a plan ready to submit
+
+    Call run() with a search function taking (depth, budget) and returning a
+    (plan, score) pair. Depth is increased until the budget is spent, the next
+    iteration is predicted not to fit, or max_depth is reached. Search functions
+    can call budget.check() to abort an iteration early, in which case the best
+    plan from completed iterations is kept.
+
+    Attributes :
+        * budget (:obj: TurnBudget): The budget the search runs under
+        * best_plan: The best plan found so far, or the fallback plan
+        * best_score (float): The score of best_plan
+        * depth (int): The deepest completed iteration, 0 if none completed
+
+    """
+    def __init__(self, budget, fallback_plan=None, fallback_score=float('-inf')):
+        """ Setup the search
+
+        Args:
+            budget: A TurnBudget
+            fallback_plan: Returned if no iteration completes in time
+            fallback_score: The score of the fallback plan
+
+        """
+        self.budget = budget
+        self.best_plan = fallback_plan
+        self.best_score = fallback_score
+        self.depth = 0
+
+    def offer(self, plan, score):
+        """Keep plan if it beats the best one so far
+
+        Returns:
+            True if the plan became the best plan
+
+        """
+        if score is not None and score > self.best_score:
+            self.best_plan = plan
+            self.best_score = score
+            return True
+        return False
+
+    def run(self, search_fn, start_depth=1, max_depth=None, growth=3.0):
+        """Deepen iteratively until the budget is spent
+
+        Args:
+            search_fn: Called as search_fn(depth, budget), returns (plan, score)
+            start_depth: The first depth to search
+            max_depth: The deepest depth to search, unbounded if None
+            growth: Expected ratio between the cost of consecutive depths, used to skip iterations that will not fit
+
+        Returns:
+            The best plan found
+
+        """
+        depth = start_depth
+        last_cost = 0.0
+        while max_depth is None or depth <= max_depth:
+            if self.budget.expired() or last_cost * growth > self.budget.remaining():
+                break
+            iteration_start = time.perf_counter()
+            try:
+                plan, score = search_fn(depth, self.budget)
+            except TurnBudgetExceeded:
+                break
+            last_cost = time.perf_counter() - iteration_start
+            self.offer(plan, score)
+            self.depth = depth
+            depth += 1
+        return self.best_plan
@@ -0,0 +1,101 @@
+import json
+
+ARENA_SIZE = 28
+HALF_ARENA = 14
+
+
+class CommandEncoder:
+    """Builds the two lines of a turn submission as entries are queued
+
+    Each entry is serialized when it is added, so submitting only joins the pieces.
+    The output is identical to json.dumps of the build and deploy lists, which are
+    serialized directly if they were changed other than through add_build and add_deploy.
+    GameState keeps one as its queue of builds and deploys, see GameState.submit_turn.
+
+    Attributes :
+        * builds (list): Queued (unit_type, x, y) builds, including removals and upgrades
+        * deploys (list): Queued (unit_type, x, y) mobile unit deploys
+
+    """
+    def __init__(self):
+        self.builds = []
+        self.deploys = []
+        self._build_parts = []
+        self._deploy_parts = []
+        self._queued_builds = []
+        self._queued_deploys = []
+
+    def add_build(self, unit_type, x, y):
+        """Queue a structure, removal or upgrade
+        """
+        entry = (unit_type, x, y)
+        self.builds.append(entry)
+        self._queued_builds.append(entry)
+        self._build_parts.append('["{}", {}, {}]'.format(unit_type, x, y))
+
+    def add_deploy(self, unit_type, x, y):
+        """Queue a mobile unit
+        """
+        entry = (unit_type, x, y)
+        self.deploys.append(entry)
+        self._queued_deploys.append(entry)
+        self._deploy_parts.append('["{}", {}, {}]'.format(unit_type, x, y))
+
+    def clear(self):
+        """Empty both queues
+        """
+        del self.builds[:]
+        del self.deploys[:]
+        self._build_parts = []
+        self._deploy_parts = []
+        self._queued_builds = []
+        self._queued_deploys = []
+
+    def lines(self):
+        """The build and deploy lines to send to the engine
+
+        Returns:
+            A (build_line, deploy_line) pair of json strings
+
+        """
+        return self.__line(self.builds, self._queued_builds, self._build_parts), self.__line(self.deploys, self._queued_deploys, self._deploy_parts)
+
+    def __line(self, entries, queued, parts):
+        # The entries are the ones we serialized unless someone changed the list directly
+        if entries == queued:
+            return "[" + ", ".join(parts) + "]"
+        return json.dumps(entries)
+
+    def validate(self, config):
+        """Checks the queued entries against the rules the engine enforces on the payload
+
+        Args:
+            config: The game config, used for the unit shorthands
+
+        Returns:
+            A list of problems, empty if the payload is valid
+
+        """
+        shorthands = [unit["shorthand"] for unit in config["unitInformation"]]
+        build_types = set(shorthands[0:3] + shorthands[6:8])
+        deploy_types = set(shorthands[3:6])
+        problems = []
+        built = set()
+        for unit_type, x, y in self.builds:
+            if unit_type not in build_types:
+                problems.append("Build {} at [{}, {}] is not a structure, removal or upgrade".format(unit_type, x, y))
+            elif not self.__in_own_half(x, y):
+                problems.append("Build {} at [{}, {}] is outside your half of the arena".format(unit_type, x, y))
+            elif unit_type in shorthands[0:3]:
+                if (x, y) in built:
+                    problems.append("Build {} at [{}, {}] is on a location that is already being built on".format(unit_type, x, y))
+                built.add((x, y))
+        for unit_type, x, y in self.deploys:
+            if unit_type not in deploy_types:
+                problems.append("Deploy {} at [{}, {}] is not a mobile unit".format(unit_type, x, y))
+            elif not self.__in_own_half(x, y) or (x != HALF_ARENA - 1 - y and x != HALF_ARENA + y):
+                problems.append("Deploy {} at [{}, {}] is not on one of your edges".format(unit_type, x, y))
+        return problems
+
+    def __in_own_half(self, x, y):
+        return isinstance(x, int) and isinstance(y, int) and 0 <= y < HALF_ARENA and HALF_ARENA - 1 - y <= x <= HALF_ARENA + y
@@ -0,0 +1,210 @@
+import os
+import sys
+import time
+import queue
+import multiprocessing
+
+from .util import debug_write
+
+
+def _rebuild_state(config, snapshot):
+    """Rebuilds a GameState from a snapshot made by ParallelEvaluator.set_state
+    """
+    from . import game_state
+    serialized_string, build_stack, deploy_stack = snapshot
+    state = game_state.GameState(config, serialized_string)
+    state.suppress_warnings(True)
+    # The unit shorthands only exist once a GameState has read the config
+    for unit_type, x, y in build_stack:
+        if unit_type == game_state.UPGRADE:
+            state.attempt_upgrade([x, y])
+        elif unit_type == game_state.REMOVE:
+            state.attempt_remove([x, y])
+        else:
+            state.attempt_spawn(unit_type, [x, y])
+    for unit_type, x, y in deploy_stack:
+        state.attempt_spawn(unit_type, [x, y])
+    return state
+
+
+def _worker_main(worker_id, config, task_conn, result_queue):
+    """Main loop of a worker process.
+    Receives ('state', snapshot), ('task', batch_id, deadline, func, items) and ('stop',) messages.
+    """
+    # stdout is the engine protocol, anything a scoring function prints goes to stderr instead
+    sys.stdout = sys.stderr
+    snapshot = None
+    state = None
+    while True:
+        try:
+            message = task_conn.recv()
+        except EOFError:
+            break
+        kind = message[0]
+        if kind == 'state':
+            snapshot = message[1]
+            state = None
+        elif kind == 'task':
+            _, batch_id, deadline, func, items = message
+            if state is None and snapshot is not None:
+                state = _rebuild_state(config, snapshot)
+            for index, candidate in items:
+                if deadline is not None and time.time() >= deadline:
+                    result_queue.put((worker_id, batch_id, index, False, None))
+                    continue
+                try:
+                    result_queue.put((worker_id, batch_id, index, True, func(state, candidate)))
+                except Exception as e:
+                    result_queue.put((worker_id, batch_id, index, False, repr(e)))
+        elif kind == 'stop':
+            break
+
+
+class ParallelEvaluator:
+    """Scores candidate plans on a pool of warm worker processes
+
+    Start the pool once in on_game_start, ship the current state once per turn with
+    set_state, then fan scoring callbacks out with evaluate. Each worker rebuilds
+    the GameState from the snapshot the first time it needs it, so a turn costs one
+    state transfer per worker no matter how many candidates are scored.
+
+    The scoring function is called as func(game_state, candidate) and must be defined
+    at module level so it can be pickled. Candidates scored on the same worker share
+    one GameState, so copy it before calling attempt_spawn and friends.
+    Workers start as fresh processes that import your algo's modules, so the algo must
+    only be started under if __name__ == "__main__" (as the starter algo does). Anything
+    a scoring function prints goes to stderr.
+
+    Attributes :
+        * processes (int): The number of worker processes
+        * started (bool): Whether the workers are running
+
+    """
+    def __init__(self, processes=None):
+        """ Setup the evaluator, no processes are started until start() is called
+
+        Args:
+            processes: The number of worker processes, defaults to one less than the number of cores
+
+        """
+        self.processes = processes if processes else max(1, (os.cpu_count() or 2) - 1)
+        self.started = False
+        self._workers = []
+        self._connections = []
+        self._in_flight = []
+        self._results = None
+        self._batch_id = 0
+
+    def start(self, config):
+        """Start the worker processes
+
+        Args:
+            config: The game config, sent to each worker once
+
+        """
+        if self.started:
+            return
+        # Workers start from a clean process, forking could copy a lock or a half built GameState from another thread
+        method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        context = multiprocessing.get_context(method)
+        self._results = context.Queue()
+        for worker_id in range(self.processes):
+            parent_conn, child_conn = context.Pipe()
+            worker = context.Process(target=_worker_main, args=(worker_id, config, child_conn, self._results))
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+            self._connections.append(parent_conn)
+            self._in_flight.append(0)
+        self.started = True
+
+    def set_state(self, game_state):
+        """Send a snapshot of a GameState to every worker, call this once per turn
+
+        The snapshot is the turn string the state was built from plus any builds and
+        deploys already queued on it.
+
+        Args:
+            game_state: The GameState candidates should be scored against
+
+        """
+        snapshot = (game_state.serialized_string, list(game_state._build_stack), list(game_state._deploy_stack))
+        for conn in self._connections:
+            conn.send(('state', snapshot))
+
+    def evaluate(self, func, candidates, timeout=1.0, deadline=None, chunk_size=1):
+        """Score candidates in parallel, stopping at the deadline
+
+        Args:
+            func: A module level function called as func(game_state, candidate)
+            candidates: A list of candidates to score
+            timeout: Seconds to wait for results, ignored if deadline is given
+            deadline: An absolute time.time() value to stop collecting results at
+            chunk_size: The number of candidates sent to a worker at once
+
+        Returns:
+            A dict mapping the index of every candidate that finished in time to its result.
+            Candidates that raised an error or missed the deadline are left out.
+
+        """
+        if not self.started:
+            debug_write("ParallelEvaluator.evaluate called before start, scoring nothing")
+            return {}
+        if deadline is None:
+            deadline = time.time() + timeout
+
+        self._batch_id += 1
+        batch_id = self._batch_id
+        self._drain()
+
+        items = list(enumerate(candidates))
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        for chunk in chunks:
+            worker = self._in_flight.index(min(self._in_flight))
+            self._connections[worker].send(('task', batch_id, deadline, func, chunk))
+            self._in_flight[worker] += len(chunk)
+
+        results = {}
+        remaining = len(items)
+        while remaining > 0:
+            wait = deadline - time.time()
+            if wait <= 0:
+                break
+            try:
+                worker, result_batch, index, ok, value = self._results.get(timeout=wait)
+            except queue.Empty:
+                break
+            self._in_flight[worker] -= 1
+            if result_batch != batch_id:
+                continue
+            remaining -= 1
+            if ok:
+                results[index] = value
+            elif value is not None:
+                debug_write("Candidate {} failed: {}".format(index, value))
+        return results
+
+    def _drain(self):
+        """Discard results left over from earlier batches
+        """
+        while True:
+            try:
+                worker, _, _, _, _ = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._in_flight[worker] -= 1
+
+    def close(self):
+        """Stop the worker processes
+        """
+        for conn in self._connections:
+            try:
+                conn.send(('stop',))
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.join(timeout=1)
+        self._workers = []
+        self._connections = []
+        self._in_flight = []
+        self.started = False
@@ -0,0 +1,127 @@
+from array import array
+
+ARENA_SIZE = 28
+TILES = ARENA_SIZE * ARENA_SIZE
+
+BREACHES = "breaches"
+STRUCTURE_DAMAGE = "structure_damage"
+DEATHS = "deaths"
+SPAWN_DAMAGE = "spawn_damage"
+COUNTERS = [BREACHES, STRUCTURE_DAMAGE, DEATHS, SPAWN_DAMAGE]
+
+# The event lists EventAggregator reads, pass them to AlgoCore.subscribe_frame_events
+EVENT_KINDS = ["spawn", "attack", "selfDestruct", "damage", "death", "breach"]
+
+STRUCTURE_TYPE_INDICES = (0, 1, 2)
+
+
+class EventAggregator:
+    """Reduces action frame events to fixed size per-tile counters
+
+    Each counter is a flat array of 28x28 floats per player, so memory use is the same
+    on turn 1 and turn 100, and looking up a tile is a single index. Counters:
+
+        * BREACHES: breaches by a player's units, at the tile they scored from
+        * STRUCTURE_DAMAGE: damage taken by a player's structures, at the structure's tile
+        * DEATHS: a player's units destroyed at each tile, not counting structures they removed themselves
+        * SPAWN_DAMAGE: damage a player's mobile units dealt, at the tile they were spawned on
+
+    Events are added to the current turn's counters. end_turn() folds them into the history,
+    history = history * decay + turn, so old turns fade away unless decay is 1.
+
+    Feed it from on_frame_events after subscribing to EVENT_KINDS, or from on_action_frame
+    with add_frame. player_index is 0 for you and 1 for your opponent, like GameState.
+
+    Attributes :
+        * decay (float): How much of the history is kept each turn, between 0 and 1
+        * turns (int): Number of turns folded into the history
+
+    """
+    def __init__(self, decay=0.8):
+        """ Setup empty counters
+
+        Args:
+            decay: How much of the history is kept each turn, 1 keeps everything
+
+        """
+        self.decay = decay
+        self.turns = 0
+        self._turn = {name: [array('d', bytes(8 * TILES)) for _ in range(2)] for name in COUNTERS}
+        self._history = {name: [array('d', bytes(8 * TILES)) for _ in range(2)] for name in COUNTERS}
+        # Tiles with a nonzero value, so locations() does not scan the whole board
+        self._touched = {name: [set(), set()] for name in COUNTERS}
+        # Spawn tile of each mobile unit alive this action phase, cleared by end_turn
+        self._spawns = {}
+
+    def add_frame(self, frame):
+        """Add the events of a parsed action frame
+        """
+        self.add_events(frame.get("events", {}))
+
+    def add_events(self, events):
+        """Add a dict of event lists, like the one on_frame_events receives
+        """
+        for location, type_index, unit_id, owner in (e[:4] for e in events.get("spawn", ())):
+            if int(type_index) not in STRUCTURE_TYPE_INDICES:
+                self._spawns[unit_id] = location
+        for event in events.get("attack", ()):
+            self.__add_spawn_damage(event[4], event[6], event[2])
+        for event in events.get("selfDestruct", ()):
+            self.__add_spawn_damage(event[4], event[5], event[2] * len(event[1]))
+        for location, damage, type_index, unit_id, owner in (e[:5] for e in events.get("damage", ())):
+            if int(type_index) in STRUCTURE_TYPE_INDICES:
+                self.__add(STRUCTURE_DAMAGE, int(owner) - 1, location, damage)
+        for event in events.get("death", ()):
+            if not event[4]:
+                self.__add(DEATHS, int(event[3]) - 1, event[0], 1)
+        for event in events.get("breach", ()):
+            self.__add(BREACHES, int(event[4]) - 1, event[0], 1)
+
+    def end_turn(self):
+        """Fold this turn's counters into the decayed history and start a new turn
+        """
+        for name in COUNTERS:
+            for player_index in range(2):
+                turn = self._turn[name][player_index]
+                history = self._history[name][player_index]
+                # Untouched tiles are zero in both arrays, so only touched tiles need updating
+                for i in self._touched[name][player_index]:
+                    history[i] = history[i] * self.decay + turn[i]
+                    turn[i] = 0.0
+        self._spawns = {}
+        self.turns += 1
+
+    def get(self, counter, location, player_index=0, history=True):
+        """The value of a counter at a tile
+
+        Args:
+            counter: One of BREACHES, STRUCTURE_DAMAGE, DEATHS and SPAWN_DAMAGE
+            location: The [x, y] tile
+            player_index: The player the counter is about
+            history: True for the decayed history of past turns, False for the current turn
+
+        """
+        values = (self._history if history else self._turn)[counter][player_index]
+        return values[location[0] * ARENA_SIZE + location[1]]
+
+    def locations(self, counter, player_index=0, minimum=0, history=True):
+        """Tiles where a counter is above minimum, highest first
+
+        Returns:
+            A list of [x, y] locations
+
+        """
+        values = (self._history if history else self._turn)[counter][player_index]
+        tiles = [i for i in self._touched[counter][player_index] if values[i] > minimum]
+        tiles.sort(key=lambda i: (-values[i], i))
+        return [[i // ARENA_SIZE, i % ARENA_SIZE] for i in tiles]
+
+    def __add(self, counter, player_index, location, amount):
+        i = int(location[0]) * ARENA_SIZE + int(location[1])
+        self._turn[counter][player_index][i] += amount
+        self._touched[counter][player_index].add(i)
+
+    def __add_spawn_damage(self, unit_id, owner, damage):
+        location = self._spawns.get(unit_id)
+        if location is not None:
+            self.__add(SPAWN_DAMAGE, int(owner) - 1, location, damage)
@@ -1,6 +1,6 @@
 import math
 from .unit import GameUnit
-from .util import debug_write
+from . import log
 
 class GameMap:
     """Holds data about the current game map and provides functions
@@ -87,7 +87,7 @@ class GameMap:
 
     # Private helper method to handle invalid coordinate warnings
     def _invalid_coordinates(self, location):
-        self.warn("{} is out of bounds.".format(str(location)))
+        self.warn("{} is out of bounds.", location, category="bounds")
 
     def in_arena_bounds(self, location):
         """Checks if the given location is inside the diamond shaped game board.
@@ -125,7 +125,7 @@ class GameMap:
 
         """
         if not quadrant_description in [self.TOP_LEFT, self.TOP_RIGHT, self.BOTTOM_LEFT, self.BOTTOM_RIGHT]:
-            self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
+            self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.", quadrant_description)
             return
 
         edges = self.get_edges()
@@ -175,7 +175,7 @@ class GameMap:
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
         if player_index < 0 or player_index > 1:
-            self.warn("Player index {} is invalid. Player index should be 0 or 1.".format(player_index))
+            self.warn("Player index {} is invalid. Player index should be 0 or 1.", player_index)
 
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
@@ -211,7 +211,7 @@ class GameMap:
 
         """
         if radius < 0 or radius > self.ARENA_SIZE:
-            self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
+            self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}", radius, self.ARENA_SIZE)
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
 
@@ -243,9 +243,10 @@ class GameMap:
 
         return math.sqrt((x1 - x2)**2 + (y1 - y2)**2)
 
-    def warn(self, message):
+    def warn(self, message, *args, category="game_map"):
         """
-        Used internally by game_map to print out default messaging
+        Used internally by game_map to print out default messaging.
+        message is formatted with args only if the warning is written, see gamelib.log.
         """
         if(self.enable_warnings):
-            debug_write(message)
+            log.warning(category, message, *args)
@@ -1,11 +1,15 @@
 import math
 import json
 import sys
+import time
 
 from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .util import send_commands
+from .commands import CommandEncoder
 from .unit import GameUnit
 from .game_map import GameMap
+from . import metrics
+from . import log
 
 def is_stationary(unit_type):
     """
@@ -17,6 +21,19 @@ def is_stationary(unit_type):
     """
     return unit_type in STRUCTURE_TYPES
 
+def _mirror_frame(state):
+    """
+        Rotates a parsed turn or frame message 180 degrees and swaps the players, so player 2 becomes player 1 at the bottom of the board.
+        Events are dropped since their owner and location fields would all need rewriting.
+    """
+    last = 27  # ARENA_SIZE - 1
+    mirrored = dict(state)
+    mirrored["p1Stats"], mirrored["p2Stats"] = state["p2Stats"], state["p1Stats"]
+    for key, source in [("p1Units", "p2Units"), ("p2Units", "p1Units")]:
+        mirrored[key] = [[[last - u[0], last - u[1]] + list(u[2:]) for u in unit_list] for unit_list in state[source]]
+    mirrored["events"] = {}
+    return mirrored
+
 class GameState:
     """Represents the entire gamestate for a given turn
     Provides methods related to resources and unit deployment
@@ -44,6 +61,8 @@ class GameState:
         * my_time (int): The time you took to submit your previous turn
         * enemy_health (int): Your opponents current remaining health
         * enemy_time (int): Your opponents current remaining time
+        * structure_version (int): Incremented whenever a structure is added, removed or upgraded by apply_frame or reconcile.
+          Useful as a cache key for data that only depends on the structures on the board.
 
     """
 
@@ -91,12 +110,44 @@ class GameState:
 
         self.game_map = GameMap(self.config)
         self._shortest_path_finder = ShortestPathFinder()
-        self._build_stack = []
-        self._deploy_stack = []
+        self._commands = CommandEncoder()
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
-        self.__parse_state(serialized_string)
+        self._units_by_id = {}
+        self._in_action_phase = False
+        self.structure_version = 0
+        if metrics.active is not None:
+            parse_start = time.perf_counter()
+            self.__parse_state(serialized_string)
+            metrics.active.add_time("state_parse", time.perf_counter() - parse_start)
+        else:
+            self.__parse_state(serialized_string)
+
+    @classmethod
+    def from_replay_frame(cls, config, frame, player_index=0):
+        """Builds a GameState from a turn or action frame of a .replay file.
+
+        Replays are written from player 1's point of view. Pass player_index=1 to see the
+        board as player 2 would, mirrored so that player 2 is at the bottom and is player 0
+        of the returned state, like it was for their algo during the match.
+
+        Args:
+            config: The replay's config, its first line
+            frame: A later line of the replay, either the raw string or the parsed json
+            player_index: 0 for player 1's view, 1 for player 2's view
+
+        Returns:
+            A GameState for the board in that frame
+
+        """
+        if player_index == 1:
+            if isinstance(frame, str):
+                frame = json.loads(frame)
+            frame = _mirror_frame(frame)
+        if not isinstance(frame, str):
+            frame = json.dumps(frame)
+        return cls(config, frame)
 
     def __parse_state(self, state_line):
         """
@@ -107,7 +158,18 @@ class GameState:
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
+        self.__parse_stats(state)
 
+        p1units = state["p1Units"]
+        p2units = state["p2Units"]
+
+        self.__create_parsed_units(p1units, 0)
+        self.__create_parsed_units(p2units, 1)
+
+    def __parse_stats(self, state):
+        """
+        Helper function for __parse_state, apply_frame and reconcile to read health, resources and time.
+        """
         p1_health, p1_SP, p1_MP, p1_time = map(float, state["p1Stats"][:4])
         p2_health, p2_SP, p2_MP, p2_time = map(float, state["p2Stats"][:4])
 
@@ -120,12 +182,6 @@ class GameState:
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
 
-        p1units = state["p1Units"]
-        p2units = state["p2Units"]
-
-        self.__create_parsed_units(p1units, 0)
-        self.__create_parsed_units(p2units, 1)
-
     def __create_parsed_units(self, units, player_number):
         """
         Helper function for __parse_state to add units to the map.
@@ -137,6 +193,7 @@ class GameState:
                 sx, sy, shp = uinfo[:3]
                 x, y = map(int, [sx, sy])
                 hp = float(shp)
+                unit_id = uinfo[3] if len(uinfo) > 3 else None
                 # This depends on RM and UP always being the last types to be processed
                 if unit_type == REMOVE:
                     # Quick fix will deploy engine fix soon
@@ -146,8 +203,187 @@ class GameState:
                     if self.contains_stationary_unit([x,y]):
                         self.game_map[x,y][0].upgrade()
                 else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
+                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y, unit_id)
                     self.game_map[x,y].append(unit)
+                    if unit_id is not None:
+                        self._units_by_id[unit_id] = unit
+
+    def apply_frame(self, frame):
+        """Update this state in place using the events of an action frame.
+
+        Lets you keep one GameState for the whole game instead of building a new one every turn.
+        Spawn, move, shield, damage, death, breach and selfDestruct events are applied as deltas,
+        then the units are checked against the frame's p1Units and p2Units lists when it has them,
+        so the state does not drift from the engine's. reconcile() should still be called with the
+        next turn message. Shield events add to a unit's shield, not its health.
+        Units you added with attempt_spawn or game_map.add_unit are dropped on the first frame
+        of each action phase, since the engine reports the real units as spawn events.
+
+        Args:
+            frame: An action frame, either the raw string or the parsed json
+
+        Returns:
+            The number of units that had to be added, removed or moved to match the frame's unit lists
+
+        """
+        if isinstance(frame, str):
+            frame = json.loads(frame)
+        if not self._in_action_phase:
+            self.__drop_untracked_units()
+            self._in_action_phase = True
+
+        self.__parse_stats(frame)
+        events = frame.get("events", {})
+        for event in events.get("spawn", []):
+            location, type_index, unit_id, owner = event[:4]
+            self.__add_tracked_unit(int(type_index), int(owner) - 1, None, location[0], location[1], unit_id)
+        for event in events.get("move", []):
+            unit = self._units_by_id.get(event[4])
+            if unit is not None:
+                self.__move_tracked_unit(unit, event[1][0], event[1][1])
+        for event in events.get("shield", []):
+            unit = self._units_by_id.get(event[5])
+            if unit is not None:
+                unit.shield += event[2]
+        for event in events.get("damage", []):
+            unit = self._units_by_id.get(event[3])
+            if unit is not None:
+                unit.health -= event[1]
+        for event in events.get("death", []):
+            self.__remove_tracked_unit(event[2])
+        for event in events.get("breach", []):
+            self.__remove_tracked_unit(event[3])
+        for event in events.get("selfDestruct", []):
+            self.__remove_tracked_unit(event[4])
+
+        if "p1Units" in frame and "p2Units" in frame:
+            return self.__sync_units(frame)
+        return 0
+
+    def reconcile(self, serialized_string):
+        """Bring a state updated with apply_frame in line with a new turn message.
+
+        Units that match by id are kept (and their health corrected), only missing,
+        extra or moved units are changed. Queued builds and deploys are cleared.
+
+        Args:
+            serialized_string: The turn message at the start of the new turn
+
+        Returns:
+            The number of units that had to be added, removed or moved to match the turn message
+
+        """
+        state = json.loads(serialized_string)
+        self.serialized_string = serialized_string
+        self.turn_number = int(state["turnInfo"][1])
+        self.__parse_stats(state)
+        self._commands.clear()
+        self._in_action_phase = False
+        self.__drop_untracked_units()
+        return self.__sync_units(state)
+
+    def __sync_units(self, state):
+        """
+        Helper function for apply_frame and reconcile to match the tracked units to a message's unit lists.
+        Units that match by id are kept and their health corrected, returns the number of units added, removed or moved.
+        """
+        typedef = self.config.get("unitInformation")
+        expected = {}
+        flags = {}
+        for player_index, key in enumerate(["p1Units", "p2Units"]):
+            for type_index, unit_list in enumerate(state[key]):
+                unit_type = typedef[type_index].get("shorthand")
+                for uinfo in unit_list:
+                    x, y = int(uinfo[0]), int(uinfo[1])
+                    if unit_type == REMOVE or unit_type == UPGRADE:
+                        flags.setdefault((x, y), set()).add(unit_type)
+                    else:
+                        expected[uinfo[3]] = (type_index, player_index, float(uinfo[2]), x, y)
+
+        corrections = 0
+        for unit_id in list(self._units_by_id):
+            unit = self._units_by_id[unit_id]
+            if unit_id not in expected:
+                self.__remove_tracked_unit(unit_id)
+                corrections += 1
+                continue
+            type_index, player_index, hp, x, y = expected.pop(unit_id)
+            if UNIT_TYPE_TO_INDEX[unit.unit_type] != type_index or unit.player_index != player_index:
+                self.__remove_tracked_unit(unit_id)
+                expected[unit_id] = (type_index, player_index, hp, x, y)
+                continue
+            if unit.x != x or unit.y != y:
+                self.__move_tracked_unit(unit, x, y)
+                corrections += 1
+            unit.health = hp
+
+        for unit_id, (type_index, player_index, hp, x, y) in expected.items():
+            self.__add_tracked_unit(type_index, player_index, hp, x, y, unit_id)
+            corrections += 1
+
+        for unit in self._units_by_id.values():
+            if not unit.stationary:
+                continue
+            unit_flags = flags.get((unit.x, unit.y), ())
+            unit.pending_removal = REMOVE in unit_flags
+            if UPGRADE in unit_flags and not unit.upgraded:
+                unit.upgrade()
+                self.structure_version += 1
+                corrections += 1
+        return corrections
+
+    def __add_tracked_unit(self, type_index, player_index, health, x, y, unit_id):
+        """
+        Helper function for apply_frame and reconcile. Spawn events for REMOVE and UPGRADE flag the structure at that location.
+        """
+        unit_type = self.config["unitInformation"][type_index].get("shorthand")
+        x, y = int(x), int(y)
+        if unit_type == REMOVE or unit_type == UPGRADE:
+            structure = self.contains_stationary_unit([x, y])
+            if structure and unit_type == REMOVE:
+                structure.pending_removal = True
+            elif structure and not structure.upgraded:
+                structure.upgrade()
+                self.structure_version += 1
+            return
+        unit = GameUnit(unit_type, self.config, player_index, health, x, y, unit_id)
+        if unit.stationary:
+            for old in list(self.game_map[x, y]):
+                if old.stationary:
+                    self.__remove_tracked_unit(old.unit_id)
+            self.structure_version += 1
+        self.game_map[x, y].append(unit)
+        self._units_by_id[unit_id] = unit
+
+    def __move_tracked_unit(self, unit, x, y):
+        """
+        Helper function for apply_frame and reconcile.
+        """
+        self.game_map[unit.x, unit.y].remove(unit)
+        unit.x, unit.y = int(x), int(y)
+        self.game_map[unit.x, unit.y].append(unit)
+
+    def __remove_tracked_unit(self, unit_id):
+        """
+        Helper function for apply_frame and reconcile, ignores ids that are not on the map.
+        """
+        unit = self._units_by_id.pop(unit_id, None)
+        if unit is None:
+            return
+        units = self.game_map[unit.x, unit.y]
+        if unit in units:
+            units.remove(unit)
+        if unit.stationary:
+            self.structure_version += 1
+
+    def __drop_untracked_units(self):
+        """
+        Removes units without an engine id, which were added locally by attempt_spawn or game_map.add_unit.
+        """
+        for location in self.game_map:
+            units = self.game_map[location]
+            if any(unit.unit_id is None for unit in units):
+                self.game_map[location[0], location[1]] = [unit for unit in units if unit.unit_id is not None]
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -166,19 +402,37 @@ class GameState:
         self._player_resources[player_index][resource_key] = held_resource + amount
 
     def _invalid_player_index(self, index):
-        self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)".format(index))
+        self.warn("Invalid player index {} passed, player index should always be 0 (yourself) or 1 (your opponent)", index)
     
     def _invalid_unit(self, unit):
-        self.warn("Invalid unit {}".format(unit))
+        self.warn("Invalid unit {}", unit)
+
+    @property
+    def _build_stack(self):
+        """The queued (unit_type, x, y) builds, removals and upgrades"""
+        return self._commands.builds
+
+    @property
+    def _deploy_stack(self):
+        """The queued (unit_type, x, y) mobile unit deploys"""
+        return self._commands.deploys
 
-    def submit_turn(self):
+    def submit_turn(self, validate=False):
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
+            Both lines are sent with a single write, the queued commands are serialized as they are added.
+
+        Args:
+            validate: If True, warn about entries the engine will reject before submitting
+
         """
-        build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
-        send_command(build_string)
-        send_command(deploy_string)
+        submit_start = time.perf_counter() if metrics.active is not None else 0
+        if validate:
+            for problem in self._commands.validate(self.config):
+                self.warn("{}", problem, category="submit")
+        send_commands(*self._commands.lines())
+        if metrics.active is not None:
+            metrics.active.add_time("submit", time.perf_counter() - submit_start)
 
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
@@ -195,7 +449,7 @@ class GameState:
             self._invalid_player_index(player_index)
             return
         if not resource_type == self.MP and not resource_type == self.SP:
-            self.warn("Invalid resource_type '{}'. Please use MP (0) or SP (1)".format(resource_type))
+            self.warn("Invalid resource_type '{}'. Please use MP (0) or SP (1)", resource_type)
             return
 
         if resource_type == self.MP:
@@ -264,11 +518,11 @@ class GameState:
         """
 
         if turns_in_future < 1 or turns_in_future > 99:
-            self.warn("Invalid turns in future used ({}). Turns in future should be between 1 and 99".format(turns_in_future))
+            self.warn("Invalid turns in future used ({}). Turns in future should be between 1 and 99", turns_in_future)
         if not player_index == 1 and not player_index == 0:
             self._invalid_player_index(player_index)
         if type(current_MP) == int and current_MP < 0:
-            self.warn("Invalid current MP ({}). Current MP cannot be negative.".format(current_MP))
+            self.warn("Invalid current MP ({}). Current MP cannot be negative.", current_MP)
 
         MP = self.get_resource(self.MP, player_index) if not current_MP else current_MP
         for increment in range(1, turns_in_future + 1):
@@ -320,13 +574,15 @@ class GameState:
             True if we can spawn the unit(s)
 
         """
+        if metrics.active is not None:
+            metrics.active.count("can_spawn")
         if unit_type not in ALL_UNITS:
             self._invalid_unit(unit_type)
             return
         
         if not self.game_map.in_arena_bounds(location):
             if self.enable_warnings:
-                self.warn("Could not spawn {} at location {}. Location invalid.".format(unit_type, location))
+                self.warn("Could not spawn {} at location {}. Location invalid.", unit_type, location, category="spawn")
             return False
 
         affordable = self.number_affordable(unit_type) >= num
@@ -335,7 +591,7 @@ class GameState:
         correct_territory = location[1] < self.HALF_ARENA
         on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
 
-        if self.enable_warnings:
+        if self.enable_warnings and log.enabled(log.WARNING, "spawn"):
             fail_reason = ""
             if not affordable:
                 fail_reason = fail_reason + " Not enough resources."
@@ -346,7 +602,7 @@ class GameState:
             if not (stationary or on_edge):
                 fail_reason = fail_reason + " Information units must be deployed on the edge."
             if len(fail_reason) > 0:
-                self.warn("Could not spawn {} at location {}.{}".format(unit_type, location, fail_reason))
+                self.warn("Could not spawn {} at location {}.{}", unit_type, location, fail_reason, category="spawn")
 
         return (affordable and correct_territory and not blocked and
                 (stationary or on_edge) and
@@ -364,11 +620,13 @@ class GameState:
             The number of units successfully spawned
 
         """
+        if metrics.active is not None:
+            metrics.active.count("attempt_spawn")
         if unit_type not in ALL_UNITS:
             self._invalid_unit(unit_type)
             return
         if num < 1 or not locations:
-            self.warn("Attempted to spawn fewer than one units! ({})".format(num))
+            self.warn("Attempted to spawn fewer than one units! ({})", num, category="spawn")
             return
       
         if type(locations[0]) == int:
@@ -383,9 +641,9 @@ class GameState:
                     self.__set_resource(MP, 0 - costs[MP])
                     self.game_map.add_unit(unit_type, location, 0)
                     if is_stationary(unit_type):
-                        self._build_stack.append((unit_type, x, y))
+                        self._commands.add_build(unit_type, x, y)
                     else:
-                        self._deploy_stack.append((unit_type, x, y))
+                        self._commands.add_deploy(unit_type, x, y)
                     spawned_units += 1
                 else:
                     break
@@ -407,10 +665,10 @@ class GameState:
         for location in locations:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
                 x, y = map(int, location)
-                self._build_stack.append((REMOVE, x, y))
+                self._commands.add_build(REMOVE, x, y)
                 removed_units += 1
             else:
-                self.warn("Could not remove a unit from {}. Location has no structures or is enemy territory.".format(location))
+                self.warn("Could not remove a unit from {}. Location has no structures or is enemy territory.", location, category="remove")
         return removed_units
 
     def attempt_upgrade(self, locations):
@@ -425,7 +683,7 @@ class GameState:
         """
 
         if not locations:
-            self.warn("Attempted to upgrade fewer than one units!")
+            self.warn("Attempted to upgrade fewer than one units!", category="upgrade")
             return
 
         if type(locations[0]) == int:
@@ -446,10 +704,10 @@ class GameState:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
                         existing_unit.upgrade()
-                        self._build_stack.append((UPGRADE, x, y))
+                        self._commands.add_build(UPGRADE, x, y)
                         spawned_units += 1
             else:
-                self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.".format(location))
+                self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.", location, category="upgrade")
         return spawned_units
 
     def get_target_edge(self, start_location):
@@ -489,14 +747,20 @@ class GameState:
 
         """
         if self.contains_stationary_unit(start_location):
-            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+            self.warn("Attempted to perform pathing from blocked starting location {}", start_location, category="pathing")
             return
 
         if target_edge is None:
             target_edge = self.get_target_edge(start_location)
 
         end_points = self.game_map.get_edge_locations(target_edge)
-        return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        if metrics.active is None:
+            return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        path_start = time.perf_counter()
+        path = self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
+        metrics.active.count("pathfinding")
+        metrics.active.add_time("pathfinding", time.perf_counter() - path_start)
+        return path
 
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
@@ -509,7 +773,7 @@ class GameState:
             
         """
         if not self.game_map.in_arena_bounds(location):
-            self.warn('Checked for stationary unit outside of arena bounds')
+            self.warn("Checked for stationary unit outside of arena bounds", category="bounds")
             return False
         x, y = map(int, location)
         for unit in self.game_map[x,y]:
@@ -517,12 +781,13 @@ class GameState:
                 return unit
         return False
 
-    def warn(self, message):
-        """ Used internally by game_state to print warnings
+    def warn(self, message, *args, category="game_state"):
+        """ Used internally by game_state to print warnings.
+        message is formatted with args only if the warning is written, see gamelib.log.
         """
 
         if(self.enable_warnings):
-            debug_write(message)
+            log.warning(category, message, *args)
 
     def suppress_warnings(self, suppress):
         """Suppress all warnings
@@ -551,7 +816,7 @@ class GameState:
         """
 
         if not isinstance(attacking_unit, GameUnit):
-            self.warn("Passed a {} to get_target as attacking_unit. Expected a GameUnit.".format(type(attacking_unit)))
+            self.warn("Passed a {} to get_target as attacking_unit. Expected a GameUnit.", type(attacking_unit))
             return
 
         attacker_location = [attacking_unit.x, attacking_unit.y]
@@ -629,7 +894,7 @@ class GameState:
         if not player_index == 0 and not player_index == 1:
             self._invalid_player_index(player_index)
         if not self.game_map.in_arena_bounds(location):
-            self.warn("Location {} is not in the arena bounds.".format(location))
+            self.warn("Location {} is not in the arena bounds.", location, category="bounds")
 
         attackers = []
         """
@@ -659,7 +924,7 @@ class GameState:
             Example: {'WALL': 3, 'TURRET': 2, 'SUPPORT': 1}
         """
         if not self.game_map.in_arena_bounds(start_coords):
-            self.warn(f"Starting coordinates {start_coords} are out of bounds")
+            self.warn("Starting coordinates {} are out of bounds", start_coords, category="pathing")
             return None
         
         defence_counts = {'WALL': 0, 'TURRET': 0, 'SUPPORT': 0, 'TOTAL': 0}
@@ -667,7 +932,7 @@ class GameState:
         
         # Check if we're scanning enemy territory (top half of map)
         if start_y < self.HALF_ARENA:
-            self.warn("Starting coordinates are in your own territory")
+            self.warn("Starting coordinates are in your own territory", category="pathing")
             return defence_counts
         
         # Scan a 5-column wide area for specified height
@@ -0,0 +1,112 @@
+import sys
+
+from .util import debug_write
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+# The DebugLog buffering messages for this process, or None to write every message straight to stderr with debug_write.
+active = None
+
+
+class DebugLog:
+    """A buffered debug log with levels and per-category rate limits
+
+    Enable it with AlgoCore.enable_debug_log(). Messages below the level are dropped,
+    and each category may log at most rate_limit messages per turn, the rest are counted
+    and summarised in one line. A message is only formatted once it passes those checks,
+    so dropped messages cost almost nothing. AlgoCore calls flush() once per turn, which
+    writes everything buffered with a single write and flush of stderr.
+
+        gamelib.log.info("breach", "Got scored on at: {}", location)
+
+    Attributes :
+        * level (int): The lowest level that is kept, one of DEBUG, INFO, WARNING and ERROR
+        * rate_limit (int): How many messages each category may log per turn, None for no limit
+
+    """
+    def __init__(self, level=INFO, rate_limit=20, stream=None):
+        """ Setup the log
+
+        Args:
+            level: The lowest level that is kept
+            rate_limit: How many messages each category may log per turn, None for no limit
+            stream: Where flush() writes to, stderr by default
+
+        """
+        self.level = level
+        self.rate_limit = rate_limit
+        self._stream = stream
+        self._buffer = []
+        self._counts = {}
+        self._suppressed = {}
+
+    def enabled(self, level, category=None):
+        """True if a message with this level and category would be kept, use it to skip building expensive messages
+        """
+        if level < self.level:
+            return False
+        return self.rate_limit is None or self._counts.get(category, 0) < self.rate_limit
+
+    def log(self, level, category, message, *args):
+        """Buffer a message, formatted with message.format(*args) if it is kept
+
+        Args:
+            level: One of DEBUG, INFO, WARNING and ERROR
+            category: Any hashable, each category is rate limited separately
+            message: The message, or a format string for args
+
+        """
+        if level < self.level:
+            return
+        count = self._counts.get(category, 0)
+        if self.rate_limit is not None and count >= self.rate_limit:
+            self._suppressed[category] = self._suppressed.get(category, 0) + 1
+            return
+        self._counts[category] = count + 1
+        # Formatted now, the arguments may be changed before the end of the turn
+        self._buffer.append(message.format(*args) if args else str(message))
+
+    def flush(self):
+        """Write the buffered messages and reset the per-turn rate limits
+        """
+        lines = self._buffer
+        for category, count in self._suppressed.items():
+            lines.append("{} more '{}' messages suppressed".format(count, category))
+        self._buffer = []
+        self._counts = {}
+        self._suppressed = {}
+        if lines:
+            stream = self._stream or sys.stderr
+            stream.write("\n".join(line.strip() for line in lines) + "\n")
+            stream.flush()
+
+
+def log(level, category, message, *args):
+    """Log through the active DebugLog, or write straight to stderr if there is none
+    """
+    if active is not None:
+        active.log(level, category, message, *args)
+    elif level >= INFO:
+        debug_write(message.format(*args) if args else message)
+
+def enabled(level, category=None):
+    """True if a message with this level and category would be written
+    """
+    if active is not None:
+        return active.enabled(level, category)
+    return level >= INFO
+
+def debug(category, message, *args):
+    log(DEBUG, category, message, *args)
+
+def info(category, message, *args):
+    log(INFO, category, message, *args)
+
+def warning(category, message, *args):
+    log(WARNING, category, message, *args)
+
+def error(category, message, *args):
+    log(ERROR, category, message, *args)
@@ -0,0 +1,105 @@
+import os
+import json
+import threading
+
+# The TurnMetrics collecting for this process, or None when metrics are disabled.
+# Instrumented code checks it with a single comparison so disabled metrics cost close to nothing.
+active = None
+
+
+class TurnMetrics:
+    """Collects per-turn latency numbers and writes one JSON line per turn
+
+    Enable it with AlgoCore.enable_metrics(path). Lines are written to a file,
+    never to stdout, since stdout is the engine protocol. Each line looks like:
+
+        {"turn": 3, "counts": {"can_spawn": 40, "attempt_spawn": 12, "pathfinding": 2},
+         "times": {"parse": 0.0011, "state_parse": 0.0042, "on_turn": 0.081, "pathfinding": 0.031, "submit": 0.0001},
+         "frames": {"count": 112, "total": 0.004, "max": 0.0002}}
+
+    Times are in seconds. Only work done on the main thread or the thread that began the
+    turn is recorded, so background precompute threads and evaluator worker processes
+    do not count towards the turn.
+
+    Attributes :
+        * path (string): The file the JSON lines are appended to
+        * turn (int): The turn currently being recorded, None before the first turn
+
+    """
+    def __init__(self, path):
+        """ Open the sink
+
+        Args:
+            path: The file to append JSON lines to
+
+        """
+        self.path = path
+        self.turn = None
+        self._pid = os.getpid()
+        self._turn_thread = threading.main_thread()
+        self._file = open(path, "a")
+        self._reset()
+
+    def _reset(self):
+        self.counts = {}
+        self.times = {}
+        self.frame_count = 0
+        self.frame_total = 0.0
+        self.frame_max = 0.0
+
+    def _recording(self):
+        thread = threading.current_thread()
+        return os.getpid() == self._pid and (thread is self._turn_thread or thread is threading.main_thread())
+
+    def count(self, name, amount=1):
+        """Add to a counter for the current turn
+        """
+        if not self._recording():
+            return
+        self.counts[name] = self.counts.get(name, 0) + amount
+
+    def add_time(self, name, seconds):
+        """Add seconds to a timer for the current turn
+        """
+        if not self._recording():
+            return
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def add_frame(self, seconds):
+        """Record the time spent handling one action frame
+        """
+        if not self._recording():
+            return
+        self.frame_count += 1
+        self.frame_total += seconds
+        if seconds > self.frame_max:
+            self.frame_max = seconds
+
+    def begin_turn(self, turn_number):
+        """Write out the previous turn, including its action frames, and start recording a new one
+        """
+        self.end_turn()
+        self.turn = turn_number
+        self._turn_thread = threading.current_thread()
+
+    def end_turn(self):
+        """Write the current turn's record, does nothing if no turn is being recorded
+        """
+        if self.turn is None:
+            return
+        record = {
+            "turn": self.turn,
+            "counts": self.counts,
+            "times": self.times,
+            "frames": {"count": self.frame_count, "total": self.frame_total, "max": self.frame_max},
+        }
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        self.turn = None
+        self._reset()
+
+    def close(self):
+        """Write the last turn and close the file
+        """
+        self.end_turn()
+        self._file.close()
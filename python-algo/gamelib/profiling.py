@@ -0,0 +1,82 @@
+import io
+import os
+import time
+import cProfile
+import pstats
+
+from .util import debug_write
+
+
+class SlowTurnProfiler:
+    """Profiles on_turn after a slow turn and saves the results to disk
+
+    Enable it with AlgoCore.enable_slow_turn_profiling(). Every turn is timed;
+    when a turn takes longer than the threshold, the following turn is run under
+    cProfile. For each profiled turn two files are written to the output directory:
+    turn_<n>.pstats, which can be loaded with pstats or snakeviz, and turn_<n>.txt,
+    the top functions sorted by cumulative time.
+
+    Attributes :
+        * threshold (float): Seconds a turn may take before the next one is profiled, nothing is profiled while it is None
+        * directory (string): Where profile files are written
+        * top (int): How many functions to list in the text summary
+        * last_duration (float): How long the previous turn took, in seconds
+        * profiled_turns (list): Turn numbers that have been profiled
+
+    """
+    def __init__(self, threshold, directory="profiles", top=30):
+        """ Setup the profiler
+
+        Args:
+            threshold: Seconds a turn may take before the next one is profiled
+            directory: Where profile files are written, created if needed
+            top: How many functions to list in the text summary
+
+        """
+        self.threshold = threshold
+        self.directory = directory
+        self.top = top
+        self.last_duration = 0.0
+        self.profiled_turns = []
+
+    def run(self, turn_number, func, *args):
+        """Call func(*args), under cProfile if the previous turn was slow
+
+        Args:
+            turn_number: The current turn, used to name the output files
+            func: The function to call, normally on_turn
+
+        """
+        start = time.perf_counter()
+        if self.threshold is not None and self.last_duration > self.threshold:
+            profile = cProfile.Profile()
+            try:
+                profile.runcall(func, *args)
+            finally:
+                self.last_duration = time.perf_counter() - start
+                self.__save(turn_number, profile)
+        else:
+            try:
+                func(*args)
+            finally:
+                self.last_duration = time.perf_counter() - start
+
+    def __save(self, turn_number, profile):
+        """Writes the pstats file and the text summary for a profiled turn
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            base = os.path.join(self.directory, "turn_{}".format(turn_number))
+            profile.dump_stats(base + ".pstats")
+
+            summary = io.StringIO()
+            summary.write("Turn {} took {:.3f}s\n\n".format(turn_number, self.last_duration))
+            stats = pstats.Stats(profile, stream=summary)
+            stats.sort_stats("cumulative").print_stats(self.top)
+            stats.print_callers(self.top)
+            with open(base + ".txt", "w") as f:
+                f.write(summary.getvalue())
+            self.profiled_turns.append(turn_number)
+            debug_write("Profiled slow turn {}, see {}.txt".format(turn_number, base))
+        except OSError as e:
+            debug_write("Could not save turn profile: {}".format(e))
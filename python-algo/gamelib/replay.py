@@ -0,0 +1,108 @@
+import json
+
+from .game_state import GameState
+from .util import get_turn_info, debug_write
+
+
+class ReplayFrame:
+    """One turn or action frame line of a replay, decoded only when needed
+
+    Attributes :
+        * config (JSON): The replay's config
+        * line (string): The raw line from the replay file
+        * state_type (int): 0 for the state at the start of a turn, 1 for an action frame, 2 for the end of the game
+        * turn_number (int): The turn the line belongs to
+        * frame_number (int): The action frame number, -1 for the start of a turn
+
+    """
+    def __init__(self, config, line, turn_info):
+        self.config = config
+        self.line = line
+        self.state_type = int(turn_info[0])
+        self.turn_number = int(turn_info[1])
+        self.frame_number = int(turn_info[2])
+        self._data = None
+
+    def data(self):
+        """The parsed json of the line, decoded on first use
+        """
+        if self._data is None:
+            self._data = json.loads(self.line)
+        return self._data
+
+    def game_state(self, player_index=0):
+        """Builds a GameState for this frame, see GameState.from_replay_frame
+
+        Args:
+            player_index: 0 for player 1's view, 1 for player 2's view
+
+        """
+        frame = self.line if player_index == 0 else self.data()
+        return GameState.from_replay_frame(self.config, frame, player_index)
+
+
+class ReplayFile:
+    """Iterates over the frames of a .replay file without loading it all into memory
+
+    The config is read when the file is opened. frames() then streams the rest of the file,
+    reading only the turnInfo of each line so frames can be skipped without decoding them.
+
+        replay = ReplayFile("match.replay")
+        for game_state in replay.turn_states(player_index=1):
+            ...
+
+    Attributes :
+        * path (string): The replay file
+        * config (JSON): The replay's config, None if the file has none
+
+    """
+    def __init__(self, path):
+        """ Open the replay and read its config
+
+        Args:
+            path: The .replay file
+
+        """
+        self.path = path
+        self.config = None
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    if '"turnInfo"' not in line:
+                        self.config = json.loads(line)
+                    break
+        if self.config is None:
+            debug_write("No config found at the start of {}".format(path))
+
+    def __iter__(self):
+        return self.frames()
+
+    def frames(self, state_type=None, turns=None):
+        """Yields a ReplayFrame for each line of the replay
+
+        Args:
+            state_type: Only yield lines of this type, 0 for turn starts, 1 for action frames, 2 for the end
+            turns: Only yield lines from these turn numbers, a set or range
+
+        """
+        with open(self.path) as f:
+            for line in f:
+                if '"turnInfo"' not in line:
+                    continue
+                turn_info = get_turn_info(line)
+                if state_type is not None and int(turn_info[0]) != state_type:
+                    continue
+                if turns is not None and int(turn_info[1]) not in turns:
+                    continue
+                yield ReplayFrame(self.config, line, turn_info)
+
+    def turn_states(self, player_index=0, turns=None):
+        """Yields a GameState for the start of each turn
+
+        Args:
+            player_index: 0 for player 1's view, 1 for player 2's view
+            turns: Only yield these turn numbers, a set or range
+
+        """
+        for frame in self.frames(0, turns):
+            yield frame.game_state(player_index)
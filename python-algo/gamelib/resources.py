@@ -0,0 +1,105 @@
+"""
+Multi-turn resource projection for both players.
+
+ResourceProjection builds the MP and SP each player will hold at the start of
+each of the next N turns in one pass, so planners can look up any horizon in
+constant time instead of calling GameState.project_future_MP turn by turn.
+
+This module requires numpy and is not imported by ``gamelib`` itself, import it
+explicitly with ``from gamelib.resources import ResourceProjection``.
+"""
+import numpy as np
+
+from .util import debug_write
+
+
+class ResourceProjection:
+    """MP and SP trajectories for both players, assuming nothing more is spent
+
+    The projection models MP decay (bitDecayPerRound), the MP income ramp
+    (bitsPerRound, bitGrowthRate, turnIntervalForBitSchedule), the maxBits cap,
+    SP income (coresPerRound), resources generated by structures
+    (generatesResource1/2, including upgrades) and SP refunds from structures
+    pending removal (refundPercentage, turnsRequiredToRemove).
+
+    Attributes :
+        * turns (int): The number of turns projected
+        * mp (ndarray): Shape (2, turns + 1), mp[player_index, t] is the MP held t turns from now
+        * sp (ndarray): Shape (2, turns + 1), sp[player_index, t] is the SP held t turns from now
+
+    """
+    def __init__(self, game_state, turns=20, current=None):
+        """ Build the projection
+
+        Args:
+            game_state: The current GameState
+            turns: How many turns ahead to project
+            current: Optional [[SP, MP], [SP, MP]] to use instead of the players' current resources
+
+        """
+        from .game_state import UNIT_TYPE_TO_INDEX
+        config = game_state.config
+        resources = config["resources"]
+        self.turns = turns
+
+        if current is None:
+            current = [game_state.get_resources(0), game_state.get_resources(1)]
+        current = np.array(current, dtype=float)
+
+        # Per-turn income that does not depend on the held amount, shape (turns,)
+        future_turns = game_state.turn_number + np.arange(1, turns + 1)
+        ramp_interval = resources.get("turnIntervalForBitSchedule", 0)
+        ramps = future_turns // ramp_interval if ramp_interval else np.zeros(turns)
+        mp_base = resources.get("bitsPerRound", 0) + resources.get("bitGrowthRate", 0) * ramps
+        sp_base = np.full(turns, float(resources.get("coresPerRound", 0)))
+
+        # Income generated by structures and refunds from pending removals, per player
+        generated = np.zeros((2, 2))
+        refunds = np.zeros((2, turns))
+        for location in game_state.game_map:
+            unit = game_state.contains_stationary_unit(location)
+            if not unit:
+                continue
+            type_config = config["unitInformation"][UNIT_TYPE_TO_INDEX[unit.unit_type]]
+            upgrade_config = type_config.get("upgrade", {}) if unit.upgraded else {}
+            if unit.pending_removal:
+                delay = max(1, int(type_config.get("turnsRequiredToRemove", 1)))
+                if delay <= turns:
+                    health_fraction = unit.health / unit.max_health if unit.max_health else 1
+                    refunds[unit.player_index, delay - 1] += type_config.get("refundPercentage", 0) * unit.cost[0] * health_fraction
+                continue
+            generated[unit.player_index, 0] += upgrade_config.get("generatesResource1", type_config.get("generatesResource1", 0))
+            generated[unit.player_index, 1] += upgrade_config.get("generatesResource2", type_config.get("generatesResource2", 0))
+
+        mp_income = mp_base[None, :] + generated[:, 1:2]
+        sp_income = sp_base[None, :] + generated[:, 0:1] + refunds
+
+        # SP does not decay, so it is a running sum of the income
+        self.sp = np.empty((2, turns + 1))
+        self.sp[:, 0] = current[:, 0]
+        self.sp[:, 1:] = current[:, 0:1] + np.cumsum(sp_income, axis=1)
+
+        # MP decays and is rounded every turn like the engine, so step through turns for both players at once
+        decay = 1 - resources.get("bitDecayPerRound", 0)
+        cap = resources.get("maxBits", np.inf)
+        self.mp = np.empty((2, turns + 1))
+        self.mp[:, 0] = current[:, 1]
+        held = current[:, 1]
+        for t in range(turns):
+            held = np.minimum(np.round(held * decay + mp_income[:, t], 1), cap)
+            self.mp[:, t + 1] = held
+
+    def get_MP(self, turns_in_future=1, player_index=0):
+        """The MP the player will hold turns_in_future turns from now
+        """
+        return float(self.mp[player_index, self.__clamp(turns_in_future)])
+
+    def get_SP(self, turns_in_future=1, player_index=0):
+        """The SP the player will hold turns_in_future turns from now
+        """
+        return float(self.sp[player_index, self.__clamp(turns_in_future)])
+
+    def __clamp(self, turns_in_future):
+        if turns_in_future < 0 or turns_in_future > self.turns:
+            debug_write("Invalid turns in future used ({}). This projection covers 0 to {} turns".format(turns_in_future, self.turns))
+        return min(max(int(turns_in_future), 0), self.turns)
@@ -0,0 +1,351 @@
+"""
+Vectorized combat simulation for scoring many candidate attacks at once.
+
+A BatchSimulator snapshots the structures on a GameState and then advances
+K candidate attack plans through the action phase in lockstep. Every piece of
+per-unit state (health, path position, shields) is held in NumPy arrays with a
+leading "scenario" axis, so evaluating 200 plans costs roughly the same as a
+handful of single simulations.
+
+This module requires numpy and is not imported by ``gamelib`` itself, import it
+explicitly with ``from gamelib.simulation import BatchSimulator``.
+"""
+import numpy as np
+
+from .unit import GameUnit
+from .util import debug_write
+
+
+class BatchResult:
+    """Holds the outcome of a batch simulation, one entry per plan
+
+    Attributes :
+        * breaches (ndarray): Number of units that reached the target edge
+        * breach_damage (ndarray): Health the defending player would lose
+        * structure_damage (ndarray): Total damage dealt to defending structures
+        * structures_destroyed (ndarray): Number of defending structures destroyed
+        * sp_destroyed (ndarray): SP value of the destroyed defending structures
+        * units_lost (ndarray): Number of attacking units that were destroyed or self destructed
+        * mp_spent (ndarray): MP cost of the units that were actually spawned
+        * frames (int): The number of frames that were simulated
+
+    """
+    def __init__(self, num_plans):
+        self.breaches = np.zeros(num_plans, dtype=np.int32)
+        self.breach_damage = np.zeros(num_plans)
+        self.structure_damage = np.zeros(num_plans)
+        self.structures_destroyed = np.zeros(num_plans, dtype=np.int32)
+        self.sp_destroyed = np.zeros(num_plans)
+        self.units_lost = np.zeros(num_plans, dtype=np.int32)
+        self.mp_spent = np.zeros(num_plans)
+        self.frames = 0
+
+    def __len__(self):
+        return len(self.breaches)
+
+    def score(self, breach_weight=1.0, sp_weight=0.25, loss_weight=0.0):
+        """A simple linear score for ranking plans
+
+        Args:
+            breach_weight: Weight of each point of breach damage
+            sp_weight: Weight of each point of SP destroyed
+            loss_weight: Penalty for each attacking unit lost
+
+        Returns:
+            An ndarray with one score per plan, higher is better
+
+        """
+        return (breach_weight * self.breach_damage
+                + sp_weight * self.sp_destroyed
+                - loss_weight * self.units_lost)
+
+    def best(self, **weights):
+        """Index of the highest scoring plan, see score() for the accepted weights
+        """
+        return int(np.argmax(self.score(**weights)))
+
+
+class BatchSimulator:
+    """Simulates many attack plans against the same defence in lockstep
+
+    A plan is a list of (unit_type, location, num) tuples, the same arguments you
+    would pass to GameState.attempt_spawn. All plans are simulated against the
+    board of the game_state the simulator was built from.
+
+    The model follows the engine rules closely enough to rank plans: units walk
+    the path returned by find_path_to_edge, turrets hit the nearest unit in range,
+    mobile units hit the nearest structure in range, supports shield units passing
+    within range once, and units that cannot reach an edge self destruct.
+    Paths are computed once against the starting board, so they do not change when
+    structures are destroyed during the simulation.
+
+    Attributes :
+        * game_state (:obj: GameState): The state the simulator was built from
+        * max_frames (int): Upper bound on the number of simulated frames
+
+    """
+    def __init__(self, game_state, max_frames=250):
+        """Snapshot the structures of a game state
+
+        Args:
+            game_state: The GameState to simulate against
+            max_frames: Upper bound on the number of simulated frames
+
+        """
+        self.game_state = game_state
+        self.config = game_state.config
+        self.max_frames = max_frames
+        self._hit_radius = self.config["unitInformation"][0].get("getHitRadius", 0)
+        self._paths = {}
+        self._unit_stats = {}
+
+        structures = [[], []]
+        for location in game_state.game_map:
+            unit = game_state.contains_stationary_unit(location)
+            if unit:
+                structures[unit.player_index].append(unit)
+        self._structures = structures
+
+    def _stats(self, unit_type):
+        """Cached per-type stats for mobile units
+        """
+        if unit_type not in self._unit_stats:
+            from .game_state import UNIT_TYPE_TO_INDEX
+            type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
+            unit = GameUnit(unit_type, self.config)
+            speed = unit.speed if unit.speed > 0 else 1
+            self._unit_stats[unit_type] = {
+                "health": unit.max_health,
+                "period": max(1, int(round(1 / speed))),
+                "damage_f": unit.damage_f,
+                "range": unit.attackRange,
+                "breach_damage": type_config.get("playerBreachDamage", 1),
+                "sd_damage": type_config.get("selfDestructDamageTower", 0),
+                "sd_range": type_config.get("selfDestructRange", 0),
+                "sd_steps": type_config.get("selfDestructStepsRequired", 0),
+                "cost": unit.cost[1],
+                "stationary": unit.stationary,
+            }
+        return self._unit_stats[unit_type]
+
+    def _path(self, location, player_index):
+        """Cached path and breach flag for a spawn location, None if units cannot spawn there
+        """
+        location = [int(location[0]), int(location[1])]
+        key = (player_index, location[0], location[1])
+        if key not in self._paths:
+            state = self.game_state
+            game_map = state.game_map
+            if player_index == 0:
+                edges = game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT)
+            else:
+                edges = game_map.get_edge_locations(game_map.TOP_LEFT) + game_map.get_edge_locations(game_map.TOP_RIGHT)
+            path = None
+            if location in edges and not state.contains_stationary_unit(location):
+                path = state.find_path_to_edge(location)
+            if path:
+                target_edge = game_map.get_edge_locations(state.get_target_edge(location))
+                self._paths[key] = (path, path[-1] in target_edge)
+            else:
+                self._paths[key] = None
+        return self._paths[key]
+
+    def simulate(self, plans, player_index=0):
+        """Simulate every plan in lockstep
+
+        Args:
+            plans: A list of plans, each a list of (unit_type, location, num) tuples
+            player_index: The attacking player, 0 for you 1 for the enemy
+
+        Returns:
+            A BatchResult with one entry per plan
+
+        """
+        num_plans = len(plans)
+        result = BatchResult(num_plans)
+        if num_plans == 0:
+            return result
+
+        # Flatten the plans into per-unit rows, keeping an index into a table of distinct paths
+        path_ids = {}
+        path_list = []
+        rows = []
+        for k, plan in enumerate(plans):
+            units = []
+            for unit_type, location, num in plan:
+                stats = self._stats(unit_type)
+                if stats["stationary"]:
+                    debug_write("BatchSimulator ignores structure {} in plan {}".format(unit_type, k))
+                    continue
+                path = self._path(location, player_index)
+                if path is None:
+                    continue
+                key = (int(location[0]), int(location[1]))
+                if key not in path_ids:
+                    path_ids[key] = len(path_list)
+                    path_list.append(path)
+                units.extend([(stats, path_ids[key])] * int(num))
+            rows.append(units)
+
+        num_units = max([len(units) for units in rows] + [1])
+        alive = np.zeros((num_plans, num_units), dtype=bool)
+        health = np.zeros((num_plans, num_units))
+        period = np.ones((num_plans, num_units), dtype=np.int32)
+        damage_f = np.zeros((num_plans, num_units))
+        attack_range = np.zeros((num_plans, num_units))
+        breach_damage = np.zeros((num_plans, num_units))
+        sd_damage = np.zeros((num_plans, num_units))
+        sd_range = np.zeros((num_plans, num_units))
+        sd_steps = np.zeros((num_plans, num_units), dtype=np.int32)
+        path_id = np.zeros((num_plans, num_units), dtype=np.int32)
+        for k, units in enumerate(rows):
+            for u, (stats, pid) in enumerate(units):
+                alive[k, u] = True
+                health[k, u] = stats["health"]
+                period[k, u] = stats["period"]
+                damage_f[k, u] = stats["damage_f"]
+                attack_range[k, u] = stats["range"]
+                breach_damage[k, u] = stats["breach_damage"]
+                sd_damage[k, u] = stats["sd_damage"]
+                sd_range[k, u] = stats["sd_range"]
+                sd_steps[k, u] = stats["sd_steps"]
+                path_id[k, u] = pid
+                result.mp_spent[k] += stats["cost"]
+
+        if not path_list:
+            return result
+
+        # Distinct paths padded into one array, ends repeat the last tile
+        path_len = np.array([len(path) for path, _ in path_list], dtype=np.int32)
+        longest = int(path_len.max())
+        paths = np.zeros((len(path_list), longest, 2))
+        for i, (path, _) in enumerate(path_list):
+            paths[i, :len(path)] = path
+            paths[i, len(path):] = path[-1]
+        path_breaches = np.array([breaches for _, breaches in path_list])
+        unit_path_len = path_len[path_id]
+        unit_breaches = path_breaches[path_id]
+
+        defender = self._structures[1 - player_index]
+        supports = [unit for unit in self._structures[player_index] if unit.shieldRange > 0]
+        num_structures = len(defender)
+
+        struct_pos = np.array([[unit.x, unit.y] for unit in defender]).reshape(-1, 2)
+        struct_health = np.tile(np.array([unit.health for unit in defender]), (num_plans, 1))
+        struct_alive = np.ones((num_plans, num_structures), dtype=bool)
+        struct_damage_i = np.array([unit.damage_i for unit in defender])
+        struct_range = np.array([unit.attackRange for unit in defender]) + self._hit_radius
+        struct_cost = np.array([unit.cost[0] for unit in defender])
+        turrets = np.nonzero(struct_damage_i > 0)[0]
+
+        # Distances from every path tile to every structure/support, looked up by (path, step)
+        tile_to_struct = np.sqrt(((paths[:, :, None, :] - struct_pos[None, None, :, :]) ** 2).sum(axis=3))
+        support_pos = np.array([[unit.x, unit.y] for unit in supports]).reshape(-1, 2)
+        tile_to_support = np.sqrt(((paths[:, :, None, :] - support_pos[None, None, :, :]) ** 2).sum(axis=3))
+        support_range = np.array([unit.shieldRange for unit in supports]) + self._hit_radius
+        support_amount = np.array([unit.shieldPerUnit + unit.shieldBonusPerY * (unit.y if player_index == 0 else 27 - unit.y) for unit in supports])
+        shielded = np.zeros((num_plans, num_units, len(supports)), dtype=bool)
+
+        step = np.zeros((num_plans, num_units), dtype=np.int32)
+        plan_index = np.arange(num_plans)[:, None]
+        frame = 0
+        while alive.any() and frame < self.max_frames:
+            frame += 1
+
+            # Movement, units at the end of their path breach or self destruct instead of moving
+            due = alive & (frame % period == 0)
+            at_end = step >= unit_path_len - 1
+            breaching = due & at_end & unit_breaches
+            destructing = due & at_end & ~unit_breaches
+            step = np.where(due & ~at_end, step + 1, step)
+
+            result.breaches += breaching.sum(axis=1)
+            result.breach_damage += (breach_damage * breaching).sum(axis=1)
+            alive &= ~breaching
+
+            dist = tile_to_struct[path_id, step]
+            if destructing.any() and num_structures:
+                eligible = destructing & (step >= sd_steps)
+                in_blast = eligible[:, :, None] & (dist <= (sd_range + self._hit_radius)[:, :, None])
+                blast = (in_blast * sd_damage[:, :, None]).sum(axis=1) * struct_alive
+                struct_health -= blast
+                result.structure_damage += blast.sum(axis=1)
+            alive &= ~destructing
+            result.units_lost += destructing.sum(axis=1)
+
+            # Shielding from the attacker's supports, each support shields a unit once
+            if len(supports):
+                in_range = alive[:, :, None] & (tile_to_support[path_id, step] <= support_range) & ~shielded
+                health += (in_range * support_amount).sum(axis=2)
+                shielded |= in_range
+
+            if num_structures:
+                # Turrets target the nearest unit, breaking ties on lowest health
+                unit_damage = np.zeros((num_plans, num_units))
+                if len(turrets):
+                    turret_dist = dist[:, :, turrets]
+                    valid = alive[:, :, None] & (turret_dist <= struct_range[turrets])
+                    key = np.where(valid, turret_dist * 1e4 + health[:, :, None], np.inf)
+                    target = key.argmin(axis=1)
+                    fires = np.isfinite(key.min(axis=1)) & struct_alive[:, turrets]
+                    np.add.at(unit_damage, (np.broadcast_to(plan_index, target.shape), target), fires * struct_damage_i[turrets])
+
+                # Mobile units target the nearest structure, breaking ties on lowest health
+                valid = alive[:, :, None] & struct_alive[:, None, :] & (dist <= (attack_range + self._hit_radius)[:, :, None])
+                key = np.where(valid, dist * 1e4 + struct_health[:, None, :], np.inf)
+                target = key.argmin(axis=2)
+                fires = np.isfinite(key.min(axis=2))
+                struct_hits = np.zeros((num_plans, num_structures))
+                np.add.at(struct_hits, (np.broadcast_to(plan_index, target.shape), target), fires * damage_f)
+
+                health -= unit_damage
+                struct_health -= struct_hits
+                result.structure_damage += struct_hits.sum(axis=1)
+
+                died = alive & (health <= 0)
+                alive &= ~died
+                result.units_lost += died.sum(axis=1)
+
+            destroyed = struct_alive & (struct_health <= 0)
+            struct_alive &= ~destroyed
+            result.structures_destroyed += destroyed.sum(axis=1)
+            result.sp_destroyed += (destroyed * struct_cost).sum(axis=1)
+
+        result.frames = frame
+        return result
+
+    def score(self, plans, player_index=0, **weights):
+        """Simulate the plans and return their scores, see BatchResult.score for the weights
+        """
+        return self.simulate(plans, player_index).score(**weights)
+
+
+def single_spawn_plans(game_state, unit_types=None, locations=None, num=None):
+    """Build one plan for every (unit type, spawn location) pair
+
+    Args:
+        game_state: The current GameState
+        unit_types: The mobile unit types to try, every mobile type in ALL_UNITS if None
+        locations: The spawn locations to try, every deployable edge location if None
+        num: Units per plan, as many as we can afford if None
+
+    Returns:
+        A list of plans suitable for BatchSimulator.simulate
+
+    """
+    from .game_state import ALL_UNITS, is_stationary
+    if unit_types is None:
+        unit_types = [unit_type for unit_type in ALL_UNITS if not is_stationary(unit_type)]
+    if locations is None:
+        game_map = game_state.game_map
+        locations = game_map.get_edge_locations(game_map.BOTTOM_LEFT) + game_map.get_edge_locations(game_map.BOTTOM_RIGHT)
+        locations = [location for location in locations if not game_state.contains_stationary_unit(location)]
+
+    plans = []
+    for unit_type in unit_types:
+        count = game_state.number_affordable(unit_type) if num is None else num
+        if not count:
+            continue
+        for location in locations:
+            plans.append([(unit_type, location, count)])
+    return plans
@@ -3,6 +3,18 @@ import json
 from .game_state import GameState
 from .unit import GameUnit
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+def _count_units_at(game_state, location):
+    return len(game_state.game_map[location])
+
+def _print_location(game_state, location):
+    print("scoring", location, flush=True)
+    return location
+
 class BasicTests(unittest.TestCase):
 
     def make_turn_0_map(self):
@@ -275,3 +287,440 @@ class BasicTests(unittest.TestCase):
         actual = game.project_future_MP(turns)
         self.assertAlmostEqual(actual, expected, 0, "Expected {} MP {} turns from now, got {}".format(expected, turns, actual))
 
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_batch_simulation(self):
+        from .simulation import BatchSimulator
+        game = self.make_turn_0_map()
+        for location in [[2, 15], [3, 16], [4, 17]]:
+            game.game_map.add_unit("FF", location, 1)
+        game.game_map.add_unit("DF", [24, 15], 1)
+
+        plans = [[("PI", [13, 0], 5)], [("PI", [13, 0], 5), ("EI", [14, 0], 2)], [("PI", [13, 13], 5)], []]
+        result = BatchSimulator(game).simulate(plans)
+        single = BatchSimulator(game).simulate(plans[:1])
+        self.assertEqual(4, len(result), "Expected one result per plan")
+        self.assertEqual(single.breaches[0], result.breaches[0], "Batched and single simulations disagree")
+        self.assertEqual(5, result.mp_spent[0], "Expected 5 MP spent on scouts")
+        self.assertEqual(0, result.mp_spent[2], "Units should not spawn off the edge")
+        self.assertEqual(0, result.breaches[3], "An empty plan should not breach")
+        self.assertGreater(result.structure_damage[1], result.structure_damage[0], "Demolishers should damage the walls on their path")
+
+        simulator = BatchSimulator(game)
+        simulator.simulate(plans[:1])
+        self.assertEqual(0, simulator.simulate(plans[:1], player_index=1).mp_spent[0], "The enemy cannot spawn on our edge")
+
+    def test_parallel_evaluator(self):
+        from .evaluator import ParallelEvaluator
+        game = self.make_turn_0_map()
+        game.attempt_spawn("FF", [[13, 5]])
+        evaluator = ParallelEvaluator(2)
+        evaluator.start(game.config)
+        try:
+            evaluator.set_state(game)
+            results = evaluator.evaluate(_count_units_at, [[13, 5], [13, 6], [13, 5]], timeout=10)
+            self.assertEqual({0: 1, 1: 0, 2: 1}, results, "Workers should see the queued wall")
+            self.assertEqual({}, evaluator.evaluate(_count_units_at, [[13, 5]], deadline=0), "A passed deadline should return no results")
+        finally:
+            evaluator.close()
+
+    def test_parallel_evaluator_stdout(self):
+        import os
+        import sys
+        import tempfile
+        from .evaluator import ParallelEvaluator
+        game = self.make_turn_0_map()
+        captured = tempfile.TemporaryFile()
+        sys.stdout.flush()
+        saved_stdout = os.dup(1)
+        os.dup2(captured.fileno(), 1)
+        evaluator = ParallelEvaluator(1)
+        try:
+            evaluator.start(game.config)
+            evaluator.set_state(game)
+            self.assertEqual({0: [13, 0]}, evaluator.evaluate(_print_location, [[13, 0]], timeout=10), "The candidate was not scored")
+        finally:
+            evaluator.close()
+            os.dup2(saved_stdout, 1)
+            os.close(saved_stdout)
+        captured.seek(0)
+        self.assertEqual(b"", captured.read(), "A scoring function wrote to the engine's stdout")
+
+    def test_anytime_search(self):
+        from .budget import TurnBudget, AnytimeSearch
+        game = self.make_turn_0_map()
+        budget = TurnBudget(game.config)
+        self.assertAlmostEqual(4.0, budget.soft_limit, 5, "Soft limit should be 80% of waitTimeBotSoft")
+
+        search = AnytimeSearch(budget, fallback_plan="nothing")
+        self.assertEqual("depth 4", search.run(lambda depth, b: ("depth {}".format(depth), depth), max_depth=4), "Deepest plan should win")
+        self.assertEqual(4, search.depth, "All four depths should complete")
+
+        def timing_out(depth, b):
+            if depth > 2:
+                b.soft_limit = 0
+                b.check()
+            return ("depth {}".format(depth), depth)
+        search = AnytimeSearch(TurnBudget(game.config), fallback_plan="nothing")
+        self.assertEqual("depth 2", search.run(timing_out), "Best completed plan should be kept when the budget runs out")
+
+    def test_background_precompute(self):
+        from .background import BackgroundPrecompute, edge_paths
+        game = self.make_turn_0_map()
+        frame = json.loads(game.serialized_string)
+        frame["turnInfo"] = [1, 0, 5]
+        frame["p1Units"][0].append([13, 3, 75.0, "1"])
+        frame["p1Units"][3].append([13, 0, 15.0, "2"])
+
+        background = BackgroundPrecompute(game.config)
+        try:
+            background.register("paths", edge_paths)
+            background.submit_frame(frame)
+            self.assertTrue(background.wait(10), "Background worker never finished")
+
+            next_turn = json.loads(game.serialized_string)
+            next_turn["p1Units"][0].append([13, 3, 60.0, "1"])
+            precomputed = background.collect(next_turn)
+            self.assertIn((13, 0), precomputed.get("paths", {}), "Expected a precomputed path from [13, 0]")
+            self.assertEqual({}, background.collect(json.loads(game.serialized_string)), "A different board should not use the cache")
+        finally:
+            background.stop()
+
+    def test_background_collect_mid_compute(self):
+        import threading
+        from .background import BackgroundPrecompute
+        game = self.make_turn_0_map()
+        frame = json.loads(game.serialized_string)
+        frame["turnInfo"] = [1, 0, 5]
+        started = threading.Event()
+        release = threading.Event()
+        ran = []
+
+        def slow(game_state):
+            started.set()
+            release.wait(10)
+            ran.append("slow")
+        background = BackgroundPrecompute(game.config)
+        try:
+            background.register("a_slow", slow)
+            background.register("b_next", lambda game_state: ran.append("next"))
+            background.submit_frame(frame)
+            self.assertTrue(started.wait(10), "Background worker never started")
+            self.assertEqual({}, background.collect(json.loads(game.serialized_string)), "Nothing was finished before the turn")
+            release.set()
+            self.assertTrue(background.wait(10), "Background worker never finished")
+            self.assertEqual(["slow"], ran, "Tasks kept running after the turn was collected")
+            self.assertIsNone(background._cache_signature, "An abandoned computation was cached")
+        finally:
+            release.set()
+            background.stop()
+
+    def test_incremental_state(self):
+        game = self.make_turn_0_map()
+        turn = json.loads(game.serialized_string)
+        turn["p1Units"][0].append([13, 3, 75.0, "1"])
+        turn["p2Units"][2].append([13, 20, 90.0, "2"])
+        game = GameState(game.config, json.dumps(turn))
+        game.suppress_warnings(True)
+        game.attempt_spawn("PI", [13, 0])
+
+        frame = json.loads(json.dumps(turn))
+        frame["turnInfo"] = [1, 0, 0]
+        frame["events"]["spawn"] = [[[13, 0], 3, "3", 1], [[14, 5], 1, "4", 1]]
+        frame["events"]["move"] = [[[13, 0], [13, 1], [0, 0], 3, "3", 1]]
+        frame["events"]["damage"] = [[[13, 20], 10.0, 2, "2", 2]]
+        frame["events"]["death"] = [[[13, 3], 0, "1", 1, False]]
+        del frame["p1Units"], frame["p2Units"]
+        version = game.structure_version
+        game.apply_frame(frame)
+
+        self.assertEqual(1, len(game.game_map[13, 1]), "The scout should have moved")
+        self.assertEqual(0, len(game.game_map[13, 0]), "The locally spawned scout should be dropped")
+        self.assertEqual(0, len(game.game_map[13, 3]), "The dead wall should be removed")
+        self.assertEqual(80.0, game.game_map[13, 20][0].health, "The turret should have taken damage")
+        self.assertGreater(game.structure_version, version, "Structure changes should bump the version")
+
+        frame = json.loads(json.dumps(turn))
+        frame["turnInfo"] = [1, 0, 1]
+        frame["events"] = {"shield": [[[14, 5], [13, 1], 2.0, 1, "4", "3", 1]]}
+        frame["p1Units"] = [[], [[14, 5, 30.0, "4"]], [], [[13, 1, 15.0, "3"]], [], [], [], []]
+        frame["p2Units"][2] = [[13, 20, 75.0, "2"]]
+        self.assertEqual(0, game.apply_frame(frame), "The tracked units already match the frame")
+        self.assertEqual(2.0, game.game_map[13, 1][0].shield, "The shield should go to the shield field")
+        self.assertEqual(15.0, game.game_map[13, 1][0].health, "A shield event should not change health")
+        self.assertEqual(75.0, game.game_map[13, 20][0].health, "Health should follow the frame's unit lists")
+
+        next_turn = json.loads(game.serialized_string)
+        next_turn["turnInfo"] = [0, 1, -1]
+        next_turn["p1Units"][0] = []
+        next_turn["p1Units"][1] = [[14, 5, 30.0, "4"]]
+        next_turn["p2Units"][2] = [[13, 20, 80.0, "2"]]
+        self.assertEqual(1, game.reconcile(json.dumps(next_turn)), "Only the scout should need removing")
+        self.assertEqual(1, game.turn_number, "Turn number should follow the turn message")
+        self.assertEqual(0, len(game.game_map[13, 1]), "Mobile units should be gone at the start of a turn")
+        self.assertEqual("EF", game.game_map[14, 5][0].unit_type, "The spawned support should be kept")
+
+    def test_frame_scan(self):
+        from .util import get_turn_info, has_events, decode_events
+        frame = '{"p2Units":[[],[],[],[],[],[],[]],"turnInfo":[1,4,17],"events":{"selfDestruct":[],"breach":[[[3,12],1.0,3,"9",2]],"damage":[], "death": [ ]}}'
+        self.assertEqual([1, 4, 17], get_turn_info(frame), "turnInfo was not read correctly")
+        self.assertTrue(has_events(frame, ["breach"]), "The breach should be found")
+        self.assertFalse(has_events(frame, ["damage", "death", "spawn"]), "Empty or missing events should be skipped")
+        self.assertEqual({"breach": [[[3, 12], 1.0, 3, "9", 2]], "spawn": []}, decode_events(frame, ["breach", "spawn"]), "Wrong events decoded")
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_resource_projection(self):
+        from .resources import ResourceProjection
+        game = self.make_turn_0_map()
+        projection = ResourceProjection(game, 10)
+        for turns in range(1, 11):
+            self.assertAlmostEqual(game.project_future_MP(turns), projection.get_MP(turns), 5, "MP projection disagrees with project_future_MP")
+            self.assertAlmostEqual(game.project_future_MP(turns, 1), projection.get_MP(turns, 1), 5, "Enemy MP projection disagrees with project_future_MP")
+        self.assertEqual(35, projection.get_SP(2), "SP should grow by coresPerRound")
+
+        game.game_map.add_unit("EF", [13, 5], 0)
+        game.game_map.add_unit("FF", [13, 6], 0)
+        game.game_map[13, 6][0].pending_removal = True
+        projection = ResourceProjection(game, 3)
+        self.assertAlmostEqual(25 + 5 + 1 + 0.75, projection.get_SP(1), 5, "Support income and wall refund are missing")
+        self.assertAlmostEqual(projection.get_SP(1) + 6, projection.get_SP(2), 5, "The refund should only be paid once")
+
+    def test_turn_metrics(self):
+        import os
+        import threading
+        import tempfile
+        from . import metrics
+        path = os.path.join(tempfile.mkdtemp(), "metrics.jsonl")
+        metrics.active = metrics.TurnMetrics(path)
+        try:
+            metrics.active.begin_turn(0)
+            game = self.make_turn_0_map()
+            game.attempt_spawn("SI", [13, 0], 2)
+            game.find_path_to_edge([13, 0])
+            background = threading.Thread(target=game.find_path_to_edge, args=([14, 0],))
+            background.start()
+            background.join()
+            metrics.active.close()
+        finally:
+            metrics.active = None
+
+        with open(path) as f:
+            record = json.loads(f.readline())
+        self.assertEqual(0, record["turn"], "Wrong turn recorded")
+        self.assertEqual(1, record["counts"]["attempt_spawn"], "attempt_spawn calls were not counted")
+        self.assertEqual(2, record["counts"]["can_spawn"], "can_spawn calls were not counted")
+        self.assertEqual(1, record["counts"]["pathfinding"], "Pathfinding was not counted, or counted on a background thread")
+        self.assertIn("state_parse", record["times"], "GameState parse time was not recorded")
+
+    def test_slow_turn_profiling(self):
+        import os
+        import time
+        import tempfile
+        from .profiling import SlowTurnProfiler
+        directory = tempfile.mkdtemp()
+        profiler = SlowTurnProfiler(0.01, directory)
+        profiler.run(1, time.sleep, 0.02)
+        self.assertEqual([], profiler.profiled_turns, "The first slow turn itself should not be profiled")
+        profiler.run(2, time.sleep, 0)
+        self.assertEqual([2], profiler.profiled_turns, "The turn after a slow turn was not profiled")
+        self.assertTrue(os.path.exists(os.path.join(directory, "turn_2.pstats")), "No pstats file was written")
+        self.assertTrue(os.path.exists(os.path.join(directory, "turn_2.txt")), "No summary was written")
+        profiler.run(3, time.sleep, 0)
+        self.assertEqual([2], profiler.profiled_turns, "A turn after a fast turn was profiled")
+
+    def test_transcript_replay(self):
+        import os
+        import tempfile
+        from . import util
+        from .algocore import AlgoCore
+        from .transcript import replay_transcript
+        game = self.make_turn_0_map()
+        messages = [json.dumps(game.config), game.serialized_string, json.dumps({"turnInfo": [2, 0, 0]})]
+
+        class Builder(AlgoCore):
+            def on_game_start(self, config):
+                self.config = config
+            def on_turn(self, turn_state):
+                game_state = GameState(self.config, turn_state)
+                game_state.attempt_spawn("FF", [13, 13])
+                game_state.submit_turn()
+
+        path = os.path.join(tempfile.mkdtemp(), "transcript.txt")
+        algo = Builder()
+        algo.record_transcript(path)
+        result = replay_transcript(algo, messages)
+        self.assertIsNone(util._recording, "Recording was not stopped at the end of the game")
+        self.assertTrue(result.completed, "The end of game message was not reached")
+        self.assertEqual([('[["FF", 13, 13]]', '[]')], result.turns, "Wrong commands captured")
+
+        replayed = replay_transcript(Builder(), path)
+        self.assertEqual(result.commands, replayed.commands, "Replaying the recorded transcript gave different commands")
+
+        truncated = replay_transcript(Builder(), messages[:2])
+        self.assertFalse(truncated.completed, "A transcript without an end message was reported complete")
+
+    def test_replay_file(self):
+        import os
+        import tempfile
+        from .replay import ReplayFile
+        game = self.make_turn_0_map()
+        turn = json.loads(game.serialized_string)
+        turn["p1Units"][2] = [[3, 12, 75, "1"]]
+        turn["p2Units"][0] = [[10, 16, 60, "2"]]
+        turn["p1Stats"][0] = 25.0
+        frame = dict(turn, turnInfo=[1, 0, 0])
+        next_turn = dict(turn, turnInfo=[0, 1, -1])
+        path = os.path.join(tempfile.mkdtemp(), "match.replay")
+        with open(path, "w") as f:
+            for message in [game.config, turn, frame, next_turn]:
+                f.write(json.dumps(message) + "\n\n")
+
+        replay = ReplayFile(path)
+        self.assertEqual(game.config, replay.config, "Config was not read")
+        self.assertEqual(3, len(list(replay)), "Wrong number of frames")
+        self.assertEqual([0, 1], [s.turn_number for s in replay.turn_states()], "Wrong turn states")
+
+        state = next(replay.turn_states(turns={1}))
+        self.assertEqual(1, state.turn_number, "Turn filter ignored")
+        self.assertEqual(0, state.contains_stationary_unit([3, 12]).player_index, "Player 1's turret is missing")
+        self.assertEqual(25, state.my_health, "Wrong health")
+
+        mirrored = next(replay.frames(1)).game_state(player_index=1)
+        self.assertEqual(0, mirrored.contains_stationary_unit([17, 11]).player_index, "Player 2's wall was not mirrored to the bottom")
+        self.assertEqual(1, mirrored.contains_stationary_unit([24, 15]).player_index, "Player 1's turret was not mirrored to the top")
+        self.assertEqual(25, mirrored.enemy_health, "Stats were not swapped")
+
+    def test_debug_log(self):
+        import io
+        from . import log
+        stream = io.StringIO()
+        log.active = log.DebugLog(log.INFO, rate_limit=2, stream=stream)
+        try:
+            game = self.make_turn_0_map()
+            game.suppress_warnings(False)
+            for x in range(5):
+                game.attempt_spawn("FF", [x, 20])
+            log.debug("test", "Hidden {}", object())
+            location = [1]
+            log.info("test", "Shown {}", location)
+            location[0] = 2
+            self.assertEqual("", stream.getvalue(), "Messages were written before the flush")
+            self.assertFalse(log.enabled(log.WARNING, "spawn"), "The spawn category should be rate limited")
+            log.active.flush()
+        finally:
+            log.active = None
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(4, len(lines), "Wrong number of lines written: {}".format(lines))
+        self.assertTrue(lines[0].startswith("Could not spawn FF at location [0, 20]."), "Warning was not formatted")
+        self.assertEqual("Shown [1]", lines[2], "Info message missing or not formatted when it was logged")
+        self.assertEqual("3 more 'spawn' messages suppressed", lines[3], "Suppressed messages not summarised")
+
+    def test_command_encoder(self):
+        import io
+        import sys
+        game = self.make_turn_0_map()
+        game.attempt_spawn("FF", [[3, 12], [4, 12]])
+        game.attempt_upgrade([3, 12])
+        game.attempt_spawn("SI", [13, 0], 2)
+        self.assertEqual((json.dumps(game._build_stack), json.dumps(game._deploy_stack)), game._commands.lines(), "Encoded lines differ from json.dumps")
+        game._build_stack.append(("FF", 13, 4))
+        game._deploy_stack.pop()
+        self.assertEqual((json.dumps(game._build_stack), json.dumps(game._deploy_stack)), game._commands.lines(), "Direct changes to the queues were not submitted")
+        self.assertEqual([], game._commands.validate(game.config), "A valid payload was rejected")
+
+        game._commands.add_build("SI", 3, 3)
+        game._commands.add_build("FF", 4, 12)
+        game._commands.add_deploy("SI", 13, 5)
+        game._commands.add_deploy("SI", 13, 14)
+        self.assertEqual(4, len(game._commands.validate(game.config)), "Invalid entries were not all reported")
+
+        output = io.StringIO()
+        saved_stdout, sys.stdout = sys.stdout, output
+        try:
+            game.submit_turn(validate=True)
+        finally:
+            sys.stdout = saved_stdout
+        lines = output.getvalue().splitlines()
+        self.assertEqual(2, len(lines), "Turn should be two lines")
+        self.assertEqual(game._build_stack, [tuple(entry) for entry in json.loads(lines[0])], "Build line is wrong")
+
+    def test_async_algocore(self):
+        import time
+        import asyncio
+        from .async_algocore import AsyncAlgoCore
+        from .transcript import replay_transcript
+        game = self.make_turn_0_map()
+        turn = json.loads(game.serialized_string)
+        messages = [json.dumps(game.config), json.dumps(turn)]
+        for frame_number in range(10):
+            messages.append(json.dumps(dict(turn, turnInfo=[1, 0, frame_number])))
+        messages.append(json.dumps(dict(turn, turnInfo=[0, 1, -1])))
+        messages.append(json.dumps({"turnInfo": [2, 1, 0]}))
+
+        class Slow(AsyncAlgoCore):
+            def on_game_start(self, config):
+                self.config = config
+                self.frames = []
+            async def on_turn(self, turn_state):
+                await asyncio.sleep(0.01)
+                game_state = GameState(self.config, turn_state)
+                game_state.attempt_spawn("SI", [13, 0], game_state.turn_number + 1)
+                game_state.submit_turn()
+            def on_action_frame(self, frame):
+                # Falls behind on the first frame so the rest queue up
+                if not self.frames:
+                    time.sleep(0.05)
+                self.frames.append(json.loads(frame)["turnInfo"][2])
+
+        algo = Slow()
+        result = replay_transcript(algo, messages)
+        self.assertTrue(result.completed, "The end of game message was not reached")
+        self.assertEqual([('[]', '[["SI", 13, 0]]'), ('[]', '[["SI", 13, 0], ["SI", 13, 0]]')], result.turns, "Turns were answered out of order")
+        self.assertEqual(9, algo.frames[-1], "The newest frame was skipped")
+        self.assertEqual(10, len(algo.frames) + algo.coalesced_frames, "Frames were lost without being counted")
+        self.assertGreater(algo.coalesced_frames, 0, "Stale frames were not coalesced")
+
+    def test_async_algocore_read_error(self):
+        import os
+        import sys
+        import subprocess
+        script = ("import gamelib.async_algocore as core\n"
+                  "core.MESSAGE_LIMIT = 1000\n"
+                  "core.AsyncAlgoCore().start()\n")
+        algo = subprocess.Popen([sys.executable, "-c", script], cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            _, errors = algo.communicate(b"x" * 5000 + b"\n", timeout=20)
+        except subprocess.TimeoutExpired:
+            algo.kill()
+            algo.communicate()
+            self.fail("The algo kept running after its reader failed")
+        self.assertIn(b"Could not read engine message", errors, "The read error was not logged")
+
+    def test_event_aggregator(self):
+        from .events import EventAggregator, BREACHES, STRUCTURE_DAMAGE, DEATHS, SPAWN_DAMAGE
+        events = EventAggregator(decay=0.5)
+        events.add_events({
+            "spawn": [[[13, 0], 3, "10", 1], [[3, 12], 2, "11", 2]],
+            "attack": [[[13, 1], [3, 12], 2.0, 3, "10", "11", 1], [[3, 12], [13, 1], 6.0, 2, "11", "10", 2]],
+            "selfDestruct": [[[13, 2], [[3, 12], [4, 12]], 5.0, 3, "10", 1]],
+            "damage": [[[3, 12], 2.0, 2, "11", 2], [[13, 1], 6.0, 3, "10", 1]],
+            "death": [[[13, 2], 3, "10", 1, False], [[5, 12], 0, "12", 2, True]],
+            "breach": [[[0, 13], 1, 3, "13", 2], [[0, 13], 1, 3, "14", 2], [[0, 13], 1, 3, "16", 2]],
+        })
+        self.assertEqual(3, events.get(BREACHES, [0, 13], 1, history=False), "Breaches not counted")
+        self.assertEqual(0, events.get(BREACHES, [0, 13], 1), "Current turn leaked into history")
+        self.assertEqual(2.0, events.get(STRUCTURE_DAMAGE, [3, 12], 1, history=False), "Mobile unit damage counted as structure damage")
+        self.assertEqual(0, events.get(STRUCTURE_DAMAGE, [13, 1], 0, history=False), "Mobile unit damage counted as structure damage")
+        self.assertEqual(1, events.get(DEATHS, [13, 2], 0, history=False), "Death not counted")
+        self.assertEqual(0, events.get(DEATHS, [5, 12], 1, history=False), "Removal counted as a death")
+        self.assertEqual(12.0, events.get(SPAWN_DAMAGE, [13, 0], 0, history=False), "Damage not credited to the spawn point")
+        self.assertEqual([], events.locations(SPAWN_DAMAGE, 1, history=False), "Structure damage credited to a spawn point")
+
+        events.end_turn()
+        events.add_events({"breach": [[[27, 13], 1, 3, "15", 2]]})
+        events.end_turn()
+        self.assertEqual(1.5, events.get(BREACHES, [0, 13], 1), "History did not decay")
+        self.assertEqual([[0, 13], [27, 13]], events.locations(BREACHES, 1), "Locations not sorted by count")
+        self.assertEqual([[0, 13]], events.locations(BREACHES, 1, minimum=1.0), "Minimum ignored")
+        self.assertEqual({}, events._spawns, "Spawn ids kept across turns")
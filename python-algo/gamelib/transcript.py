@@ -0,0 +1,69 @@
+"""
+Offline replay of recorded engine transcripts.
+
+A transcript is the exact stream of messages the engine wrote to the algo's stdin,
+recorded with AlgoCore.record_transcript() (or util.start_recording()). Feeding it
+back to an algo in the same process, with no engine and no subprocess, gives a
+deterministic benchmark and regression check on real game traffic.
+"""
+import io
+import sys
+import time
+
+from .util import debug_write
+
+
+class TranscriptResult:
+    """What an algo did while a transcript was replayed
+
+    Attributes :
+        * commands (list): Every line the algo wrote to stdout, in order, without the newline
+        * turns (list): The commands grouped in (build, deploy) pairs, one pair per turn
+        * elapsed (float): Seconds spent in algo.start()
+        * completed (bool): False if the transcript ended before the end of game message
+
+    """
+    def __init__(self, commands, elapsed, completed):
+        self.commands = commands
+        self.turns = [tuple(commands[i:i + 2]) for i in range(0, len(commands) - 1, 2)]
+        self.elapsed = elapsed
+        self.completed = completed
+
+
+def replay_transcript(algo, transcript):
+    """Runs algo.start() on a recorded transcript and captures its commands
+
+    stdin and stdout are swapped out while the algo runs and restored afterwards,
+    so any AlgoCore subclass can be replayed unchanged. Debug output still goes to stderr.
+
+    Args:
+        algo: An AlgoCore instance, start() has not been called yet
+        transcript: Path to a transcript file, or a list of message strings
+
+    Returns:
+        A TranscriptResult
+
+    """
+    if isinstance(transcript, str):
+        with open(transcript) as f:
+            messages = f.read()
+    else:
+        messages = "".join(m if m.endswith("\n") else m + "\n" for m in transcript)
+
+    output = io.StringIO()
+    saved_stdin, saved_stdout = sys.stdin, sys.stdout
+    sys.stdin, sys.stdout = io.StringIO(messages), output
+    completed = True
+    start = time.perf_counter()
+    try:
+        algo.start()
+    except SystemExit:
+        # get_command exits when stdin runs dry before the end of game message
+        completed = False
+    finally:
+        elapsed = time.perf_counter() - start
+        sys.stdin, sys.stdout = saved_stdin, saved_stdout
+
+    if not completed:
+        debug_write("Transcript ended before the end of game message")
+    return TranscriptResult(output.getvalue().splitlines(), elapsed, completed)
@@ -26,13 +26,15 @@ class GameUnit:
         * shieldRange (float): The effective range of this unit for shielding
         * max_health (float): The starting health of this unit. Note than 'health' can be increased beyond this value by shielding in some game configurations.
         * health (float): The current health of this unit
+        * shield (float): Shield this unit has been given, tracked by GameState.apply_frame
         * cost ([int, int]): The resource costs of this unit first is SP second is MP
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * unit_id (string): The id the engine gave this unit, None for units created locally
 
     """
-    def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
+    def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1, unit_id=None):
         """ Initialize unit variables using args passed
 
         """
@@ -43,8 +45,10 @@ class GameUnit:
         self.upgraded = False
         self.x = x
         self.y = y
+        self.unit_id = unit_id
         self.__serialize_type()
         self.health = self.max_health if not health else health
+        self.shield = 0
 
     def __serialize_type(self):
         from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
@@ -1,8 +1,34 @@
 import sys
+import json
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
 
+_decoder = json.JSONDecoder()
+
+# File the engine messages are copied to, None unless start_recording was called
+_recording = None
+
+
+def start_recording(path):
+    """Copies every engine message read by get_command to a transcript file.
+    The transcript holds the exact stdin stream and can be fed back to an algo with gamelib.transcript.replay_transcript.
+
+    Args:
+        path: The file to write, it is overwritten
+
+    """
+    global _recording
+    stop_recording()
+    _recording = open(path, "w")
+
+def stop_recording():
+    """Closes the transcript file, does nothing if nothing is being recorded
+    """
+    global _recording
+    if _recording is not None:
+        _recording.close()
+        _recording = None
 
 def get_command():
     """Gets input from stdin
@@ -19,8 +45,17 @@ def get_command():
         # Don't change or starter-algo process won't exit even though the game has closed
         debug_write("Got EOF, parent game process must have died, exiting for cleanup")
         exit()
+    _record(ret)
     return ret
 
+def _record(message):
+    """Appends a message read from the engine to the transcript, if one is being recorded
+    """
+    if _recording is not None:
+        _recording.write(message)
+        # Flushed per message so the transcript survives the engine killing us
+        _recording.flush()
+
 def send_command(cmd):
     """Sends your turn to standard output.
     Should usually only be called by 'GameState.submit_turn()'
@@ -29,6 +64,14 @@ def send_command(cmd):
     sys.stdout.write(cmd.strip() + "\n")
     sys.stdout.flush()
 
+def send_commands(*cmds):
+    """Sends several commands with a single write and flush, used by 'GameState.submit_turn()'
+    so the engine receives both lines of a turn at once.
+
+    """
+    sys.stdout.write("".join(cmd.strip() + "\n" for cmd in cmds))
+    sys.stdout.flush()
+
 def debug_write(*msg):
     """Prints a message to the games debug output
 
@@ -39,3 +82,67 @@ def debug_write(*msg):
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
     sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
     sys.stderr.flush()
+
+def _find_value(message, key):
+    """Index of the first character of the value stored under key in a json message, or -1 if the key is missing
+    """
+    start = message.find('"{}"'.format(key))
+    if start == -1:
+        return -1
+    start = message.find(':', start + len(key) + 2)
+    if start == -1:
+        return -1
+    start += 1
+    while start < len(message) and message[start] in ' \t\r\n':
+        start += 1
+    return start
+
+def get_turn_info(message):
+    """Reads the turnInfo list of an engine message without decoding the rest of it
+
+    Args:
+        message: A raw turn or action frame string
+
+    Returns:
+        The turnInfo list, for example [1, 3, 12] for frame 12 of turn 3's action phase
+
+    """
+    start = _find_value(message, "turnInfo")
+    if start == -1:
+        return json.loads(message)["turnInfo"]
+    return _decoder.raw_decode(message, start)[0]
+
+def has_events(message, kinds):
+    """Cheaply checks whether any of the given event lists in a frame string are non empty
+
+    Args:
+        message: A raw action frame string
+        kinds: Event names, for example ["breach", "death"]
+
+    Returns:
+        True if at least one of the event lists has an entry
+
+    """
+    for kind in kinds:
+        start = _find_value(message, kind)
+        # Only a few characters past the bracket are looked at, whitespace heavy messages count as non empty
+        if start != -1 and message.startswith('[', start) and message[start + 1:start + 8].lstrip()[:1] != ']':
+            return True
+    return False
+
+def decode_events(message, kinds):
+    """Decodes only the requested event lists of a frame string
+
+    Args:
+        message: A raw action frame string
+        kinds: Event names, for example ["breach", "death"]
+
+    Returns:
+        A dict mapping each kind to its list of events, empty if the kind is missing
+
+    """
+    events = {}
+    for kind in kinds:
+        start = _find_value(message, kind)
+        events[kind] = _decoder.raw_decode(message, start)[0] if start != -1 else []
+    return events
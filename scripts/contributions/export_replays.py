@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Copyright: CC0 - completely open to edit, share, etc
+
+Short Description:
+This is a python script to save videos (gif or mp4) of many replays at once without opening any
+windows or asking any questions, using every core of your machine. Useful on a server or in CI.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory, next to watch_replay.py
+and replay_stream.py. It needs matplotlib, and Pillow for gifs or ffmpeg for mp4s.
+
+The videos look the same as the ones saved by watch_replay.py. The frames of every replay are split
+into segments that are drawn by different processes at the same time, and the segments are then
+joined into one video per replay.
+
+The default is (saves the latest replay):
+>py scripts/contributions/export_replays.py
+
+Videos are saved in the videos folder (next to the replays folder) with the same name as the replay.
+A replay is skipped if its video is newer than the replay, unless you use --force.
+
+----------------------------------------------------------------------------------------
+-f, -n, -a: Which replays to save
+
+Like the other scripts you can give specific files, the latest N replays or every replay:
+>py scripts/contributions/export_replays.py -f replays/[REPLAY_FILE].replay
+>py scripts/contributions/export_replays.py -n 5
+>py scripts/contributions/export_replays.py -a
+
+----------------------------------------------------------------------------------------
+--lost: Only save games an algo lost
+
+>py scripts/contributions/export_replays.py -a --lost my-bot
+
+Unfinished replays are always skipped.
+
+----------------------------------------------------------------------------------------
+-w: Video format
+
+>py scripts/contributions/export_replays.py -w mp4
+
+Valid Options:
+	- auto	(default, mp4 if ffmpeg is installed, otherwise gif)
+	- gif	(needs Pillow)
+	- mp4	(needs ffmpeg)
+
+If what the format needs is missing the program stops with an error, it never offers to install it.
+
+----------------------------------------------------------------------------------------
+Other options:
+
+-o: the folder to save videos in
+-j: the number of processes to draw with (default is the number of cores)
+--fps: frames per second of the videos (default is 10, the normal speed of watch_replay.py)
+--dpi: resolution of the videos (default is 100, 1600x800 pixels)
+
+The program exits with code 1 if any replay could not be saved.
+'''
+
+try:
+	import os
+	import sys
+	import math
+	import shutil
+	import argparse
+	import tempfile
+	import warnings
+	import subprocess
+	import multiprocessing as mp
+except ImportError as e:
+	sys.stderr.write("WARNING: Module not found, full error:\n\n")
+	sys.stderr.write(e)
+
+# matplotlib must be told not to open windows before watch_replay imports it,
+# and watch_replay would ask to install it if it is missing
+try:
+	import matplotlib
+	matplotlib.use('Agg')
+	import matplotlib.animation as animation
+except ImportError:
+	sys.stderr.write('matplotlib is not installed, it is needed to draw the videos\n')
+	sys.exit(1)
+
+import replay_stream		# shared replay reader, in the same directory as this script
+import replay_catalog		# catalog of the replays folder, in the same directory as this script
+import watch_replay			# draws the frames, in the same directory as this script
+
+REPLAY_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'replays'))
+VIDEO_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'videos'))
+
+MIN_SEGMENT = 60		# the fewest frames worth giving to a process (each process has to open the replay first)
+
+
+# handles all the arguments
+def parse_args():
+	ap = argparse.ArgumentParser(add_help=False, formatter_class=argparse.RawTextHelpFormatter)
+	ap.add_argument('-h', '--help', action='help', help='show this help message and exit\n\n')
+	ap.add_argument(
+		'-f', '--file',
+		nargs='*',
+		default=[],
+		help="specify the replay files you'd like to save\n\n")
+	ap.add_argument(
+		'-a', '--all',
+		action='store_true',
+		help="saves every replay in the replays folder\n\n")
+	ap.add_argument(
+		'-n', '--num',
+		default=1,
+		type=int,
+		help="number of replays (newest first) to save\n\n")
+	ap.add_argument(
+		'--lost',
+		default=None,
+		help="only save games this algo lost\n\n")
+	ap.add_argument(
+		'-w', '--writer',
+		default='auto',
+		choices=['auto', 'gif', 'mp4'],
+		help="the video format (auto is mp4 if ffmpeg is installed, otherwise gif)\n\n")
+	ap.add_argument(
+		'-o', '--out_dir',
+		default=VIDEO_DIR,
+		help="the folder to save videos in (default is the videos folder next to replays)\n\n")
+	ap.add_argument(
+		'-j', '--jobs',
+		default=os.cpu_count() or 1,
+		type=int,
+		help="number of processes to draw frames with (default is the number of cores)\n\n")
+	ap.add_argument(
+		'--fps',
+		default=10,
+		type=int,
+		help="frames per second of the videos\n\n")
+	ap.add_argument(
+		'--dpi',
+		default=100,
+		type=int,
+		help="resolution of the videos (the window is 16x8 inches)\n\n")
+	ap.add_argument(
+		'--force',
+		action='store_true',
+		help="save videos even if they are newer than their replays\n\n")
+	return vars(ap.parse_args())
+
+# returns True if algo played in the replay and did not win, None if the replay has not finished
+def is_lost(f_name, algo):
+	end_stats = replay_stream.read_end_stats(f_name)
+	if end_stats is None:
+		return None
+	for player in (1, 2):
+		if end_stats['player{}'.format(player)]['name'] == algo and end_stats['winner'] != player:
+			return True
+	return False
+
+# returns 'gif' or 'mp4' depending on what is installed, or None (and says why) if the format can't be made
+def choose_writer(writer):
+	has_ffmpeg = animation.writers.is_available('ffmpeg')
+	try:
+		import PIL
+		has_pillow = True
+	except ImportError:
+		has_pillow = False
+
+	if writer == 'auto':
+		writer = 'mp4' if has_ffmpeg else 'gif'
+
+	if writer == 'mp4' and not has_ffmpeg:
+		sys.stderr.write('ffmpeg not installed or in PATH, it is needed for mp4 videos\n')
+		return None
+	if writer == 'gif' and not has_pillow:
+		sys.stderr.write('Pillow is not installed, it is needed for gif videos\n')
+		return None
+	return writer
+
+
+# the replay this process last drew, reused while it keeps getting segments of the same replay
+worker_replay = None
+worker_graph = None
+
+# draws the frames [start, stop) of a replay into a video file, runs in a worker process
+# returns (index of the replay, error message or None)
+def render_segment(task):
+	global worker_replay, worker_graph
+	index, f_name, start, stop, path, writer, fps, dpi = task
+
+	try:
+		warnings.filterwarnings('ignore', message='Animation was deleted')
+
+		if worker_replay is None or worker_replay.fname != f_name:
+			if worker_graph is not None:
+				watch_replay.plt.close(worker_graph.fig)
+			worker_replay = watch_replay.Replay(f_name)
+			worker_graph = watch_replay.Graph(worker_replay.frames, worker_replay.frames_in_turn, worker_replay.healths, ['empty'], False, show=False)
+
+		video = animation.PillowWriter(fps=fps) if writer == 'gif' else animation.FFMpegWriter(fps=fps)
+		with video.saving(worker_graph.fig, path, dpi):
+			for head in worker_replay.frame_order()[start:stop]:
+				worker_graph.draw_frame(head)
+				video.grab_frame()
+	except Exception as e:
+		return index, '{}: {}'.format(type(e).__name__, e)
+
+	return index, None
+
+# joins gif files into one with Pillow, every frame keeps the duration it had in its segment
+# raises ValueError if a segment is cut short (Pillow itself raises IndexError or EOFError for those)
+def join_gifs(paths, out_path):
+	from PIL import Image
+
+	segments = [Image.open(path) for path in paths]
+	try:
+		segments[0].save(out_path, save_all=True, append_images=segments[1:], loop=0)		# Pillow reads every frame of each segment
+	except (IndexError, EOFError) as e:
+		raise ValueError('a segment is not a complete gif ({}: {})'.format(type(e).__name__, e))
+	finally:
+		for segment in segments:
+			segment.close()
+
+# joins mp4 files into one with ffmpeg, without encoding them again
+def join_mp4s(paths, out_path):
+	list_path = out_path + '.txt'
+	with open(list_path, 'w') as f:
+		for path in paths:
+			f.write("file '{}'\n".format(os.path.abspath(path).replace("'", "'\\''")))
+
+	try:
+		subprocess.run(
+			[matplotlib.rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0', '-i', list_path, '-c', 'copy', out_path],
+			stdin=subprocess.DEVNULL, check=True)
+	finally:
+		os.remove(list_path)
+
+# joins the segments of a replay into its video
+def join_segments(paths, out_path, writer):
+	if len(paths) == 1:
+		shutil.move(paths[0], out_path)
+	elif writer == 'gif':
+		join_gifs(paths, out_path)
+	else:
+		join_mp4s(paths, out_path)
+
+	for path in paths:
+		if os.path.exists(path):
+			os.remove(path)
+
+# returns the number of frames render_segment can draw from a replay, from its frame index rather than by opening it
+def count_frames(f_name):
+	return len(watch_replay.frame_order(set((turn, frame) for turn, frame, offset, p1_health, p2_health in replay_stream.frame_index(f_name))))
+
+# returns the replays to save and where to save each of them
+def get_jobs(args, writer):
+	files = args['file'] if len(args['file']) > 0 else replay_catalog.latest_replays(args['num'], args['all'], REPLAY_DIR)
+
+	jobs = []
+	for f_name in files:
+		if args['lost'] is not None:
+			lost = is_lost(f_name, args['lost'])
+			if lost is None:
+				sys.stderr.write('Skipping unfinished replay: {}\n'.format(f_name))
+			if not lost:
+				continue
+
+		name = os.path.splitext(os.path.basename(f_name))[0]
+		out_path = os.path.join(args['out_dir'], '{}.{}'.format(name, writer))
+		if not args['force'] and os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(f_name):
+			sys.stderr.write('Up to date: {}\n'.format(out_path))
+			continue
+
+		jobs.append((f_name, out_path))
+	return jobs
+
+# saves a video of every replay asked for, returns the number that failed
+def main(args):
+	writer = choose_writer(args['writer'])
+	if writer is None:
+		return 1
+
+	if not os.path.isdir(args['out_dir']):
+		os.makedirs(args['out_dir'])
+
+	jobs = get_jobs(args, writer)
+	if len(jobs) == 0:
+		sys.stderr.write('No replays to save\n')
+		return 0
+
+	segment_dir = tempfile.mkdtemp(prefix='.segments-', dir=args['out_dir'])
+	failed = 0
+	try:
+		# split every replay into segments, so even a single replay uses every process
+		tasks = []
+		segments = []
+		for index, (f_name, out_path) in enumerate(jobs):
+			num_frames = count_frames(f_name)
+			size = max(MIN_SEGMENT, int(math.ceil(num_frames / float(args['jobs']))))
+
+			paths = []
+			for start in range(0, max(num_frames, 1), size):
+				path = os.path.join(segment_dir, '{}-{}.{}'.format(index, start, writer))
+				tasks.append((index, f_name, start, start + size, path, writer, args['fps'], args['dpi']))
+				paths.append(path)
+			segments.append(paths)
+
+		remaining = [len(paths) for paths in segments]
+		errors = [None for _ in jobs]
+
+		pool = mp.Pool(max(1, args['jobs']))
+		try:
+			for index, error in pool.imap_unordered(render_segment, tasks):
+				f_name, out_path = jobs[index]
+				errors[index] = errors[index] or error
+				remaining[index] -= 1
+				if remaining[index] > 0:
+					continue
+
+				# every segment of this replay is drawn
+				if errors[index] is None:
+					try:
+						join_segments(segments[index], out_path, writer)
+						sys.stderr.write('Wrote {}\n'.format(out_path))
+						continue
+					except (OSError, ValueError, subprocess.CalledProcessError) as e:
+						errors[index] = str(e)
+				sys.stderr.write('Could not save {}: {}\n'.format(f_name, errors[index]))
+				failed += 1
+		finally:
+			pool.close()
+			pool.join()
+	finally:
+		shutil.rmtree(segment_dir, ignore_errors=True)
+
+	return failed
+
+
+if __name__ == '__main__':
+	args = parse_args()					# get command line arguments
+	sys.exit(1 if main(args) else 0)	# run program
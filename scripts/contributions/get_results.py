@@ -14,7 +14,10 @@ This is a file to help display data about Terminal matches.
 
 README:
 
-This program assumes this file is in the contributions/scripts directory
+This program assumes this file is in the contributions/scripts directory, next to replay_stream.py
+
+If you have converted a replay with replay_cache.py (needs numpy), its cache file is used instead of
+the replay and analysing it is much faster.
 
 You can call this by opening Powershell or Terminal the same way you would start a game.
 Then, you can run it by executing:
@@ -145,6 +148,21 @@ In contrast:
 Will only display a summary and show the graph for wins (health graph parameter is simply
 ignored).
 
+If you give -avg when looking at many replays, the summary also shows each algo's averages
+over every match, along with its average end stats.
+
+----------------------------------------------------------------------------------------
+-j: Jobs (summarizing many replays in parallel)
+
+When only the summary is shown (-a or -n without -v), each replay is reduced to a small summary
+(wins, end stats and the numbers for -avg) and then thrown away, so memory use doesn't grow
+with the number of replays. You can spread this work over several processes with -j:
+>py scripts/contributions/get_results.py -a -j 8
+
+A progress counter is printed while the replays are analysed.
+
+----------------------------------------------------------------------------------------
+
 Note that the ':' still works for separating graphs when using the -v (verbose) flag.
 For example:
 >py scripts/contributions/get_results.py -a -g health : bits : cores wins -v
@@ -171,34 +189,49 @@ plt_installed = False
 try:
 	import os
 	import sys
-	import json
-	import glob
 	import math
 	import argparse
+	import multiprocessing as mp
+	from array import array
 except ImportError as e:
 	sys.stderr.write("WARNING: Module not found, full error:\n\n")
 	sys.stderr.write(e)
 
+# the shared readers are next to this script, which may be imported from another directory
+SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+if SCRIPT_DIR not in sys.path:
+	sys.path.insert(0, SCRIPT_DIR)
+
+import replay_stream		# shared replay reader, in the same directory as this script
+import replay_catalog		# catalog of the replays folder, in the same directory as this script
+
+try:
+	import numpy as np		# only used to read replay caches (see replay_cache.py)
+except ImportError:
+	np = None
+
 try:
 	import matplotlib.pyplot as plt
 	plt_installed = True
 except ImportError:
-	try:
-		usr_in = input('Matplotlib not found.\nWould you like this program to try and install matplotlib? (y/n) ')
-		if usr_in.lower() == 'y' or usr_in.lower() == 'yes':
-			import subprocess
-			subprocess.run(['python', '-m', 'pip', 'install', 'matplotlib'])
+	# only ask when run as a script, not when imported or in a -j worker process (which imports this file again)
+	if __name__ == '__main__':
+		try:
+			usr_in = input('Matplotlib not found.\nWould you like this program to try and install matplotlib? (y/n) ')
+			if usr_in.lower() == 'y' or usr_in.lower() == 'yes':
+				import subprocess
+				subprocess.run(['python', '-m', 'pip', 'install', 'matplotlib'])
 
-			try:
-				import matplotlib.pyplot as plt
-				plt_installed = True
-				sys.stderr.write('\n\n')
-			except ImportError as e:
-				sys.stderr.write('\n\n{}\n\n'.format(str(e)))
-				sys.stderr.write('Failed: Check to make sure you have all dependencies installed.\n\n')
-				sys.exit()
-	except:
-		plt_installed = False
+				try:
+					import matplotlib.pyplot as plt
+					plt_installed = True
+					sys.stderr.write('\n\n')
+				except ImportError as e:
+					sys.stderr.write('\n\n{}\n\n'.format(str(e)))
+					sys.stderr.write('Failed: Check to make sure you have all dependencies installed.\n\n')
+					sys.exit()
+		except:
+			plt_installed = False
 
 # handles all the arguments
 def parse_args():
@@ -231,6 +264,11 @@ def parse_args():
 		nargs="*",
 		default=[],
 		help="specify what data you would like to be graphed - you must have matplotlib installed\n\nValid Options For Single Game:\n\t- health\n\t- bits\n\t- cores\n\t- cores_spent\n\t- bits_spent\n\t- cores_on_board\n\nValid Options For Multiple Games:\n\t- wins\n\n")
+	ap.add_argument(
+		"-j", "--jobs",
+		default=1,
+		type=int,
+		help="number of processes to analyze replays with when summarizing many matches (-a or -n without -v)\n\n")
 	return vars(ap.parse_args())
 
 
@@ -326,13 +364,78 @@ class Graph:
 	def clear():
 		plt.close()
 
+# adds every number in data to the same key in totals (booleans and text are skipped)
+def add_numbers(totals, data):
+	for key, val in data.items():
+		if type(val) == int or type(val) == float:
+			totals[key] = totals.get(key, 0) + val
+
+# returns the sum and count of the values that are set (not nan)
+def nan_total(values):
+	if np is not None:
+		values = np.frombuffer(values, dtype=np.float64)
+		values = values[~np.isnan(values)]
+		return float(values.sum()), len(values)
+
+	values = [val for val in values if val == val]
+	return math.fsum(values), len(values)
+
+# Stores the data for every turn of an algo in a single replay
+# each kind of data (health, bits, etc) is an array of floats indexed by turn number, nan where a turn has no value
+class TurnSeries:
+	def __init__(self, num_turns=0):
+		self.capacity = num_turns	# the length of every column
+		self.num_turns = 0			# the highest turn with data + 1
+		self.columns = {}
+		self.end_stats = None
+
+	# makes sure every column has room for turn (doubling them if not)
+	def grow(self, turn):
+		if turn >= self.capacity:
+			capacity = max(turn + 1, self.capacity * 2, 16)
+			for column in self.columns.values():
+				column.extend(array('d', [float('nan')]) * (capacity - self.capacity))
+			self.capacity = capacity
+		if turn >= self.num_turns:
+			self.num_turns = turn + 1
+
+	# sets the value of arg for a turn - if cumulative it is added to the previous turn's value
+	def set(self, turn, arg, data, cumulative=False):
+		self.grow(turn)
+		if arg not in self.columns:
+			self.columns[arg] = array('d', [float('nan')]) * self.capacity
+		column = self.columns[arg]
+
+		if cumulative and turn > 0 and column[turn-1] == column[turn-1]:
+			column[turn] = column[turn-1] + data
+		else:
+			column[turn] = data
+
+	# returns the values of arg for every turn (raises KeyError if there are none)
+	def values(self, arg):
+		return self.columns[arg][:self.num_turns]
+
+	# returns the sum and count of every turn that has a value for arg
+	def total(self, arg):
+		return nan_total(self.values(arg))
+
+	# returns the value of arg for the last turn that has one
+	def last(self, arg):
+		for val in reversed(self.values(arg)):
+			if val == val:
+				return val
+		raise KeyError(arg)
+
 # Stores data pertaining to an individual Algo
 class Algo:
 	def __init__(self, name):
 		self.name = name
 		self.wins = 0
 		self.cores_on_board = {}
-		self.replays = {} 	# this effectively holds all raw json information
+		self.replays = {} 	# a TurnSeries for every replay this algo played in, keys are the replay file names
+		self.games = 0		# number of games merged in from summaries (see add_summary)
+		self.totals = {}	# sums and counts for get_average merged in from summaries
+		self.end_stats_totals = {}
 
 	# NOTE: eq will return true when comparing to strings of the same name - this is intentional to be able to use: str in listOfAlgos syntax.
 	def __eq__(self, other):
@@ -346,15 +449,25 @@ class Algo:
 	def __repr__(self):
 		return self.__string()
 
-	def get_average(self, arg, replay):
+	# returns the sum and count get_average divides, over every stored replay
+	def get_total(self, arg):
 		avg = 0.0
 		div = 0.0
 
-		for replay in self.replays:
-			div += len(self.replays[replay])
-			for turn in self.replays[replay]:
-				if turn == 'endStats': continue
-				avg += float(self.replays[replay][turn][arg])
+		for series in self.replays.values():
+			total, count = series.total(arg)
+			avg += total
+			div += count
+
+		return avg, div
+
+	def get_average(self, arg, replay):
+		avg, div = self.get_total(arg)
+		if len(self.replays) == 0 and arg not in self.totals:
+			raise KeyError(arg)		# same as an invalid arg when there are replays
+		if arg in self.totals:
+			avg += self.totals[arg][0]
+			div += self.totals[arg][1]
 
 		try:
 			return avg / div
@@ -362,34 +475,62 @@ class Algo:
 			sys.stderr.write("Error: Dividing by zero")
 			return -1
 
-	def add_data(self, replay, turn, arg, data, cumulative=False):
-		if replay in self.replays:
-			if turn in self.replays[replay]:
-				pass
-			else:
-				self.replays[replay][turn] = {}
-		else:
-			self.replays[replay] = {}
-			self.replays[replay][turn] = {}
-
-		if cumulative:
-			try:
-				self.replays[replay][turn][arg] = self.replays[replay][turn-1][arg] + data
-			except KeyError:
-				self.replays[replay][turn][arg] = data
-		else:
-			self.replays[replay][turn][arg] = data
+	# creates the TurnSeries for a replay with room for num_turns turns (it still grows if there are more)
+	def add_replay(self, replay, num_turns=0):
+		if replay not in self.replays:
+			self.replays[replay] = TurnSeries(num_turns)
 
+	def add_data(self, replay, turn, arg, data, cumulative=False):
+		self.add_replay(replay)
+		self.replays[replay].set(turn, arg, data, cumulative)
 
 	def recored_final_data(self, replay, other):
-		self_hp = list(self.replays[replay].items())[-1][1]['health']
-		other_hp = list(other.replays[replay].items())[-1][1]['health']
+		self_hp = self.replays[replay].last('health')
+		other_hp = other.replays[replay].last('health')
 
 		if self_hp > other_hp:
 			self.wins += 1
 
 	def add_end_stats(self, replay, endStats):
-		self.replays[replay]['endStats'] = endStats;
+		self.replays[replay].end_stats = endStats;
+
+	# returns the average of each numeric end stat over every game (stored replays and merged summaries)
+	def get_end_stats_average(self):
+		totals = dict(self.end_stats_totals)
+		games = self.games
+		for series in self.replays.values():
+			if series.end_stats is not None:
+				add_numbers(totals, series.end_stats)
+				games += 1
+
+		return {key: val / games for key, val in totals.items()} if games > 0 else {}
+
+	# returns the summary of a single replay for this algo (see Replay.summarize)
+	def get_summary(self, replay, avg_options):
+		totals = {}
+		for arg in avg_options:
+			try:
+				totals[arg] = self.get_total(arg)
+			except KeyError:
+				pass
+
+		series = self.replays.get(replay)
+		return {
+			'name': self.name,
+			'wins': self.wins,
+			'end_stats': series.end_stats if series is not None and series.end_stats is not None else {},
+			'totals': totals
+		}
+
+	# merges the summary of a replay that was analysed somewhere else (eg a worker process)
+	def add_summary(self, summary):
+		self.wins += summary['wins']
+		self.games += 1
+		add_numbers(self.end_stats_totals, summary['end_stats'])
+
+		for arg, (avg, div) in summary['totals'].items():
+			total = self.totals.get(arg, (0.0, 0.0))
+			self.totals[arg] = (total[0] + avg, total[1] + div)
 
 	def print_block(self, header, data):
 		hLen = 7
@@ -412,10 +553,17 @@ class Algo:
 
 	def print_end_stats(self, replay):
 		try:
-			del self.replays[replay]['endStats']['name']
+			del self.replays[replay].end_stats['name']
 		except KeyError:
 			pass
-		self.print_block('End Stats', self.replays[replay]['endStats'])
+		self.print_block('End Stats', self.replays[replay].end_stats)
+
+	# prints the averages over every game, used in the summary of many matches
+	def disp_averages(self, options):
+		sys.stderr.write('{}:\n'.format(self))
+		self.print_avgs(options, 'avg', None)
+		self.print_block('Average End Stats', self.get_end_stats_average())
+		sys.stderr.write('\n')
 
 	def disp_data(self, options, replay):
 		sys.stderr.write('{}:\n'.format(self))
@@ -433,7 +581,7 @@ class Algo:
 				Graph.advance()
 			else:
 				disp = True
-				data = [self.replays[replay][turn][lbl] for turn in self.replays[replay] if turn != 'endStats']
+				data = self.replays[replay].values(lbl).tolist()
 				Graph.add_to_plot(data, '{}\'s {}'.format(self, lbl), xlabel, y_label)
 		Graph.reset_pos()
 
@@ -445,11 +593,12 @@ class Replay:
 	def __init__(self, f_name, algos):
 		self.fname = f_name;
 		self.ref = None
-		self.turns = {}
+		self.end_stats = None
 		self.valid_turns = []
+		self.seen_turns = set()
 
-		self.load_data()				# handles loading all the data from file into python variables
-		self.unpack_data(algos)		# stores relevant data after it has been loaded
+		self.load_data()				# reads the config and endStats (the first and last lines)
+		self.unpack_data(algos)		# streams through the frames and stores relevant data
 
 	def __eq__(self, other):
 		return self.fname == other.fname
@@ -460,24 +609,21 @@ class Replay:
 	def __repr__(self):
 		return self.__string()
 
+	# only the first and last lines are read here, the frames are streamed by unpack_data
+	# if the replay has an up to date cache (see replay_cache.py) it is used instead
 	def load_data(self):
-		with open(self.fname) as f:
-			for line in f:
-				line = line.replace("\n", "")
-				line = line.replace("\t", "")
-
-				if (line != ''):
-					data = json.loads(line)
-
-					try:
-						data['debug']
-						self.ref = data
-					except:
-						turn_num = data['turnInfo'][1]
-						frame_num = data['turnInfo'][2]
-						self.turns[(turn_num, frame_num)] = data
-						if (turn_num, frame_num) not in self.valid_turns:
-							self.valid_turns.append((turn_num, frame_num))
+		self.cache = replay_stream.load_cache(self.fname)
+		if self.cache is not None:
+			self.ref = self.cache.config
+			self.end_stats = self.cache.end_stats
+		else:
+			self.ref = replay_stream.read_config(self.fname, use_cache=False)
+			self.end_stats = replay_stream.read_end_stats(self.fname, use_cache=False)
+
+	# yields each frame with only the fields unpack_data uses
+	def stream_turns(self):
+		fields = ['p1Stats', 'p1Units', 'p2Stats', 'p2Units', 'events']
+		return replay_stream.stream_frames(self.fname, fields, events=['spawn'], unique=True)
 
 	def get_cores_on_board(self, filters, encryptors, destructors):
 		return len(filters) + len(encryptors) * 4 + len(destructors) * 3
@@ -496,49 +642,107 @@ class Replay:
 		destructors = [x for x in spawn if x[3] == p_index and x[1] == 2]
 		return len(filters) + len(encryptors) * 4 + len(destructors) * 3
 
+	# returns the cores and bits a player spent in every frame of the cache, from its spawn events
+	def get_spent_per_frame(self, algo, spawn, num_frames):
+		p_index = 1 if algo == self.algo1 else 2
+		frame_index, nums, ids = spawn
+		unit_type = nums[:, 2]
+		mine = nums[:, 3] == p_index
+
+		cores = (unit_type == 0) * 1 + (unit_type == 1) * 4 + (unit_type == 2) * 3
+		bits = (unit_type == 3) * 1 + (unit_type == 4) * 3 + (unit_type == 5) * 1
+
+		cores_spent = np.bincount(frame_index[mine], weights=cores[mine], minlength=num_frames)
+		bits_spent = np.bincount(frame_index[mine], weights=bits[mine], minlength=num_frames)
+		return cores_spent.astype(int), bits_spent.astype(int)
+
 	def add_data_to_algo(self, algo, t, f, stats, units, spawn):
+		filters, encryptors, destructors, pings, emps, scramblers, removes = units
+		cores_on_board = self.get_cores_on_board(filters, encryptors, destructors)
+
+		if f == 0:
+			self.add_numbers_to_algo(algo, t, f, stats, cores_on_board, self.get_cores_spent(algo, spawn), self.get_bits_spent(algo, spawn))
+		else:
+			self.add_numbers_to_algo(algo, t, f, stats, cores_on_board)
+
+	def add_numbers_to_algo(self, algo, t, f, stats, cores_on_board, cores_spent=0, bits_spent=0):
 		algo.add_data(self.fname, t, 'health', stats[0])
 		algo.add_data(self.fname, t, 'cores', stats[1])
 		algo.add_data(self.fname, t, 'bits', stats[2])
+		algo.add_data(self.fname, t, 'cores_on_board', cores_on_board)
 
-		filters, encryptors, destructors, pings, emps, scramblers, removes = units
+		if f == 0:
+			algo.add_data(self.fname, t, 'cores_spent', cores_spent, True)
+			algo.add_data(self.fname, t, 'bits_spent', bits_spent, True)
 
-		algo.add_data(self.fname, t, 'cores_on_board', self.get_cores_on_board(filters, encryptors, destructors))
+	# same as streaming the frames in unpack_data, but each number is worked out for every frame at once from the cache's columns
+	def unpack_cached(self, spawn):
+		cache = self.cache
+		rows = cache.unique_frames()
+		turn_info = cache.turn_info[rows, 1:3].tolist()
 
-		if f == 0:
-			algo.add_data(self.fname, t, 'cores_spent', self.get_cores_spent(algo, spawn), True)
-			algo.add_data(self.fname, t, 'bits_spent', self.get_bits_spent(algo, spawn), True)
+		per_algo = []
+		for algo, key in ((self.algo1, 'p1'), (self.algo2, 'p2')):
+			stats = cache.stats(key + 'Stats')[rows, :3].tolist()
 
-	def unpack_data(self, algos):
-		try:
-			self.algo1, self.algo2 = self.create_algos(algos)
+			filters, encryptors, destructors, pings, emps, scramblers, removes = cache.unit_counts(key + 'Units')[rows].T
+			cores_on_board = (filters + encryptors * 4 + destructors * 3).tolist()
+
+			cores_spent, bits_spent = self.get_spent_per_frame(algo, spawn, len(cache))
+			per_algo.append((algo, stats, cores_on_board, cores_spent[rows].tolist(), bits_spent[rows].tolist()))
+
+		for i, (t, f) in enumerate(turn_info):
+			self.valid_turns.append((t, f))
+			self.seen_turns.add((t, f))
 
-			for t, f in self.get_valid_turns():
-				turn = self.get_turn(t, f)
+			for algo, stats, cores_on_board, cores_spent, bits_spent in per_algo:
+				self.add_numbers_to_algo(algo, t, f, stats[i], cores_on_board[i], cores_spent[i], bits_spent[i])
 
-				turn_info = turn['turnInfo']
-				events = turn['events']
-				spawn = events['spawn']
+	# streams through the frames, keeping only the fields that are used
+	def unpack_stream(self):
+		for t, f, turn in self.stream_turns():
+			self.valid_turns.append((t, f))
+			self.seen_turns.add((t, f))
 
-				p1_stats = turn['p1Stats']
-				p1_units = turn['p1Units']
+			spawn = turn['events']['spawn']
 
-				p2_stats = turn['p2Stats']
-				p2_units = turn['p2Units']
+			p1_stats = turn['p1Stats']
+			p1_units = turn['p1Units']
 
-				self.add_data_to_algo(self.algo1, t, f, p1_stats, p1_units, spawn)
-				self.add_data_to_algo(self.algo2, t, f, p2_stats, p2_units, spawn)
+			p2_stats = turn['p2Stats']
+			p2_units = turn['p2Units']
+
+			self.add_data_to_algo(self.algo1, t, f, p1_stats, p1_units, spawn)
+			self.add_data_to_algo(self.algo2, t, f, p2_stats, p2_units, spawn)
+
+	def unpack_data(self, algos):
+		try:
+			self.algo1, self.algo2 = self.create_algos(algos)
+
+			# the turn columns are allocated once, the engine's turn count is only a hint since they can grow
+			num_turns = int(self.cache.turn_info[:, 1].max()) + 1 if self.cache is not None and len(self.cache) > 0 else self.end_stats.get('turns', 0) + 1
+			self.algo1.add_replay(self.fname, num_turns)
+			self.algo2.add_replay(self.fname, num_turns)
+
+			# spawn events are None if the cache had to store them as json
+			spawn = self.cache.events('spawn') if self.cache is not None else None
+			if spawn is not None:
+				self.unpack_cached(spawn)
+			else:
+				self.unpack_stream()
 
 			self.algo1.recored_final_data(self.fname, self.algo2)
 			self.algo2.recored_final_data(self.fname, self.algo1)
-			self.algo1.add_end_stats(self.fname, self.turns[self.valid_turns[-1]]['endStats']['player1'])
-			self.algo2.add_end_stats(self.fname, self.turns[self.valid_turns[-1]]['endStats']['player2'])
+			self.algo1.add_end_stats(self.fname, self.end_stats['player1'])
+			self.algo2.add_end_stats(self.fname, self.end_stats['player2'])
 		except Exception as e:
 			sys.stderr.write(str(e))
 
 	# only creates a new algo class if that algo does not already exist. Otherwise data is added to the existing one
 	def create_algos(self, algos):
-		end_stats = self.turns[self.valid_turns[-1]]['endStats']
+		end_stats = self.end_stats
+		if end_stats is None:
+			raise RuntimeError('{} has no endStats, the game may not have finished\n'.format(self.fname))
 		p1_algo = end_stats['player1']['name']
 		p2_algo = end_stats['player2']['name']
 
@@ -559,18 +763,34 @@ class Replay:
 	def get_algos(self):
 		return [self.algo1, self.algo2]
 
+	# reduces this replay to a small summary per algo (wins, endStats and the sums for averages)
+	# this only makes sense if the algos were created for this replay alone (see summarize_replay)
+	def summarize(self, avg_options):
+		try:
+			algos = [self.algo1] if self.algo1 is self.algo2 else [self.algo1, self.algo2]
+		except AttributeError:	# the replay could not be loaded
+			return []
+		return [algo.get_summary(self.fname, avg_options) for algo in algos]
+
 	def get_valid_turns(self):
 		return self.valid_turns
-	def get_turns(self):
-		return self.turns
-	def get_turn(self, turn, frame=-1):
-		return self.turns[(turn, frame)]
+	def is_valid_turn(self, turn, frame=-1):
+		return (turn, frame) in self.seen_turns
+
+# loads a single replay and reduces it to a summary - this runs in the worker processes when using -j
+def summarize_replay(f_name, avg_options):
+	return Replay(f_name, []).summarize(avg_options)
+
+# Pool.imap passes a single argument
+def summarize_task(task):
+	return summarize_replay(*task)
 
 # handles opening multiple games (replays)
 class FileHandler:
 	def __init__(self):
 		self.replays = []
 		self.algos = []
+		self.num_replays = 0	# the number of replays loaded or summarized
 
 	def get_algo_win_summary(self):
 		fill_len = len(max(self.algos, key=lambda e:len(e.name)).name) + 9
@@ -593,23 +813,47 @@ class FileHandler:
 		return self.replays[i]
 
 	def __latest_replays(self, num=1, a=False):
-		replay_dir = os.path.dirname(os.path.realpath(__file__)).replace('scripts\\contributions', '')+'replays\\'
-		files = glob.glob('{}*.replay'.format(replay_dir))
-		files = sorted(files, key=os.path.getctime, reverse=True)
-		if a:
-			return files
-		return files[:num]
+		return replay_catalog.latest_replays(num, a)
 
-	def load_files(self, num=1, a=False, f_names=[]):
+	def get_file_names(self, num=1, a=False, f_names=[]):
 		if len(f_names) > 0:
-			for f_name in f_names:
-				if f_name.find('replays') == -1:
-					self.replays.append(Replay('replays/'+f_name, self.algos))
-				else:
-					self.replays.append(Replay(f_name, self.algos))
+			return [f_name if f_name.find('replays') != -1 else 'replays/'+f_name for f_name in f_names]
+		return self.__latest_replays(num, a)
+
+	def load_files(self, num=1, a=False, f_names=[]):
+		for f_name in self.get_file_names(num, a, f_names):
+			self.replays.append(Replay(f_name, self.algos))
+		self.num_replays = len(self.replays)
+
+	# merges the summary of a replay into the algos (creating algos the first time they are seen)
+	def add_summary(self, summary):
+		for algo_summary in summary:
+			if algo_summary['name'] not in self.algos:
+				self.algos.append(Algo(algo_summary['name']))
+			self.algos[self.algos.index(algo_summary['name'])].add_summary(algo_summary)
+		self.num_replays += 1
+
+	# like load_files, but each replay is reduced to a summary and thrown away, so memory does not grow with the number of replays
+	# with more than one job the replays are summarized in worker processes
+	def summarize_files(self, num=1, a=False, f_names=[], avg_options=[], jobs=1):
+		files = self.get_file_names(num, a, f_names)
+		tasks = [(f_name, avg_options) for f_name in files]
+
+		if jobs > 1 and len(files) > 1:
+			pool = mp.Pool(min(jobs, len(files)))
+			summaries = pool.imap(summarize_task, tasks, chunksize=max(1, min(16, len(files) // (jobs * 4))))
 		else:
-			for f_name in self.__latest_replays(num, a):
-				self.replays.append(Replay(f_name, self.algos))
+			pool = None
+			summaries = map(summarize_task, tasks)
+
+		try:
+			for i, summary in enumerate(summaries):
+				self.add_summary(summary)
+				show_progress(i+1, len(files))
+		finally:
+			if pool is not None:
+				pool.close()
+				pool.join()
 
 	def add_plot(self, lbl):
 		if lbl == 'wins':
@@ -630,6 +874,18 @@ class FileHandler:
 			Graph.advance()
 
 
+# writes how many of the replays have been analysed (every replay in a terminal, otherwise every 10%)
+def show_progress(done, total):
+	if sys.stderr.isatty():
+		sys.stderr.write('\rAnalysed {}/{} replays'.format(done, total))
+		if done == total:
+			sys.stderr.write('\n\n')
+	elif done == total or done % max(1, total // 10) == 0:
+		sys.stderr.write('Analysed {}/{} replays\n'.format(done, total))
+		if done == total:
+			sys.stderr.write('\n')
+	sys.stderr.flush()
+
 # displays detailed data for every replay stored in the fileManager fh.
 def run_every_replay_verbose(fh, graphing_enabled, options):
 	for replay in fh.get_replays():
@@ -660,12 +916,17 @@ def run_every_replay_verbose(fh, graphing_enabled, options):
 		sys.stderr.write('\n')
 
 # displayed aggregate data over many matches and replay files
-def run_every_replay_agg(fh, graphing_enabled, options):
+def run_every_replay_agg(fh, graphing_enabled, options, avg_options={}):
 	sys.stderr.write('{:->75}\n'.format(''))
-	sys.stderr.write('Summary of {} matches:\n'.format(len(fh.get_replays())))
+	sys.stderr.write('Summary of {} matches:\n'.format(fh.num_replays))
 	sys.stderr.write('{:->75}\n'.format(''))
 	sys.stderr.write(fh.get_algo_win_summary())
 
+	if len(avg_options.get('avg', [])) > 0:
+		sys.stderr.write('\n')
+		for algo in fh.algos:
+			algo.disp_averages(avg_options)
+
 	if graphing_enabled:
 		Graph.init(options)
 		for option in options:
@@ -710,8 +971,14 @@ def get_graph_options(options):
 def main(args):
 	verbose_options, summary_options = get_graph_options(args['graph'])
 
+	# a summary of many matches only needs each replay's summary, so the replays are not kept in memory
+	summary_only = not args['verbose'] and (args['all'] or int(args['num']) > 1)
+
 	fh = FileHandler()
-	fh.load_files(int(args['num']), args['all'], args['file']) #loads the files - all JSON reading is here
+	if summary_only:
+		fh.summarize_files(int(args['num']), args['all'], args['file'], args['averages'], args['jobs'])
+	else:
+		fh.load_files(int(args['num']), args['all'], args['file']) #loads the files - all JSON reading is here
 
 	# check to see if matplotlib is installed
 	graphing_enabled = True if len(verbose_options) > 0 or len(summary_options) > 0 else False
@@ -730,12 +997,12 @@ def main(args):
 	# checks the arguments to see what inforation should be displayed
 	if args['all']:
 		run_every_replay_verbose(fh, graphing_enabled, options) if args['verbose'] else ''
-		run_every_replay_agg(fh, graphing_enabled, options['graph_summary'])
+		run_every_replay_agg(fh, graphing_enabled, options['graph_summary'], options)
 	elif int(args['num']) == 1:
 		run_every_replay_verbose(fh, graphing_enabled, options)
 	elif int(args['num']) > 1 or len(args['file']) > 0:
 		run_every_replay_verbose(fh, graphing_enabled, options) if args['verbose'] else ''
-		run_every_replay_agg(fh, graphing_enabled, options['graph_summary'])
+		run_every_replay_agg(fh, graphing_enabled, options['graph_summary'], options)
 
 	sys.stderr.write('\n\n')
 
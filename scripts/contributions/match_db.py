@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Copyright: CC0 - completely open to edit, share, etc
+
+Short Description:
+This is a python script to keep a SQLite database of every match in the replays folder and ask it
+questions (win rates, averages by turn, end stats) without parsing the replays again.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory, next to replay_stream.py
+
+The database is replays-cache/matches.db by default, in the cache folder next to the replays
+folder (use --db to pick another file). Every command can be followed by -h to see all of its options.
+
+----------------------------------------------------------------------------------------
+ingest: Add replays to the database
+
+>py scripts/contributions/match_db.py ingest
+
+adds every finished replay in the replays folder, as listed by the catalog (see replay_catalog.py).
+Only replays that are new or have changed since they were last ingested (by path and modified time)
+are read, so running it again is quick.
+You can also give specific files:
+>py scripts/contributions/match_db.py ingest -f [REPLAY_FILE].replay [REPLAY_FILE].replay
+
+For each replay it stores who played and won, the end stats, each player's stats at the start
+of every turn and the spawn, breach, damage and death events.
+
+----------------------------------------------------------------------------------------
+algos: Games and wins of every algo
+
+>py scripts/contributions/match_db.py algos
+
+----------------------------------------------------------------------------------------
+winrate: Win rate of an algo, optionally against another algo and in a date range
+
+>py scripts/contributions/match_db.py winrate my-bot --vs starter-algo --since tuesday
+
+Dates (--since and --until) can be YYYY-MM-DD, "YYYY-MM-DD HH:MM", today, yesterday, a day of
+the week (the most recent one) or a number of days ago (eg 7d). A match's date is when its
+replay was created, the same time replay_catalog.py sorts and filters by.
+
+----------------------------------------------------------------------------------------
+by-turn: The average of a stat on each turn
+
+>py scripts/contributions/match_db.py by-turn points_scored --algo my-bot
+
+Valid stats:
+	- health, cores, bits, time	(at the start of the turn)
+	- points_scored				(damage the algo's units did by breaching that turn)
+	- spawn, breach, damage, death	(number of those events for the algo's units that turn)
+
+----------------------------------------------------------------------------------------
+end-stats: The average end stats of each algo
+
+>py scripts/contributions/match_db.py end-stats --algo my-bot
+
+----------------------------------------------------------------------------------------
+sql: Run any query
+
+>py scripts/contributions/match_db.py sql "SELECT algo, COUNT(*) FROM players GROUP BY algo"
+
+Tables:
+	replays(id, path, mtime_ns, size, played_at, turns, frames, duration, winner)
+	players(replay_id, player, algo, won, crashed)
+	end_stats(replay_id, player, stat, value)
+	turn_stats(replay_id, player, turn, health, cores, bits, time)
+	events(replay_id, turn, frame, kind, player, x, y, unit_type, amount)
+
+player is 1 or 2, played_at is a unix timestamp.
+'''
+
+try:
+	import os
+	import sys
+	import time
+	import sqlite3
+	import argparse
+	import datetime
+except ImportError as e:
+	sys.stderr.write("WARNING: Module not found, full error:\n\n")
+	sys.stderr.write(e)
+
+import replay_stream		# shared replay reader, in the same directory as this script
+import replay_catalog		# catalog of the replays folder, in the same directory as this script
+
+REPLAY_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'replays'))
+DEFAULT_DB = os.path.join(replay_stream.cache_dir(REPLAY_DIR), 'matches.db')
+
+EVENT_KINDS = ['spawn', 'breach', 'damage', 'death']
+TURN_STATS = ['health', 'cores', 'bits', 'time']
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS replays (
+	id INTEGER PRIMARY KEY,
+	path TEXT UNIQUE NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	size INTEGER NOT NULL,
+	played_at REAL NOT NULL,
+	turns INTEGER,
+	frames INTEGER,
+	duration INTEGER,
+	winner INTEGER
+);
+CREATE INDEX IF NOT EXISTS replays_played_at ON replays (played_at);
+
+CREATE TABLE IF NOT EXISTS players (
+	replay_id INTEGER NOT NULL REFERENCES replays (id) ON DELETE CASCADE,
+	player INTEGER NOT NULL,
+	algo TEXT NOT NULL,
+	won INTEGER NOT NULL,
+	crashed INTEGER,
+	PRIMARY KEY (replay_id, player)
+);
+CREATE INDEX IF NOT EXISTS players_algo ON players (algo, replay_id);
+
+CREATE TABLE IF NOT EXISTS end_stats (
+	replay_id INTEGER NOT NULL REFERENCES replays (id) ON DELETE CASCADE,
+	player INTEGER NOT NULL,
+	stat TEXT NOT NULL,
+	value REAL,
+	PRIMARY KEY (replay_id, player, stat)
+);
+
+CREATE TABLE IF NOT EXISTS turn_stats (
+	replay_id INTEGER NOT NULL REFERENCES replays (id) ON DELETE CASCADE,
+	player INTEGER NOT NULL,
+	turn INTEGER NOT NULL,
+	health REAL,
+	cores REAL,
+	bits REAL,
+	time REAL,
+	PRIMARY KEY (replay_id, player, turn)
+);
+
+CREATE TABLE IF NOT EXISTS events (
+	replay_id INTEGER NOT NULL REFERENCES replays (id) ON DELETE CASCADE,
+	turn INTEGER NOT NULL,
+	frame INTEGER NOT NULL,
+	kind TEXT NOT NULL,
+	player INTEGER,
+	x INTEGER,
+	y INTEGER,
+	unit_type INTEGER,
+	amount REAL
+);
+CREATE INDEX IF NOT EXISTS events_turn ON events (kind, replay_id, player, turn);
+'''
+
+
+# handles all the arguments
+def parse_args():
+	ap = argparse.ArgumentParser(add_help=False, formatter_class=argparse.RawTextHelpFormatter)
+	ap.add_argument('-h', '--help', action='help', help='show this help message and exit\n\n')
+	ap.add_argument(
+		'--db',
+		default=DEFAULT_DB,
+		help="the database file to use (replays-cache/matches.db by default)\n\n")
+	commands = ap.add_subparsers(dest='command')
+
+	ingest = commands.add_parser('ingest', help='add new or changed replays to the database')
+	ingest.add_argument(
+		'-f', '--file',
+		nargs='*',
+		default=[],
+		help="specify replay files to ingest (default is every replay in the replays folder)\n\n")
+
+	commands.add_parser('algos', help='games and wins of every algo')
+
+	winrate = commands.add_parser('winrate', help='win rate of an algo')
+	winrate.add_argument('algo')
+	winrate.add_argument('--vs', default=None, help='only count games against this algo')
+	add_date_args(winrate)
+
+	by_turn = commands.add_parser('by-turn', help='the average of a stat on each turn')
+	by_turn.add_argument('stat', choices=TURN_STATS + ['points_scored'] + EVENT_KINDS)
+	by_turn.add_argument('--algo', default=None, help='only count this algo (default is every algo)')
+	add_date_args(by_turn)
+
+	end_stats = commands.add_parser('end-stats', help='the average end stats of each algo')
+	end_stats.add_argument('--algo', default=None, help='only show this algo')
+	add_date_args(end_stats)
+
+	sql = commands.add_parser('sql', help='run any query')
+	sql.add_argument('query')
+
+	return vars(ap.parse_args())
+
+def add_date_args(parser):
+	parser.add_argument('--since', default=None, help='only count games played on or after this date')
+	parser.add_argument('--until', default=None, help='only count games played before this date')
+
+# converts a date argument into a unix timestamp (see the README above for the formats)
+def parse_date(text):
+	text = text.strip().lower()
+	today = datetime.datetime.combine(datetime.date.today(), datetime.time())
+
+	if text == 'today':
+		day = today
+	elif text == 'yesterday':
+		day = today - datetime.timedelta(days=1)
+	elif text in WEEKDAYS:
+		day = today - datetime.timedelta(days=(today.weekday() - WEEKDAYS.index(text)) % 7)
+	elif text.endswith('d') and text[:-1].isdigit():
+		day = today - datetime.timedelta(days=int(text[:-1]))
+	else:
+		for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+			try:
+				day = datetime.datetime.strptime(text, fmt)
+				break
+			except ValueError:
+				pass
+		else:
+			raise ValueError("unknown date '{}'".format(text))
+
+	return time.mktime(day.timetuple())
+
+# opens (and creates if needed) the database
+def connect(db_path):
+	db_dir = os.path.dirname(os.path.abspath(db_path))
+	if not os.path.isdir(db_dir):
+		os.makedirs(db_dir)
+
+	db = sqlite3.connect(db_path)
+	db.execute('PRAGMA foreign_keys = ON')
+	db.executescript(SCHEMA)
+	return db
+
+# returns the number if value is a number, otherwise None (booleans become 0 or 1)
+def number(value):
+	if type(value) in (int, float, bool):
+		return float(value)
+	return None
+
+# yields the database rows for the events of one frame
+def event_rows(replay_id, turn, frame, events):
+	for event in events.get('spawn', []):
+		(x, y), unit_type, unit_id, owner = event[:4]
+		yield (replay_id, turn, frame, 'spawn', owner, x, y, unit_type, None)
+	for event in events.get('breach', []):
+		(x, y), damage, unit_type, unit_id, owner = event[:5]
+		yield (replay_id, turn, frame, 'breach', owner, x, y, unit_type, damage)
+	for event in events.get('damage', []):
+		(x, y), damage, unit_type, unit_id, owner = event[:5]
+		yield (replay_id, turn, frame, 'damage', owner, x, y, unit_type, damage)
+	for event in events.get('death', []):
+		(x, y), unit_type, unit_id, owner = event[:4]
+		yield (replay_id, turn, frame, 'death', owner, x, y, unit_type, None)
+
+# reads a single replay into the database, replacing what was there for that path
+# returns False if the replay has not finished (it will be ingested next time)
+def ingest_replay(db, f_name, mtime_ns, size, played_at):
+	end_stats = replay_stream.read_end_stats(f_name)
+	if end_stats is None:
+		return False
+
+	db.execute('DELETE FROM replays WHERE path = ?', (f_name,))
+	replay_id = db.execute(
+		'INSERT INTO replays (path, mtime_ns, size, played_at, turns, frames, duration, winner) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+		(f_name, mtime_ns, size, played_at, end_stats.get('turns'), end_stats.get('frames'), end_stats.get('duration'), end_stats.get('winner'))
+	).lastrowid
+
+	for player in (1, 2):
+		stats = end_stats['player{}'.format(player)]
+		db.execute(
+			'INSERT INTO players (replay_id, player, algo, won, crashed) VALUES (?, ?, ?, ?, ?)',
+			(replay_id, player, stats.get('name'), 1 if end_stats.get('winner') == player else 0, number(stats.get('crashed')))
+		)
+		db.executemany(
+			'INSERT INTO end_stats (replay_id, player, stat, value) VALUES (?, ?, ?, ?)',
+			[(replay_id, player, stat, number(value)) for stat, value in stats.items() if number(value) is not None]
+		)
+
+	turn_rows = []
+	events = []
+	for turn, frame, data in replay_stream.stream_frames(f_name, ['p1Stats', 'p2Stats', 'events'], EVENT_KINDS, unique=True):
+		if data['turnInfo'][0] == 0:
+			for player in (1, 2):
+				stats = data['p{}Stats'.format(player)]
+				turn_rows.append((replay_id, player, turn) + tuple(stats[:4]))
+		events.extend(event_rows(replay_id, turn, frame, data['events']))
+
+	db.executemany('INSERT OR REPLACE INTO turn_stats (replay_id, player, turn, health, cores, bits, time) VALUES (?, ?, ?, ?, ?, ?, ?)', turn_rows)
+	db.executemany('INSERT INTO events (replay_id, turn, frame, kind, player, x, y, unit_type, amount) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', events)
+	return True
+
+# ingests every replay that is new or has changed since it was last ingested
+# with no files given the replays come from the catalog of replay_dir, which also gives when they were played
+def ingest(db, f_names=[], replay_dir=REPLAY_DIR):
+	played = {}
+	if len(f_names) == 0:
+		replay_dir = os.path.abspath(replay_dir)
+		catalog = replay_catalog.connect(replay_dir)
+		try:
+			replay_catalog.update(catalog, replay_dir)
+			f_names = replay_catalog.replays(catalog, replay_dir=replay_dir)[::-1]		# oldest first
+			played = replay_catalog.created_times(catalog, replay_dir)
+		finally:
+			catalog.close()
+
+	known = {path: (mtime_ns, size, played_at) for path, mtime_ns, size, played_at in db.execute('SELECT path, mtime_ns, size, played_at FROM replays')}
+
+	added = 0
+	skipped = 0
+	unfinished = 0
+	for f_name in f_names:
+		f_name = os.path.abspath(f_name)
+		try:
+			st = os.stat(f_name)
+		except OSError as e:
+			sys.stderr.write('Could not read {}: {}\n'.format(f_name, e))
+			continue
+
+		played_at = played.get(f_name, st.st_ctime)		# a file not in the catalog gets the time the catalog would give it
+		if known.get(f_name) == (st.st_mtime_ns, st.st_size, played_at):
+			skipped += 1
+			continue
+
+		try:
+			with db:		# each replay is its own transaction
+				if ingest_replay(db, f_name, st.st_mtime_ns, st.st_size, played_at):
+					added += 1
+				else:
+					unfinished += 1
+		except Exception as e:
+			sys.stderr.write('Could not ingest {}: {}\n'.format(f_name, e))
+			continue
+
+		if sys.stderr.isatty():
+			sys.stderr.write('\rIngested {} replays'.format(added))
+
+	sys.stderr.write('\rIngested {} replays ({} already up to date, {} not finished)\n'.format(added, skipped, unfinished))
+
+# returns the sql (and its parameters) to only count games in the date range
+def date_filter(args, table='r'):
+	sql = ''
+	params = []
+	if args.get('since'):
+		sql += ' AND {}.played_at >= ?'.format(table)
+		params.append(parse_date(args['since']))
+	if args.get('until'):
+		sql += ' AND {}.played_at < ?'.format(table)
+		params.append(parse_date(args['until']))
+	return sql, params
+
+# prints rows as a table with a header
+def print_table(header, rows):
+	rows = [['' if val is None else (round(val, 2) if type(val) == float else val) for val in row] for row in rows]
+	widths = [max([len(str(h))] + [len(str(row[i])) for row in rows]) for i, h in enumerate(header)]
+	print('  '.join('{: >{w}}'.format(h, w=w) for h, w in zip(header, widths)))
+	for row in rows:
+		print('  '.join('{: >{w}}'.format(str(val), w=w) for val, w in zip(row, widths)))
+
+def show_algos(db):
+	rows = db.execute('SELECT algo, COUNT(*), SUM(won), AVG(won) * 100 FROM players GROUP BY algo ORDER BY SUM(won) DESC, algo').fetchall()
+	print_table(['algo', 'games', 'wins', 'win %'], rows)
+
+def show_winrate(db, args):
+	sql = 'SELECT COUNT(*), SUM(p.won) FROM players p JOIN replays r ON r.id = p.replay_id'
+	params = []
+	if args['vs'] is not None:
+		sql += ' JOIN players o ON o.replay_id = p.replay_id AND o.player != p.player AND o.algo = ?'
+		params.append(args['vs'])
+	sql += ' WHERE p.algo = ?'
+	params.append(args['algo'])
+
+	dates, date_params = date_filter(args)
+	games, wins = db.execute(sql + dates, params + date_params).fetchone()
+	wins = wins or 0
+
+	against = ' against {}'.format(args['vs']) if args['vs'] is not None else ''
+	if games == 0:
+		print('{} has no games{}'.format(args['algo'], against))
+	else:
+		print('{} won {} of {} games{} ({:.1f}%)'.format(args['algo'], wins, games, against, 100.0 * wins / games))
+
+def show_by_turn(db, args):
+	stat = args['stat']
+	params = []
+
+	if stat in TURN_STATS:
+		value = 'AVG(t.{})'.format(stat)
+		join = ''
+	else:
+		# the events of each player on each turn, turns without any count as 0
+		kind, total = ('breach', 'SUM(amount)') if stat == 'points_scored' else (stat, 'COUNT(*)')
+		value = 'AVG(COALESCE(e.total, 0))'
+		join = ' LEFT JOIN (SELECT replay_id, player, turn, {} AS total FROM events WHERE kind = ? GROUP BY replay_id, player, turn) e ON e.replay_id = t.replay_id AND e.player = t.player AND e.turn = t.turn'.format(total)
+		params.append(kind)
+
+	sql = 'SELECT t.turn, {}, COUNT(*) FROM turn_stats t JOIN players p ON p.replay_id = t.replay_id AND p.player = t.player JOIN replays r ON r.id = t.replay_id{} WHERE 1'.format(value, join)
+	if args['algo'] is not None:
+		sql += ' AND p.algo = ?'
+		params.append(args['algo'])
+
+	dates, date_params = date_filter(args)
+	rows = db.execute(sql + dates + ' GROUP BY t.turn ORDER BY t.turn', params + date_params).fetchall()
+	print_table(['turn', stat, 'games'], rows)
+
+def show_end_stats(db, args):
+	sql = 'SELECT p.algo, s.stat, AVG(s.value), COUNT(*) FROM end_stats s JOIN players p ON p.replay_id = s.replay_id AND p.player = s.player JOIN replays r ON r.id = s.replay_id WHERE 1'
+	params = []
+	if args['algo'] is not None:
+		sql += ' AND p.algo = ?'
+		params.append(args['algo'])
+
+	dates, date_params = date_filter(args)
+	rows = db.execute(sql + dates + ' GROUP BY p.algo, s.stat ORDER BY p.algo, s.stat', params + date_params).fetchall()
+	print_table(['algo', 'stat', 'average', 'games'], rows)
+
+def run_sql(db, query):
+	cursor = db.execute(query)
+	if cursor.description is not None:
+		print_table([col[0] for col in cursor.description], cursor.fetchall())
+	db.commit()
+
+def main(args):
+	if args['command'] is None:
+		sys.stderr.write('Give a command, see -h for the list\n')
+		return
+
+	db = connect(args['db'])
+	try:
+		if args['command'] == 'ingest':
+			ingest(db, args['file'])
+		elif args['command'] == 'algos':
+			show_algos(db)
+		elif args['command'] == 'winrate':
+			show_winrate(db, args)
+		elif args['command'] == 'by-turn':
+			show_by_turn(db, args)
+		elif args['command'] == 'end-stats':
+			show_end_stats(db, args)
+		elif args['command'] == 'sql':
+			run_sql(db, args['query'])
+	except (ValueError, sqlite3.Error) as e:
+		sys.stderr.write('{}\n'.format(e))
+	finally:
+		db.close()
+
+
+if __name__ == '__main__':
+	args = parse_args()	# get command line arguments
+	main(args)			# run program
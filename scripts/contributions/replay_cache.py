@@ -0,0 +1,444 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Copyright: CC0 - completely open to edit, share, etc
+
+Short Description:
+This is a python script to convert .replay files into columnar cache files (.cache.npz) that
+get_results.py and watch_replay.py load instead of parsing the replay's json again.
+Requires numpy.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This program assumes this file is in the contributions/scripts directory, next to replay_stream.py
+
+A replay is a json line per frame, so every time you analyse one it has to be parsed again.
+This script parses it once and writes the frames as numpy arrays (a table per kind of data)
+to the cache folder next to the replays folder: replays/[REPLAY_FILE].replay -> replays-cache/[REPLAY_FILE].cache.npz
+
+The cache stores the modified time and size of the replay it was made from. If the replay changes
+the cache is ignored until you convert it again. If the cache exists and is up to date, both
+get_results.py and watch_replay.py will use it automatically (through replay_stream.py).
+If numpy is not installed the scripts simply read the replay files like normal.
+
+The default is (converts the latest replay):
+>py scripts/contributions/replay_cache.py
+
+-f: Convert specific replay files
+>py scripts/contributions/replay_cache.py -f [REPLAY_FILE].replay [REPLAY_FILE].replay
+
+-a: Convert every replay in the replays folder (replays that already have an up to date cache are skipped)
+>py scripts/contributions/replay_cache.py -a
+
+-n: Convert the latest n replays
+>py scripts/contributions/replay_cache.py -n 10
+
+--force: Convert even if an up to date cache already exists
+'''
+
+try:
+	import os
+	import sys
+	import json
+	import argparse
+except ImportError as e:
+	sys.stderr.write("WARNING: Module not found, full error:\n\n")
+	sys.stderr.write(e)
+
+import numpy as np
+import replay_stream		# shared replay reader, in the same directory as this script
+import replay_catalog		# catalog of the replays folder, in the same directory as this script
+
+CACHE_EXT = '.cache.npz'
+VERSION = 1
+
+# the columns of each event type, events that don't match (or unknown types) are stored as json
+# loc is an [x, y] pair (two columns), id is a unit id string, num is any number or boolean
+EVENT_COLUMNS = {
+	'spawn':		('loc', 'num', 'id', 'num'),
+	'breach':		('loc', 'num', 'num', 'id', 'num'),
+	'damage':		('loc', 'num', 'num', 'id', 'num'),
+	'death':		('loc', 'num', 'id', 'num', 'num'),
+	'attack':		('loc', 'loc', 'num', 'num', 'id', 'id', 'num'),
+	'shield':		('loc', 'loc', 'num', 'num', 'id', 'id', 'num'),
+	'move':			('loc', 'loc', 'loc', 'num', 'id', 'num'),
+}
+
+# a unit is [x, y, health, id], the first column is the unit type (its list index in p1Units)
+UNIT_COLUMNS = ('num', 'num', 'num', 'num', 'id')
+
+# how a number column is turned back into python values
+FLOAT, INT, BOOL = 0, 1, 2
+
+# keys of a frame that get their own arrays, anything else is kept as json
+FRAME_KEYS = ('turnInfo', 'p1Stats', 'p2Stats', 'p1Units', 'p2Units', 'events')
+
+
+# handles all the arguments
+def parse_args():
+	ap = argparse.ArgumentParser(add_help=False, formatter_class=argparse.RawTextHelpFormatter)
+	ap.add_argument('-h', '--help', action='help', help='show this help message and exit\n\n')
+	ap.add_argument(
+		'-f', '--file',
+		nargs='*',
+		default=[],
+		help="specify the replay files you'd like to convert\n\n")
+	ap.add_argument(
+		'-a', '--all',
+		action='store_true',
+		help="converts every replay in the replays folder\n\n")
+	ap.add_argument(
+		'-n', '--num',
+		default=1,
+		type=int,
+		help="number of replays (newest first) to convert\n\n")
+	ap.add_argument(
+		'--force',
+		action='store_true',
+		help="convert even if an up to date cache exists\n\n")
+	return vars(ap.parse_args())
+
+# returns the path of the cache file for a replay
+def cache_path(f_name):
+	return replay_stream.cache_file(f_name, CACHE_EXT)
+
+# returns the (modified time, size) a cache must match to be used for a replay
+def source_key(f_name):
+	st = os.stat(f_name)
+	return st.st_mtime_ns, st.st_size
+
+# returns the type of a number column
+def column_type(values):
+	if len(values) > 0 and all(type(v) == bool for v in values):
+		return BOOL
+	if all(type(v) == int for v in values):
+		return INT
+	return FLOAT
+
+# flattens a row into its numbers and ids based on its columns - raises ValueError if it doesn't match
+def flatten(row, columns):
+	if len(row) != len(columns):
+		raise ValueError('row does not match columns')
+
+	nums = []
+	ids = []
+	for value, column in zip(row, columns):
+		if column == 'loc':
+			x, y = value
+			if type(x) not in (int, float) or type(y) not in (int, float):
+				raise ValueError('{} is not a location'.format(value))
+			nums.append(x)
+			nums.append(y)
+		elif column == 'id':
+			if type(value) != str:
+				raise ValueError('id is not a string')
+			ids.append(value)
+		elif type(value) in (int, float, bool):
+			nums.append(value)
+		else:
+			raise ValueError('{} is not a number'.format(value))
+	return nums, ids
+
+# turns flattened numbers and ids back into a row
+def unflatten(nums, ids, columns):
+	row = []
+	n = 0
+	i = 0
+	for column in columns:
+		if column == 'loc':
+			row.append([nums[n], nums[n+1]])
+			n += 2
+		elif column == 'id':
+			row.append(ids[i])
+			i += 1
+		else:
+			row.append(nums[n])
+			n += 1
+	return row
+
+
+# collects the rows of every frame, then builds the arrays for them
+# a table is stored as <name>_num (numbers), <name>_types, <name>_ids and <name>_offsets (rows of frame i are offsets[i]:offsets[i+1])
+class Table:
+	def __init__(self, name, columns):
+		self.name = name
+		self.columns = columns
+		self.nums = []
+		self.ids = []
+		self.offsets = [0]
+
+	# rows must already be flattened
+	def add_rows(self, rows):
+		for nums, ids in rows:
+			self.nums.append(nums)
+			self.ids.append(ids)
+
+	def end_frame(self):
+		self.offsets.append(len(self.nums))
+
+	# returns the rows of each frame as a json string (used if a later row doesn't fit the columns)
+	def frames_as_json(self):
+		return [json.dumps([unflatten(self.nums[r], self.ids[r], self.columns) for r in range(a, b)]) for a, b in zip(self.offsets, self.offsets[1:])]
+
+	def arrays(self):
+		n_nums = sum(2 if c == 'loc' else 1 for c in self.columns if c != 'id')
+		n_ids = sum(1 for c in self.columns if c == 'id')
+		return {
+			self.name + '_num': np.array(self.nums, dtype=np.float64).reshape(len(self.nums), n_nums),
+			self.name + '_types': np.array([column_type([row[c] for row in self.nums]) for c in range(n_nums)], dtype=np.int8),
+			self.name + '_ids': np.array(self.ids, dtype=str).reshape(len(self.ids), n_ids),
+			self.name + '_offsets': np.array(self.offsets, dtype=np.int64),
+		}
+
+# converts number columns back to python values (float, int or bool) based on their type
+def to_python(nums, types):
+	rows = nums.tolist()
+	converters = [(c, int if t == INT else bool) for c, t in enumerate(types.tolist()) if t != FLOAT]
+	if converters:
+		for row in rows:
+			for c, convert in converters:
+				row[c] = convert(row[c])
+	return rows
+
+# loads each array of a cache file the first time it is used, then keeps it
+class Arrays:
+	def __init__(self, path):
+		self.npz = np.load(path, allow_pickle=False)
+		self.loaded = {}
+
+	def __getitem__(self, name):
+		if name not in self.loaded:
+			self.loaded[name] = self.npz[name]
+		return self.loaded[name]
+
+# reads the rows of a single frame back out of a table's arrays
+class TableReader:
+	def __init__(self, npz, name, columns):
+		self.columns = columns
+		self.nums = npz[name + '_num']
+		self.types = npz[name + '_types']
+		self.ids = npz[name + '_ids']
+		self.offsets = npz[name + '_offsets']
+
+	# returns the frame index of every row
+	def frame_index(self):
+		return np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+
+	# returns all the rows of frame i
+	def rows(self, i):
+		a, b = self.offsets[i], self.offsets[i+1]
+		nums = to_python(self.nums[a:b], self.types)
+		ids = self.ids[a:b].tolist()
+		return [unflatten(nums[r], ids[r], self.columns) for r in range(b - a)]
+
+# converts a replay to a cache file and returns the cache file's name
+def convert(f_name):
+	key = source_key(f_name)
+
+	config = replay_stream.read_config(f_name, use_cache=False)
+	end_stats = replay_stream.read_end_stats(f_name, use_cache=False)
+
+	turn_info = []
+	stats = {'p1Stats': [], 'p2Stats': []}
+	units = {'p1Units': Table('p1Units', UNIT_COLUMNS), 'p2Units': Table('p2Units', UNIT_COLUMNS)}
+	unit_slots = []
+	events = {kind: Table('events_' + kind, columns) for kind, columns in EVENT_COLUMNS.items()}
+	json_events = {}		# event types that don't fit their columns (or unknown types), a json string per frame
+	extras = []				# every other key of a frame (eg endStats) as json
+
+	for i, (t, f, data) in enumerate(replay_stream.stream_frames(f_name, use_cache=False)):
+		turn_info.append(data['turnInfo'])
+		stats['p1Stats'].append(data['p1Stats'])
+		stats['p2Stats'].append(data['p2Stats'])
+
+		unit_slots.append(len(data['p1Units']))
+		for key_name, table in units.items():
+			table.add_rows([flatten([slot] + unit, UNIT_COLUMNS) for slot, unit_list in enumerate(data[key_name]) for unit in unit_list])
+			table.end_frame()
+
+		for kind, event_list in data.get('events', {}).items():
+			table = events.get(kind)
+			if table is not None:
+				try:
+					rows = [flatten(event, table.columns) for event in event_list]
+				except (ValueError, TypeError):
+					# doesn't fit the columns, store this type as json for the whole replay
+					json_events[kind] = table.frames_as_json()
+					del events[kind]
+				else:
+					table.add_rows(rows)
+					continue
+
+			if kind not in json_events:
+				json_events[kind] = ['[]'] * i
+			json_events[kind].append(json.dumps(event_list))
+
+		for table in events.values():
+			table.end_frame()
+		for values in json_events.values():
+			if len(values) == i:
+				values.append('[]')
+
+		extra = {k: v for k, v in data.items() if k not in FRAME_KEYS}
+		extras.append(json.dumps(extra) if extra else '')
+
+	arrays = {
+		'version': np.array(VERSION),
+		'source': np.array(key, dtype=np.int64),
+		'config': np.array(json.dumps(config)),
+		'end_stats': np.array(json.dumps(end_stats)),
+		'turn_info': np.array(turn_info, dtype=np.int64).reshape(len(turn_info), -1 if turn_info else 0),
+		'unit_slots': np.array(unit_slots, dtype=np.int64),
+		'extras': np.array(extras, dtype=str),
+		'event_kinds': np.array(sorted(events), dtype=str),
+		'json_event_kinds': np.array(sorted(json_events), dtype=str),
+	}
+	for key_name, rows in stats.items():
+		width = len(rows[0]) if rows else 0
+		arrays[key_name] = np.array(rows, dtype=np.float64).reshape(len(rows), width)
+		arrays[key_name + '_types'] = np.array([column_type([r[c] for r in rows]) for c in range(width)], dtype=np.int8)
+	for table in list(units.values()) + list(events.values()):
+		arrays.update(table.arrays())
+	for kind, values in json_events.items():
+		arrays['json_events_' + kind] = np.array(values, dtype=str)
+
+	# write to a temporary file first so a half written cache is never loaded
+	out = cache_path(f_name)
+	tmp = out + '.tmp'
+	os.makedirs(os.path.dirname(out), exist_ok=True)
+	with open(tmp, 'wb') as f:
+		np.savez(f, **arrays)
+	os.replace(tmp, out)
+	return out
+
+# returns the CachedReplay for a replay, or None if there is no cache or it is out of date
+def load(f_name):
+	path = cache_path(f_name)
+	if not os.path.exists(path):
+		return None
+	try:
+		cache = CachedReplay(path)
+	except Exception as e:
+		sys.stderr.write('Could not read {}, reading the replay instead: {}\n'.format(path, e))
+		return None
+	try:
+		if cache.version != VERSION or cache.source != source_key(f_name):
+			return None
+	except OSError:
+		return None
+	return cache
+
+# a replay loaded from a cache file
+# frames() gives the same data replay_stream.stream_frames does for the replay itself, and the other
+# functions give whole columns as numpy arrays, which is much faster than going frame by frame
+class CachedReplay:
+	def __init__(self, path):
+		self.path = path
+		self.npz = Arrays(path)							# arrays are only read when they are first used
+
+		self.version = int(self.npz['version'])
+		self.source = tuple(self.npz['source'].tolist())
+		self.config = json.loads(str(self.npz['config']))
+		self.end_stats = json.loads(str(self.npz['end_stats']))
+		self.turn_info = self.npz['turn_info']				# the turnInfo of every frame, one row per frame
+		self.tables = {}
+
+	# the number of frames in the replay
+	def __len__(self):
+		return len(self.turn_info)
+
+	def table(self, name, columns):
+		if name not in self.tables:
+			self.tables[name] = TableReader(self.npz, name, columns)
+		return self.tables[name]
+
+	# returns the indices of the first frame with each (turn, frame) pair, in order
+	def unique_frames(self):
+		if len(self) == 0:
+			return np.arange(0)
+		_, first = np.unique(self.turn_info[:, 1:3], axis=0, return_index=True)
+		return np.sort(first)
+
+	# returns 'p1Stats' or 'p2Stats' for every frame as an array, one row per frame
+	def stats(self, key):
+		return self.npz[key]
+
+	# returns the number of units of each type (column) a player has in every frame (row)
+	# key is 'p1Units' or 'p2Units'
+	def unit_counts(self, key):
+		table = self.table(key, UNIT_COLUMNS)
+		slots = int(self.npz['unit_slots'].max()) if len(self) > 0 else 0
+		index = table.frame_index() * slots + table.nums[:, 0].astype(np.int64)
+		return np.bincount(index, minlength=len(self) * slots).reshape(len(self), slots)
+
+	# returns (frame index, numbers, ids) arrays with a row per event of a type, or None if the type is stored as json
+	# see EVENT_COLUMNS for the columns, a loc is two number columns
+	def events(self, kind):
+		if kind not in self.npz['event_kinds'].tolist():
+			return None
+		table = self.table('events_' + kind, EVENT_COLUMNS[kind])
+		return table.frame_index(), table.nums, table.ids
+
+	# returns the data of frame i with only the fields asked for, see replay_stream.stream_frames
+	def frame(self, i, fields=None, events=None):
+		keep = lambda key: fields is None or key in fields
+		npz = self.npz
+
+		data = {'turnInfo': self.turn_info[i].tolist()}
+		for key in ('p1Stats', 'p2Stats'):
+			if keep(key):
+				data[key] = to_python(npz[key][i:i+1], npz[key + '_types'])[0]
+		for key in ('p1Units', 'p2Units'):
+			if keep(key):
+				unit_lists = [[] for slot in range(int(npz['unit_slots'][i]))]
+				for row in self.table(key, UNIT_COLUMNS).rows(i):
+					unit_lists[row[0]].append(row[1:])
+				data[key] = unit_lists
+		if keep('events'):
+			frame_events = {}
+			for kind in npz['event_kinds'].tolist():
+				if events is None or kind in events:
+					frame_events[kind] = self.table('events_' + kind, EVENT_COLUMNS[kind]).rows(i)
+			for kind in npz['json_event_kinds'].tolist():
+				if events is None or kind in events:
+					frame_events[kind] = json.loads(str(npz['json_events_' + kind][i]))
+			if events is not None:
+				frame_events = {kind: frame_events.get(kind, []) for kind in events}
+			data['events'] = frame_events
+		if fields is None or any(key not in FRAME_KEYS for key in fields):
+			extra = str(npz['extras'][i])
+			if extra != '':
+				for key, value in json.loads(extra).items():
+					if keep(key):
+						data[key] = value
+		return data
+
+	# yields (turn, frame, data) for every frame, see replay_stream.stream_frames
+	def frames(self, fields=None, events=None, unique=False):
+		rows = self.unique_frames() if unique else range(len(self))
+		for i in rows:
+			data = self.frame(int(i), fields, events)
+			yield data['turnInfo'][1], data['turnInfo'][2], data
+
+def main(args):
+	files = args['file'] if len(args['file']) > 0 else replay_catalog.latest_replays(args['num'], args['all'])
+
+	if len(files) == 0:
+		sys.stderr.write('No replays found\n')
+		return
+
+	for f_name in files:
+		if not args['force'] and load(f_name) is not None:
+			sys.stderr.write('Up to date: {}\n'.format(cache_path(f_name)))
+			continue
+		try:
+			sys.stderr.write('Wrote {}\n'.format(convert(f_name)))
+		except Exception as e:
+			sys.stderr.write('Could not convert {}: {}\n'.format(f_name, e))
+
+
+if __name__ == '__main__':
+	args = parse_args()	# get command line arguments
+	main(args)			# run program
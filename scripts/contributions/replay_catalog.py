@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Copyright: CC0 - completely open to edit, share, etc
+
+Short Description:
+Keeps a small SQLite catalog of the replays folder (file name, created time, size, players and
+winner) so the other scripts can find the latest replays, or the games of an algo, without
+listing and stat-ing every file each time.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This file must be in the same directory as the scripts that use it (scripts/contributions).
+
+The catalog is replays-cache/catalog.db (the cache folder next to the replays folder, see
+replay_stream.cache_dir). get_results.py, watch_replay.py, replay_cache.py and
+export_replays.py all get their "latest replays" from it through latest_replays(), which brings
+the catalog up to date first:
+
+	- if the replays folder hasn't changed since the last update, it is not listed at all
+	- otherwise it is listed once with os.scandir and only the new replays are read (their stat
+	  and last line, for the players and winner), replays that were deleted are dropped
+	- replays that hadn't finished yet are checked again each time until they have
+
+If the catalog can't be used (eg the replays folder is read only) latest_replays() falls back to
+sorting the whole folder like before.
+
+You can also query it yourself. The default is (the latest replay):
+>py scripts/contributions/replay_catalog.py
+
+-n: The latest n replays
+>py scripts/contributions/replay_catalog.py -n 10
+
+-a: Every replay (newest first)
+>py scripts/contributions/replay_catalog.py -a
+
+--vs: Only games an algo played in
+>py scripts/contributions/replay_catalog.py -a --vs my-bot
+
+--since and --until: Only games created in a date range (same formats as match_db.py)
+>py scripts/contributions/replay_catalog.py -a --since tuesday --until today
+'''
+
+try:
+	import os
+	import sys
+	import glob
+	import time
+	import sqlite3
+	import argparse
+except ImportError as e:
+	sys.stderr.write("WARNING: Module not found, full error:\n\n")
+	sys.stderr.write(e)
+
+import replay_stream		# shared replay reader, in the same directory as this script
+
+REPLAY_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', '..', 'replays'))
+CATALOG_NAME = 'catalog.db'
+VERSION = 1		# change this if the schema changes, old catalogs are then rebuilt
+RACY_SECONDS = 2	# a folder changed this recently may still change without its modified time changing, so it is listed again next time
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS info (
+	key TEXT PRIMARY KEY,
+	value
+);
+
+CREATE TABLE IF NOT EXISTS replays (
+	name TEXT PRIMARY KEY,
+	ctime REAL NOT NULL,
+	mtime_ns INTEGER NOT NULL,
+	size INTEGER NOT NULL,
+	player1 TEXT,
+	player2 TEXT,
+	winner INTEGER,
+	finished INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS replays_ctime ON replays (ctime);
+CREATE INDEX IF NOT EXISTS replays_player1 ON replays (player1, ctime);
+CREATE INDEX IF NOT EXISTS replays_player2 ON replays (player2, ctime);
+'''
+
+
+# handles all the arguments
+def parse_args():
+	ap = argparse.ArgumentParser(add_help=False, formatter_class=argparse.RawTextHelpFormatter)
+	ap.add_argument('-h', '--help', action='help', help='show this help message and exit\n\n')
+	ap.add_argument(
+		'-a', '--all',
+		action='store_true',
+		help="lists every replay that matches\n\n")
+	ap.add_argument(
+		'-n', '--num',
+		default=1,
+		type=int,
+		help="number of replays (newest first) to list\n\n")
+	ap.add_argument(
+		'--vs',
+		default=None,
+		help="only list games this algo played in\n\n")
+	ap.add_argument(
+		'--since',
+		default=None,
+		help="only list games created on or after this date\n\n")
+	ap.add_argument(
+		'--until',
+		default=None,
+		help="only list games created before this date\n\n")
+	return vars(ap.parse_args())
+
+# opens (and creates if needed) the catalog of a replays folder, an old version is emptied so it gets rebuilt
+# the catalog is kept in the folder's cache folder, writing it into the replays folder would change the modified time update() checks
+def connect(replay_dir=REPLAY_DIR):
+	path = os.path.join(replay_stream.cache_dir(replay_dir), CATALOG_NAME)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	db = sqlite3.connect(path, timeout=30)
+	db.executescript(SCHEMA)
+
+	if get_info(db, 'version') != VERSION:
+		with db:
+			db.execute('DELETE FROM replays')
+			db.execute('DELETE FROM info')
+			set_info(db, 'version', VERSION)
+	return db
+
+def get_info(db, key):
+	row = db.execute('SELECT value FROM info WHERE key = ?', (key,)).fetchone()
+	return None if row is None else row[0]
+
+def set_info(db, key, value):
+	db.execute('INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)', (key, value))
+
+# returns the catalog row for a replay from its stat, the players and winner are only known once it has finished
+def replay_row(f_name, name, st):
+	end_stats = replay_stream.read_end_stats(f_name, use_cache=False)
+	if end_stats is None:
+		return (name, st.st_ctime, st.st_mtime_ns, st.st_size, None, None, None, 0)
+
+	players = [end_stats.get('player{}'.format(player), {}).get('name') for player in (1, 2)]
+	return (name, st.st_ctime, st.st_mtime_ns, st.st_size, players[0], players[1], end_stats.get('winner'), 1)
+
+# brings the catalog up to date with the replays folder, returns the number of replays added, changed or removed
+def update(db, replay_dir=REPLAY_DIR):
+	try:
+		dir_mtime = os.stat(replay_dir).st_mtime_ns
+	except OSError:
+		return 0
+
+	rows = []
+	removed = set()
+
+	# a replay still being written changes without the folder changing, so those are always checked
+	for name, mtime_ns, size in db.execute('SELECT name, mtime_ns, size FROM replays WHERE finished = 0').fetchall():
+		f_name = os.path.join(replay_dir, name)
+		try:
+			st = os.stat(f_name)
+		except OSError:
+			removed.add(name)
+			continue
+		if (st.st_mtime_ns, st.st_size) != (mtime_ns, size):
+			rows.append(replay_row(f_name, name, st))
+
+	# the folder only changes when files are added, removed or renamed
+	if get_info(db, 'dir_mtime_ns') != dir_mtime:
+		known = set(name for name, in db.execute('SELECT name FROM replays'))
+		found = set()
+		for entry in os.scandir(replay_dir):
+			if not entry.name.endswith('.replay'):
+				continue
+			found.add(entry.name)
+			if entry.name in known:
+				continue
+			try:
+				rows.append(replay_row(entry.path, entry.name, entry.stat()))
+			except OSError:		# deleted since it was listed
+				found.discard(entry.name)
+		removed |= known - found
+
+	if time.time() - dir_mtime / 1e9 < RACY_SECONDS:
+		dir_mtime = None
+
+	if len(rows) > 0 or len(removed) > 0 or get_info(db, 'dir_mtime_ns') != dir_mtime:
+		with db:
+			db.executemany('INSERT OR REPLACE INTO replays (name, ctime, mtime_ns, size, player1, player2, winner, finished) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+			db.executemany('DELETE FROM replays WHERE name = ?', [(name,) for name in removed])
+			set_info(db, 'dir_mtime_ns', dir_mtime)
+
+	return len(rows) + len(removed)
+
+# returns the paths of the replays in the catalog, newest first
+#
+# num:		the number of replays to return, None returns them all
+# vs:		only games this algo played in
+# since:	only games created at or after this unix timestamp
+# until:	only games created before this unix timestamp
+def replays(db, num=None, vs=None, since=None, until=None, replay_dir=REPLAY_DIR):
+	sql = 'SELECT name FROM replays WHERE 1'
+	params = []
+	if vs is not None:
+		sql += ' AND (player1 = ? OR player2 = ?)'
+		params += [vs, vs]
+	if since is not None:
+		sql += ' AND ctime >= ?'
+		params.append(since)
+	if until is not None:
+		sql += ' AND ctime < ?'
+		params.append(until)
+	sql += ' ORDER BY ctime DESC, name'
+	if num is not None:
+		sql += ' LIMIT ?'
+		params.append(num)
+
+	return [os.path.join(replay_dir, name) for name, in db.execute(sql, params)]
+
+# returns {path: created time} for every replay in the catalog, the time replays() sorts and filters by
+def created_times(db, replay_dir=REPLAY_DIR):
+	return {os.path.join(replay_dir, name): ctime for name, ctime in db.execute('SELECT name, ctime FROM replays')}
+
+# returns the latest replays in the replays folder, newest first (a=True returns all of them)
+def latest_replays(num=1, a=False, replay_dir=REPLAY_DIR):
+	replay_dir = os.path.normpath(replay_dir)
+	if not os.path.isdir(replay_dir):
+		return []
+
+	try:
+		db = connect(replay_dir)
+		try:
+			update(db, replay_dir)
+			return replays(db, None if a else num, replay_dir=replay_dir)
+		finally:
+			db.close()
+	except (OSError, sqlite3.Error):		# eg the cache folder can't be created, sort the folder instead
+		files = glob.glob(os.path.join(replay_dir, '*.replay'))
+		files = sorted(files, key=os.path.getctime, reverse=True)
+		if a:
+			return files
+		return files[:num]
+
+def main(args):
+	import match_db		# only for its date formats
+
+	if not os.path.isdir(REPLAY_DIR):
+		sys.stderr.write('No replays found\n')
+		return
+
+	db = connect()
+	update(db)
+
+	since = match_db.parse_date(args['since']) if args['since'] else None
+	until = match_db.parse_date(args['until']) if args['until'] else None
+	for f_name in replays(db, None if args['all'] else args['num'], args['vs'], since, until):
+		print(f_name)
+
+
+if __name__ == '__main__':
+	args = parse_args()	# get command line arguments
+	main(args)			# run program
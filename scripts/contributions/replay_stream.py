@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Copyright: CC0 - completely open to edit, share, etc
+
+Short Description:
+Shared helpers for reading .replay files one frame at a time.
+Used by get_results.py and watch_replay.py, it is not meant to be run on its own.
+------------------------------------------------------------------------------------------------
+
+README:
+
+This file must be in the same directory as the scripts that use it (scripts/contributions).
+
+A replay is one json object per line: the game config first, then a line for the start of every
+turn and every action frame, and the final line has the endStats.
+
+stream_frames() reads the file line by line and yields each frame as it goes, so only one frame
+is ever held in memory unless the caller keeps it. You can ask for just the fields you need:
+
+	for turn, frame, data in stream_frames('replays/match.replay', ['p1Stats', 'p2Stats'], events=['spawn']):
+		...
+
+data will then only have turnInfo, p1Stats, p2Stats and an events dict with only the spawn list.
+
+read_config() and read_end_stats() only read the first and last lines of the file, which means
+you can know who played (and who won) before streaming through the whole replay.
+
+If replay_cache.py has made an up to date cache file for a replay (and numpy is installed),
+all three functions read from the cache instead of parsing the replay. Pass use_cache=False to
+always read the replay itself.
+
+frame_index() finds where every frame starts in the file without decoding them, and read_frame()
+then jumps straight to a single frame. The index of a finished replay is saved in the cache folder
+next to the replays folder (replays/match.replay -> replays-cache/match.index.json) so it is only
+built once. index_from() does the same for only
+the part of a replay after a given offset, so a game that is still being played can be followed by
+reading just what the engine has added since the last time.
+'''
+
+import os
+import re
+import json
+
+INDEX_VERSION = 1	# change this if the index format changes, old index files are then rebuilt
+
+# used to read a frame's turn and healths without decoding the whole line
+TURN_INFO = re.compile(br'"turnInfo"\s*:\s*\[\s*(-?\d+)\s*,\s*(-?\d+)\s*,\s*(-?\d+)')
+HEALTHS = [re.compile(br'"p%dStats"\s*:\s*\[\s*(-?[0-9.eE+-]+)' % player) for player in (1, 2)]
+
+
+# returns the up to date cache of a replay (see replay_cache.py), or None if it can't be used
+def load_cache(f_name):
+	try:
+		import replay_cache
+	except ImportError:		# numpy is not installed
+		return None
+	return replay_cache.load(f_name)
+
+# returns the config (first line) of a replay, or None if the file doesn't start with one
+def read_config(f_name, use_cache=True):
+	cache = load_cache(f_name) if use_cache else None
+	if cache is not None:
+		return cache.config
+
+	with open(f_name) as f:
+		for line in f:
+			if line.strip() == '':
+				continue
+			if '"turnInfo"' in line:
+				return None
+			return json.loads(line)
+	return None
+
+# returns the endStats of a replay by reading backwards from the end of the file
+# returns None if the game has not finished (the last line has no endStats)
+def read_end_stats(f_name, block_size=65536, use_cache=True):
+	cache = load_cache(f_name) if use_cache else None
+	if cache is not None:
+		return cache.end_stats
+
+	with open(f_name, 'rb') as f:
+		f.seek(0, os.SEEK_END)
+		end = f.tell()
+		start = end
+		tail = b''
+
+		# keep reading blocks until we have the whole last line
+		while start > 0:
+			start = max(0, start - block_size)
+			f.seek(start)
+			tail = f.read(end - start)
+			if tail.rstrip().find(b'\n') != -1:
+				break
+
+	last_line = tail.rstrip().split(b'\n')[-1]
+	try:
+		return json.loads(last_line.decode()).get('endStats')
+	except (ValueError, AttributeError):
+		return None
+
+# returns a copy of the frame with only the fields asked for (turnInfo is always kept)
+# events is a list of event types to keep, None keeps them all
+def project(data, fields=None, events=None):
+	if fields is None:
+		frame = dict(data)
+	else:
+		frame = {'turnInfo': data['turnInfo']}
+		for key in fields:
+			if key in data:
+				frame[key] = data[key]
+
+	if events is not None and 'events' in frame:
+		frame['events'] = {kind: data['events'].get(kind, []) for kind in events}
+
+	return frame
+
+# yields (turn, frame, data) for every frame in a replay, in the order they are in the file
+#
+# fields:	the keys to keep from each frame (eg 'p1Stats', 'p1Units', 'events', 'endStats'), None keeps everything
+# events:	the event types to keep if 'events' is kept (eg 'spawn', 'breach'), None keeps them all
+# unique:	if True, a (turn, frame) pair is only yielded the first time it is seen
+#
+# a partially written last line (the engine is still writing the replay) is skipped
+def stream_frames(f_name, fields=None, events=None, unique=False, use_cache=True):
+	cache = load_cache(f_name) if use_cache else None
+	if cache is not None:
+		for frame in cache.frames(fields, events, unique):
+			yield frame
+		return
+
+	seen = set()
+	with open(f_name) as f:
+		for line in f:
+			if '"turnInfo"' not in line:
+				continue
+
+			try:
+				data = json.loads(line)
+			except ValueError:
+				if line.endswith('\n'):
+					raise
+				return
+
+			turn_num = data['turnInfo'][1]
+			frame_num = data['turnInfo'][2]
+
+			if unique:
+				if (turn_num, frame_num) in seen:
+					continue
+				seen.add((turn_num, frame_num))
+
+			if fields is not None or events is not None:
+				data = project(data, fields, events)
+
+			yield turn_num, frame_num, data
+
+# returns the folder the files made from the replays in replay_dir are kept in (replays -> replays-cache)
+# it is next to the replays folder rather than in it, so writing them doesn't change the replays folder's
+# modified time, which replay_catalog uses to know when the folder has to be listed again
+def cache_dir(replay_dir):
+	return os.path.normpath(os.path.abspath(replay_dir)) + '-cache'
+
+# returns the path of a file made from a replay, eg cache_file('replays/match.replay', '.index.json') -> replays-cache/match.index.json
+def cache_file(f_name, ext):
+	name = os.path.basename(f_name)
+	if name.endswith('.replay'):
+		name = name[:-len('.replay')]
+	return os.path.join(cache_dir(os.path.dirname(f_name)), name + ext)
+
+# returns the file the frame index of a replay is saved in
+def index_path(f_name):
+	return cache_file(f_name, '.index.json')
+
+# returns [turn, frame, offset, p1 health, p2 health] for every frame line of a replay, in the order they are in the file
+# offset is where the line starts, pass it to read_frame to get that frame
+#
+# the saved index is used if the replay has not changed since it was made, otherwise the replay is scanned
+# (and the index saved if the game has finished)
+def frame_index(f_name, use_sidecar=True):
+	st = os.stat(f_name)
+	key = [st.st_mtime_ns, st.st_size]
+	path = index_path(f_name)
+
+	if use_sidecar:
+		try:
+			with open(path) as f:
+				saved = json.load(f)
+			if saved.get('version') == INDEX_VERSION and saved.get('source') == key:
+				return saved['frames']
+		except (OSError, ValueError):
+			pass
+
+	entries, finished = build_index(f_name)
+
+	if use_sidecar and finished:
+		try:
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			with open(path + '.tmp', 'w') as f:
+				json.dump({'version': INDEX_VERSION, 'source': key, 'frames': entries}, f)
+			os.replace(path + '.tmp', path)
+		except OSError:		# eg the cache folder can't be created, the index is just rebuilt next time
+			pass
+
+	return entries
+
+# scans a replay for frame_index, returns the entries and whether the game has finished
+def build_index(f_name):
+	entries, finished, end = index_from(f_name)
+	return entries, finished
+
+# indexes the frames written to a replay from offset onwards (the end returned by the last call when
+# following a game that is still being played), only the new part of the file is read
+# returns the entries (like frame_index), whether the game has finished and where the unread part of the file starts
+def index_from(f_name, offset=0):
+	entries = []
+	finished = False
+
+	with open(f_name, 'rb') as f:
+		f.seek(offset)
+		for line in f:
+			if not line.endswith(b'\n'):
+				# the engine may still be writing the last line, it is read again next time
+				try:
+					json.loads(line.decode())
+				except ValueError:
+					break
+
+			start = offset
+			offset += len(line)
+			if b'"turnInfo"' not in line:
+				continue
+
+			turn_info = TURN_INFO.search(line)
+			healths = [regex.search(line) for regex in HEALTHS]
+			if turn_info is None or None in healths:
+				data = json.loads(line.decode())
+				entry = data['turnInfo'][1:3] + [data['p1Stats'][0], data['p2Stats'][0]]
+			else:
+				entry = [int(turn_info.group(2)), int(turn_info.group(3))] + [json.loads(health.group(1)) for health in healths]
+
+			entries.append(entry[:2] + [start] + entry[2:])
+			finished = finished or b'"endStats"' in line
+
+	return entries, finished, offset
+
+# reads the single frame that starts at offset (from frame_index), only keeping the fields asked for like stream_frames
+def read_frame(f_name, offset, fields=None, events=None):
+	with open(f_name, 'rb') as f:
+		f.seek(offset)
+		data = json.loads(f.readline().decode())
+
+	if fields is not None or events is not None:
+		data = project(data, fields, events)
+	return data
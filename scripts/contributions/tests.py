@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+'''
+------------------------------------------------------------------------------------------------
+Copyright: CC0 - completely open to edit, share, etc
+
+Short Description:
+Tests for the shared replay readers (replay_stream.py, replay_cache.py, replay_catalog.py), match_db.py
+and the gif joining of export_replays.py. They write small replays to a temporary folder, the real
+replays folder is never touched.
+------------------------------------------------------------------------------------------------
+
+README:
+
+>py scripts/contributions/tests.py
+
+The replay_cache tests need numpy and the export_replays tests need matplotlib and Pillow, they are
+skipped if those are not installed.
+'''
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import replay_stream
+import replay_catalog
+import match_db
+
+try:
+	import numpy
+	import replay_cache
+except ImportError:
+	replay_cache = None
+
+try:
+	import PIL
+	import export_replays
+except (ImportError, SystemExit):		# export_replays exits if matplotlib is missing
+	export_replays = None
+
+
+# returns a frame line of a test replay, the values are all ints where the engine writes ints
+def frame_line(turn, frame, extra={}):
+	data = {
+		'turnInfo': [0 if frame == -1 else 1, turn, frame, 100 * turn + frame + 1],
+		'p1Stats': [30.0 - turn, 5.0, 4.5, 100 + turn],
+		'p2Stats': [28.5, 6.0, 3.0, 120],
+		'p1Units': [[[3, 10, 60.0, '1']], [], [], [], [], [], [], []],
+		'p2Units': [[], [[24, 17, 75.5, '2']], [], [], [[13, 20 - frame, 15.0, '3']], [], [], []],
+		'events': {
+			'spawn': [[[3, 10], 0, '1', 1]] if frame == -1 else [],
+			'breach': [[[0, 13], 1, 3, '4', 2]] if frame == 1 else [],
+			'damage': [[[3, 10], 2.5, 0, '1', 1]] if frame == 0 else [],
+			'death': [[[13, 2], 3, '5', 1, False]] if frame == 1 else [],
+			'attack': [], 'shield': [], 'move': [], 'melee': [], 'selfDestruct': [],
+		},
+	}
+	data.update(extra)
+	return json.dumps(data) + '\n'
+
+# returns the end stats of a test replay
+def end_stats(winner, names, turns):
+	return {
+		'winner': winner, 'duration': 1000, 'turns': turns, 'frames': 3 * turns,
+		'player1': {'name': names[0], 'points_scored': 3.0, 'crashed': False},
+		'player2': {'name': names[1], 'points_scored': 1.0, 'crashed': False},
+	}
+
+# writes a small replay: the config, then a start of turn frame and two action frames for every turn
+# the first frame is written twice like the engine does, and the last line has the endStats if finished
+def write_replay(f_name, turns=3, finished=True, winner=1, names=('my-bot', 'starter-algo')):
+	lines = [json.dumps({'debug': {}, 'unitInformation': []}) + '\n', frame_line(0, -1)]
+	for turn in range(turns):
+		for frame in (-1, 0, 1):
+			last = finished and turn == turns - 1 and frame == 1
+			lines.append(frame_line(turn, frame, {'endStats': end_stats(winner, names, turns)} if last else {}))
+	with open(f_name, 'w') as f:
+		f.writelines(lines)
+	return lines
+
+
+class ReplayTests(unittest.TestCase):
+
+	def setUp(self):
+		self.root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, self.root)
+		self.replay_dir = os.path.join(self.root, 'replays')
+		os.makedirs(self.replay_dir)
+
+	def make_replay(self, name='match.replay', **kwargs):
+		f_name = os.path.join(self.replay_dir, name)
+		write_replay(f_name, **kwargs)
+		return f_name
+
+	def test_stream_frames(self):
+		f_name = self.make_replay()
+		frames = list(replay_stream.stream_frames(f_name))
+		self.assertEqual(10, len(frames), "Frame lines not all read")
+		self.assertEqual([(0, -1), (0, -1), (0, 0)], [(t, f) for t, f, data in frames[:3]], "Frames out of file order")
+		self.assertEqual(9, len(list(replay_stream.stream_frames(f_name, unique=True))), "Repeated frame not skipped")
+
+		turn, frame, projected = next(replay_stream.stream_frames(f_name, ['p1Stats'], ['breach']))
+		self.assertEqual(['turnInfo', 'p1Stats'], list(projected.keys()), "Fields not projected")
+		_, _, projected = list(replay_stream.stream_frames(f_name, ['events'], ['breach', 'death']))[2]
+		self.assertEqual({'breach': [], 'death': []}, projected['events'], "Events not projected")
+
+		self.assertEqual('my-bot', replay_stream.read_end_stats(f_name)['player1']['name'], "End stats not read")
+		self.assertEqual({'debug': {}, 'unitInformation': []}, replay_stream.read_config(f_name), "Config not read")
+
+	def test_partial_last_line(self):
+		f_name = self.make_replay(finished=False)
+		full = replay_stream.frame_index(f_name)
+		size = os.path.getsize(f_name)
+		last = frame_line(3, -1, {'endStats': end_stats(2, ('my-bot', 'starter-algo'), 4)})
+		with open(f_name, 'a') as f:
+			f.write(last[:40])
+
+		self.assertEqual(10, len(list(replay_stream.stream_frames(f_name))), "Partial line not skipped")
+		self.assertIsNone(replay_stream.read_end_stats(f_name), "Unfinished replay has end stats")
+		entries, finished, offset = replay_stream.index_from(f_name)
+		self.assertEqual(full, entries, "Partial line indexed")
+		self.assertFalse(finished, "Unfinished replay indexed as finished")
+		self.assertEqual(size, offset, "Offset not at the start of the partial line")
+
+		# the engine finishes the line, only the new part is read
+		with open(f_name, 'a') as f:
+			f.write(last[40:])
+		entries, finished, end = replay_stream.index_from(f_name, offset)
+		self.assertEqual([[3, -1, size, 27.0, 28.5]], entries, "Finished line not indexed from the offset")
+		self.assertTrue(finished, "End stats not seen")
+		self.assertEqual(os.path.getsize(f_name), end, "Offset not at the end")
+		self.assertEqual(2, replay_stream.read_end_stats(f_name)['winner'], "End stats not read")
+
+	def test_frame_index(self):
+		f_name = self.make_replay()
+		frames = list(replay_stream.stream_frames(f_name))
+		entries = replay_stream.frame_index(f_name)
+		self.assertEqual([[t, f] for t, f, data in frames], [entry[:2] for entry in entries], "Index out of file order")
+		self.assertEqual([[data['p1Stats'][0], data['p2Stats'][0]] for t, f, data in frames], [entry[3:] for entry in entries], "Healths not indexed")
+		for (t, f, data), entry in zip(frames, entries):
+			self.assertEqual(data, replay_stream.read_frame(f_name, entry[2]), "Offset does not point at the frame")
+
+		# the finished replay's index is saved in the cache folder, not the replays folder
+		path = replay_stream.index_path(f_name)
+		self.assertEqual(os.path.join(self.root, 'replays-cache', 'match.index.json'), path, "Index not in the cache folder")
+		self.assertTrue(os.path.exists(path), "Index not saved")
+		self.assertEqual(['match.replay'], os.listdir(self.replay_dir), "Index written into the replays folder")
+		self.assertEqual(entries, replay_stream.frame_index(f_name), "Saved index not read back")
+
+		# a changed replay is indexed again
+		write_replay(f_name, turns=4)
+		self.assertEqual(13, len(replay_stream.frame_index(f_name)), "Out of date index used")
+
+		unfinished = self.make_replay('live.replay', finished=False)
+		replay_stream.frame_index(unfinished)
+		self.assertFalse(os.path.exists(replay_stream.index_path(unfinished)), "Unfinished replay's index saved")
+
+	@unittest.skipIf(replay_cache is None, "numpy is not installed")
+	def test_replay_cache(self):
+		f_name = self.make_replay()
+		path = replay_cache.convert(f_name)
+		self.assertEqual(os.path.join(self.root, 'replays-cache', 'match.cache.npz'), path, "Cache not in the cache folder")
+		self.assertEqual(['match.replay'], os.listdir(self.replay_dir), "Cache written into the replays folder")
+		self.assertIsNotNone(replay_stream.load_cache(f_name), "Up to date cache not used")
+
+		# ints must come back as ints and floats as floats, so compare the json and not just the values
+		for unique in (False, True):
+			cached = list(replay_stream.stream_frames(f_name, unique=unique))
+			parsed = list(replay_stream.stream_frames(f_name, unique=unique, use_cache=False))
+			self.assertEqual(len(parsed), len(cached), "Cache has a different number of frames")
+			for a, b in zip(parsed, cached):
+				self.assertEqual(json.dumps(a, sort_keys=True), json.dumps(b, sort_keys=True), "Cached frame differs")
+
+		_, _, data = list(replay_stream.stream_frames(f_name, ['p2Stats', 'p1Units'], ['death']))[3]
+		self.assertEqual({'turnInfo', 'p2Stats', 'p1Units'}, set(data.keys()), "Cached fields not projected")
+		self.assertEqual([120, 28.5], [data['p2Stats'][3], data['p2Stats'][0]], "Cached stats changed")
+		self.assertIs(int, type(data['p2Stats'][3]), "Int column came back as float")
+		self.assertEqual(replay_stream.read_end_stats(f_name, use_cache=False), replay_stream.read_end_stats(f_name), "Cached end stats differ")
+
+		# the cache is ignored once the replay changes
+		write_replay(f_name, turns=2)
+		self.assertIsNone(replay_stream.load_cache(f_name), "Out of date cache used")
+		self.assertEqual(7, len(list(replay_stream.stream_frames(f_name))), "Out of date cache read")
+
+	def test_catalog(self):
+		older = self.make_replay('a.replay', winner=2, names=('starter-algo', 'other-bot'))
+		newer = self.make_replay('b.replay')
+		expected = sorted([older, newer], key=lambda f_name: (-os.stat(f_name).st_ctime, f_name))
+
+		db = replay_catalog.connect(self.replay_dir)
+		self.addCleanup(db.close)
+		self.assertEqual(2, replay_catalog.update(db, self.replay_dir), "Replays not added")
+		self.assertEqual(expected, replay_catalog.replays(db, replay_dir=self.replay_dir), "Replays not newest first")
+		self.assertEqual(expected[:1], replay_catalog.replays(db, 1, replay_dir=self.replay_dir), "Number of replays ignored")
+		self.assertEqual([newer], replay_catalog.replays(db, vs='my-bot', replay_dir=self.replay_dir), "Games of another algo listed")
+		self.assertEqual(expected, replay_catalog.replays(db, vs='starter-algo', replay_dir=self.replay_dir), "Games as player 2 not listed")
+		self.assertEqual({older: os.stat(older).st_ctime, newer: os.stat(newer).st_ctime}, replay_catalog.created_times(db, self.replay_dir), "Created times differ")
+		self.assertEqual(sorted(['a.replay', 'b.replay']), sorted(os.listdir(self.replay_dir)), "Catalog written into the replays folder")
+
+		# a game still being played is listed, and its players are filled in once it finishes
+		live = self.make_replay('c.replay', finished=False)
+		self.assertEqual(1, replay_catalog.update(db, self.replay_dir), "New replay not added")
+		self.assertIn(live, replay_catalog.replays(db, replay_dir=self.replay_dir), "Unfinished replay not listed")
+		self.assertNotIn(live, replay_catalog.replays(db, vs='my-bot', replay_dir=self.replay_dir), "Players of an unfinished replay known")
+		write_replay(live)
+		self.assertEqual(1, replay_catalog.update(db, self.replay_dir), "Finished replay not read again")
+		self.assertIn(live, replay_catalog.replays(db, vs='my-bot', replay_dir=self.replay_dir), "Players of a finished replay not read")
+
+		os.remove(older)
+		self.assertEqual(1, replay_catalog.update(db, self.replay_dir), "Deleted replay not removed")
+		self.assertNotIn(older, replay_catalog.replays(db, replay_dir=self.replay_dir), "Deleted replay listed")
+
+		# the replays folder path is normalized, and latest_replays agrees with the catalog
+		unnormalized = os.path.join(self.replay_dir, '..', 'replays')
+		self.assertEqual(replay_catalog.replays(db, replay_dir=self.replay_dir), replay_catalog.latest_replays(a=True, replay_dir=unnormalized), "latest_replays differs from the catalog")
+
+	def test_match_db_ingest(self):
+		won = self.make_replay('a.replay')
+		lost = self.make_replay('b.replay', winner=2)
+		self.make_replay('c.replay', finished=False)
+
+		db = match_db.connect(os.path.join(self.root, 'matches.db'))
+		self.addCleanup(db.close)
+		match_db.ingest(db, replay_dir=self.replay_dir)
+		rows = db.execute('SELECT r.path, r.played_at, p.won FROM replays r JOIN players p ON p.replay_id = r.id WHERE p.algo = ? ORDER BY r.path', ('my-bot',)).fetchall()
+		catalog = replay_catalog.connect(self.replay_dir)
+		self.addCleanup(catalog.close)
+		played = replay_catalog.created_times(catalog, self.replay_dir)
+		self.assertEqual([(won, played[won], 1), (lost, played[lost], 0)], rows, "Finished replays not ingested with the catalog's times")
+
+		turns = db.execute('SELECT player, turn, health, time FROM turn_stats JOIN replays r ON r.id = replay_id WHERE r.path = ? ORDER BY turn, player', (won,)).fetchall()
+		self.assertEqual([(1, 0, 30.0, 100.0), (2, 0, 28.5, 120.0), (1, 1, 29.0, 101.0), (2, 1, 28.5, 120.0), (1, 2, 28.0, 102.0), (2, 2, 28.5, 120.0)], turns, "Turn stats not ingested once per turn")
+		kinds = db.execute('SELECT kind, COUNT(*) FROM events JOIN replays r ON r.id = replay_id WHERE r.path = ? GROUP BY kind ORDER BY kind', (won,)).fetchall()
+		self.assertEqual([('breach', 3), ('damage', 3), ('death', 3), ('spawn', 3)], kinds, "Events not ingested once per frame")
+
+		# only new or changed replays are read again
+		ids = db.execute('SELECT id FROM replays ORDER BY path').fetchall()
+		match_db.ingest(db, replay_dir=self.replay_dir)
+		self.assertEqual(ids, db.execute('SELECT id FROM replays ORDER BY path').fetchall(), "Up to date replays ingested again")
+		write_replay(os.path.join(self.replay_dir, 'c.replay'))
+		match_db.ingest(db, replay_dir=self.replay_dir)
+		self.assertEqual(3, db.execute('SELECT COUNT(*) FROM replays').fetchone()[0], "Finished replay not ingested")
+
+	@unittest.skipIf(export_replays is None, "matplotlib or Pillow is not installed")
+	def test_join_gifs(self):
+		from PIL import Image, ImageSequence
+
+		# segments with different colors (so different palettes) and durations
+		colors = [[(255, 0, 0), (0, 255, 0)], [(0, 0, 255), (255, 255, 0), (9, 9, 9)]]
+		durations = [100, 50]
+		paths = []
+		for i, (segment, duration) in enumerate(zip(colors, durations)):
+			paths.append(os.path.join(self.root, '{}.gif'.format(i)))
+			frames = [Image.new('RGB', (40, 20), color) for color in segment]
+			frames[0].save(paths[-1], save_all=True, append_images=frames[1:], duration=duration, loop=0)
+
+		out_path = os.path.join(self.root, 'video.gif')
+		export_replays.join_gifs(paths, out_path)
+		with Image.open(out_path) as video:
+			self.assertEqual(0, video.info.get('loop'), "Video does not loop")
+			frames = [(frame.info['duration'], frame.convert('RGB').getpixel((1, 1))) for frame in ImageSequence.Iterator(video)]
+		self.assertEqual([(100, color) for color in colors[0]] + [(50, color) for color in colors[1]], frames, "Segments not joined in order")
+
+		# a cut short segment fails with the error main reports
+		with open(paths[1], 'rb') as f:
+			data = f.read()
+		with open(paths[1], 'wb') as f:
+			f.write(data[:len(data) // 2])
+		self.assertRaises((OSError, ValueError), export_replays.join_gifs, paths, out_path)
+
+	@unittest.skipIf(export_replays is None, "matplotlib or Pillow is not installed")
+	def test_count_frames(self):
+		f_name = self.make_replay()
+		self.assertEqual(9, export_replays.count_frames(f_name), "Repeated frame counted")
+		self.assertEqual(export_replays.watch_replay.Replay(f_name).frame_order(), export_replays.watch_replay.frame_order(set((t, f) for t, f, data in replay_stream.stream_frames(f_name))), "Frame order differs from the replay's")
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -15,7 +15,15 @@ Lastly, it allows you to save these visualizations in video format.
 
 README:
 
-This program assumes this file is in the contributions/scripts directory
+This program assumes this file is in the contributions/scripts directory, next to replay_stream.py
+
+If you have converted a replay with replay_cache.py (needs numpy), its cache file is used instead of
+the replay and opening it is much faster.
+
+Frames are only read from the replay when they are drawn, and only the most recent ones are kept
+in memory, so long replays open quickly. The first time a finished replay is opened, where each
+frame starts is saved in the cache folder next to the replays folder (replays-cache/REPLAY_FILE.index.json)
+so the next time is faster still.
 
 This script takes an input of a replay file and displays it visually.
 Alternatively, it can run a match and you can visualize it as the game engine runs.
@@ -35,28 +43,27 @@ where REPLAY_FILE is the file you'd like to look at. You can list more than one,
 NOT display more than one replay.
 
 ----------------------------------------------------------------------------------------
--b: Blitting
+-nb: No blitting
 
-You can specify whether to use blitting with this flag:
->py scripts/contributions/watch_replay.py -b
+When watching a replay, only the parts of the window that change (units, numbers, the health plot
+and the slider) are redrawn each frame. This is called blitting and keeps playback smooth even with
+hundreds of units on the board. If your matplotlib backend has trouble with it, turn it off with:
+>py scripts/contributions/watch_replay.py -nb
 
-Blitting will improve the performance of the graphing, but comes at the cost of several features:
-- You will not be able to use or see the slider
-- You may notice small graphical glitches with text updating (will not show if you do not use the keyboard inputs)
-- If you run the program in real-time the player names will not update (the winner name will be displayed correctly).
+Real-time watching and saving never use blitting. The old -b flag still works, but does nothing.
 
 ----------------------------------------------------------------------------------------
 -run: Real-time watching
 
 This means you will run and watch a game in real time.
 The program will start a match like you normally would, but will also open the visualizer when possible.
+The visualizer follows the new replay as the engine writes it, only reading the frames added since it last looked.
 
 You can specify the algos you would like to run like normal:
 >py scripts/contributions/watch_replay.py -run algos/my-bot1 algos/my-bot2
 
 You cannot save a game if you watch it in real-time.
 The slider will not appear until the game has completed (you can still use the keyboard commands).
-If you use blitting, the player names will not update.
 
 ----------------------------------------------------------------------------------------
 -s: Save
@@ -190,10 +197,11 @@ try:
 	import os
 	import sys
 	import time
-	import json
 	import glob
 	import random
+	import functools
 	import warnings
+	import collections
 	import argparse
 	import subprocess
 	import multiprocessing as mp
@@ -201,11 +209,18 @@ except ImportError as e:
 	sys.stderr.write("WARNING: Module not found, full error:\n\n")
 	sys.stderr.write(e)
 
+import replay_stream		# shared replay reader, in the same directory as this script
+import replay_catalog		# catalog of the replays folder, in the same directory as this script
+
 try:
 	import matplotlib.pyplot as plt
 	import matplotlib.animation as animation
+	import numpy as np
+	from matplotlib.path import Path
+	from matplotlib.colors import to_rgba
 	from matplotlib.patches import Circle, Wedge, Polygon
-	from matplotlib.collections import PatchCollection
+	from matplotlib.collections import PatchCollection, PathCollection
+	from matplotlib.transforms import AffineDeltaTransform, ScaledTranslation
 	from matplotlib.widgets import Slider
 except ImportError:
 	usr_in = input('Matplotlib not found.\nWould you like this program to try and install matplotlib? (y/n) ')
@@ -215,8 +230,12 @@ except ImportError:
 		try:
 			import matplotlib.pyplot as plt
 			import matplotlib.animation as animation
+			import numpy as np
+			from matplotlib.path import Path
+			from matplotlib.colors import to_rgba
 			from matplotlib.patches import Circle, Wedge, Polygon
-			from matplotlib.collections import PatchCollection
+			from matplotlib.collections import PatchCollection, PathCollection
+			from matplotlib.transforms import AffineDeltaTransform, ScaledTranslation
 			from matplotlib.widgets import Slider
 
 			sys.stderr.write('\n\n')
@@ -235,6 +254,7 @@ EMP = 4        # demolisher
 SCRAMBLER = 5  # interceptor
 MAX_HP = {FILTER:60, ENCRYPTOR:30, DESTRUCTOR:75, PING:15, EMP:5, SCRAMBLER:40}
 SPEED = {'1':.25, '2':.5, '3':1, '4':2, '5':4, '6':8} # speed versions, key is user input (number)
+BLIT = True    # only redraw what changes when watching, turned off with -nb
 
 
 # returns a rotated angle (created to make health deplete from vertical angle)
@@ -266,6 +286,12 @@ def scrambler_verts(x,y):
 	return [(a+x, b+y) for (a,b) in verts]
 
 GET_VERTS = {PING:ping_verts, EMP:emp_verts, SCRAMBLER:scrambler_verts}
+WEDGES = {FILTER:[(.2,.07)], ENCRYPTOR:[(.12,.03),(.37,.15)], DESTRUCTOR:[(.2,.07),(.45,.01)]} # (radius, width) of the rings that make up each static unit
+SHIELD = 'shield'			# the layer of circles around mobile units with extra stability
+
+REPLAY_DIR = '{}/../../replays/'.format(os.path.dirname(os.path.realpath(__file__))) # where the engine saves replays
+FRAME_FIELDS = ['p1Stats', 'p2Stats', 'p1Units', 'p2Units', 'endStats'] # the only parts of a frame that get drawn
+FRAME_WINDOW = 64			# the number of recently used frames kept in memory
 
 
 # handles all the arguments
@@ -277,10 +303,14 @@ def parse_args():
 		nargs='*',
 		default=[],
 		help="specify a replay file you'd like to watch\n\n")
+	ap.add_argument(
+		'-nb', '--no_blit',
+		action='store_true',
+		help="redraw the whole window every frame instead of only what changes (slower, but works with every matplotlib backend)\n\n")
 	ap.add_argument(
 		'-b', '--blit',
 		action='store_true',
-		help="will tell the program to use blit - will improve performance, but you will not be able to see or use the slider and there will be minor text glitches when fast forwarding, etc (you can still use all the keyboard commands)\n\n")
+		help=argparse.SUPPRESS)		# blitting is the default now, kept so old commands still work
 	ap.add_argument(
 		'-run', '--run_match',
 		nargs='+',
@@ -301,238 +331,145 @@ def parse_args():
 		help="forces the save file to keep trying different writers until one works - flag only works if you are saving a replay\n\n")
 	return vars(ap.parse_args())
 
-# stores all information for a single unit on the graph
-class Unit:
-	def __init__(self, t, x, y, hp, p, ID, count, ax):
-		self.x = x 										# x position on the graph
-		self.y = y 										# y position on the graph
-		self.unit_type = t 								# the type of unit (a constant declare in global)
-		self.stability = hp 							# stability of unit
-		self.p_index = p 								# player index
-		self.ID = ID 									# unique id for unit (from engine.java)
-		self.owner = True if p == 1 else False			# boolean to keep track of owner
-		self.polygons = []								# all polygons that make up that unit
-		self.patches = []								# these are what get drawn to the animation (contain polygons themselves)
-		self.color = {True:'C0', False:'r'}				# constants for player color
-
-		self.create_patches(count, ax)					# adds patches to the graph based on type
-		self.set_color()								# sets the color and alpha based on type and health
-
-	# equality is determined by ID
-	def __eq__(self, other):
-		if type(other) == str: return self.ID == other
-		return self.ID == other.ID
-
-	def __repr__(self):
-		return "'{}'".format(self.ID)
-
-	# creates and adds all units to the graph
-	def create_patches(self, count, ax):
-		if self.unit_type == FILTER:
-			wedge = Wedge((self.x,self.y), .2, rotate(0), rotate(360), width=0.07)
-
-			self.polygons.append(wedge)
-			self.patches.append(ax.add_patch(wedge))
-			self.set_wedge_shape()
-
-		elif self.unit_type == ENCRYPTOR:
-			inner_wedge = Wedge((self.x,self.y), .12, rotate(0), rotate(360), width=0.03)
-			outer_wedge = Wedge((self.x,self.y), .37, rotate(0), rotate(360), width=0.15)
-
-			self.polygons.append(inner_wedge)
-			self.polygons.append(outer_wedge)
-			self.patches.append(ax.add_patch(inner_wedge))
-			self.patches.append(ax.add_patch(outer_wedge))
-			self.set_wedge_shape()
-
-		elif self.unit_type == DESTRUCTOR:
-			inner_wedge = Wedge((self.x,self.y), .2, rotate(0), rotate(360), width=0.07)
-			outer_wedge = Wedge((self.x,self.y), .45, rotate(0), rotate(360), width=0.01)
-
-			self.polygons.append(inner_wedge)
-			self.polygons.append(outer_wedge)
-			self.patches.append(ax.add_patch(inner_wedge))
-			self.patches.append(ax.add_patch(outer_wedge))
-			self.set_wedge_shape()
-
-		elif self.unit_type == PING or \
-			 self.unit_type == EMP or \
-			 self.unit_type == SCRAMBLER:
-				verts = GET_VERTS[self.unit_type](self.x, self.y)
-				polygon = Polygon(verts, True)
-
-				self.polygons.append(polygon)
-				self.patches.append(ax.add_patch(polygon))
-				self.check_stability(count, ax)
-
-	# returns a radius based upon the stability and max stability of a mobile unit
-	def hp_to_r(self, stability):
-		return min((stability - MAX_HP[self.unit_type])/50, .5)
-
-	# returns an angle based upon the stability and max stability of a static unit
-	def hp_to_angle(self, stability):
-		return int(rotate(360 * (stability / MAX_HP[self.unit_type])))
-
-	# sets the wedge angle based upon a static unit's stability
-	def set_wedge_shape(self):
-		angle = self.hp_to_angle(self.stability)
-		for patch in self.patches:
-			patch.set_theta2(angle)
-
-	# sets the postition of a unit on the graph
-	def set_pos(self, x, y):
-		self.x = x
-		self.y = y
-		for patch in self.patches:
-			if type(patch) == Polygon: patch.set_xy([(x, y) for (x,y) in GET_VERTS[self.unit_type](x, y)])
-			elif type(patch) == Circle: patch.center = x, y
-
-	# sets the color of a unit based on type
-	def set_color(self):
-		for patch in self.patches:
-			patch.set_color(self.color[self.owner])
-			patch.set_antialiased(True)
-
-			if self.unit_type == EMP or \
-			   self.unit_type == SCRAMBLER:
-				patch.set_fill(False)
-
-		if self.unit_type == ENCRYPTOR:
-			self.patches[1].set_alpha(0.3)
-
-		if self.stability > MAX_HP[self.unit_type]:
-			self.patches[1].set_fill(False)
-			self.patches[1].set_alpha(0.5)
-
-	# checks the stability and if greater than max for a mobile unit adds a new Circle
-	def check_stability(self, count, ax):
-		if self.stability > MAX_HP[self.unit_type]:
-			if len(self.patches) == 1:
-				extra_wedge = Circle((self.x,self.y), self.hp_to_r(self.stability), linewidth=4)
-				self.patches.append(ax.add_patch(extra_wedge))
-				self.polygons.append(extra_wedge)
-			else:
-				self.patches[1].set_radius(self.hp_to_r(self.stability))
-
-			if count != 1:
-				self.patches[1].set_visible(False)
-		else:
-			if len(self.patches) > 1:
-				self.polygons[1].set_visible(False)
-
-	# updates all the values of a unit (count is necessary otherwise alpha is messed up)
-	def update(self, x, y, stability, p_index, ID, count, ax):
-		self.stability = stability
-
-		if self.unit_type == FILTER or \
-		   self.unit_type == ENCRYPTOR or \
-		   self.unit_type == DESTRUCTOR:
-			self.set_wedge_shape()
-
-		elif self.unit_type == PING or \
-			 self.unit_type == EMP or \
-			 self.unit_type == SCRAMBLER:
-				self.set_pos(x,y)
-				self.check_stability(count, ax)
-
-		self.set_color()
-
-	# removes the unit from the graph
-	def remove(self):
-		for polygon in self.polygons:
-			polygon.remove()
-
-
-# holds all units (patches) and handles their creation/destruction on the board
+# returns the outline of a wedge around (0, 0), there are only a few hundred different ones so they are reused
+@functools.lru_cache(maxsize=None)
+def wedge_path(r, width, theta2):
+	return Wedge((0, 0), r, rotate(0), theta2, width=width).get_path()
+
+# returns the outline of a circle around (0, 0)
+@functools.lru_cache(maxsize=None)
+def circle_path(r):
+	return Path.circle((0, 0), r)
+
+# returns the outline of a mobile unit around (0, 0)
+@functools.lru_cache(maxsize=None)
+def unit_path(unit_type):
+	return Polygon(GET_VERTS[unit_type](0, 0), closed=True).get_path()
+
+# returns the rgba values of a color
+@functools.lru_cache(maxsize=None)
+def rgba(color, alpha=1):
+	return to_rgba(color, alpha)
+
+# returns an angle based upon the stability and max stability of a static unit
+def hp_to_angle(unit_type, stability):
+	return int(rotate(360 * (stability / MAX_HP[unit_type])))
+
+# returns a radius based upon the stability and max stability of a mobile unit
+def hp_to_r(unit_type, stability):
+	return min((stability - MAX_HP[unit_type])/50, .5)
+
+
+# one collection that draws the same part (eg the outer ring of encryptors) of every unit of a type
+# each frame only the positions, outlines and colors change, the collection itself is never recreated
+class UnitLayer:
+	def __init__(self, ax, linewidth=1):
+		self.linewidth = linewidth 			# line width of every outline in this layer
+		self.clear()
+
+		# paths are in data units around (0, 0) and the offsets move them to each unit's position
+		self.collection = PathCollection([], offsets=np.zeros((0, 2)), offset_transform=ax.transData, transform=AffineDeltaTransform(ax.transData))
+		ax.add_collection(self.collection)
+
+	# forget the units of the last frame
+	def clear(self):
+		self.offsets = []
+		self.paths = []
+		self.faces = []
+		self.edges = []
+
+	# adds a unit's outline at x,y
+	def add(self, x, y, path, color, fill=True, alpha=1):
+		self.offsets.append((x, y))
+		self.paths.append(path)
+		self.faces.append(rgba(color, alpha) if fill else (0, 0, 0, 0))
+		self.edges.append(rgba(color, alpha))
+
+	# pushes the units added since clear() to the collection
+	def draw(self):
+		self.collection.set_paths(self.paths)
+		self.collection.set_offsets(np.array(self.offsets, dtype=float).reshape(-1, 2))
+		self.collection.set_facecolor(self.faces)
+		self.collection.set_edgecolor(self.edges)
+		self.collection.set_linewidth(self.linewidth)
+
+
+# holds the layers every unit is drawn with and the labels for locations with more than one unit
 class PatchWrapper:
-	def __init__(self):
-		self.units = {}		# stores every unit currently on the board with each ID as the key
-		self.loc = {}		# stores the number of units at a location with each location tuple (x,y) as the key
-		self.lbls = []		# stores the text labels if a location has more than 1 unit
-
-	# creates a unit and stores it in self.units
-	def create_unit(self, unit_type, pos, stability, p_index, ID, count, ax):
-		x,y = pos
-		self.units[ID] = Unit(unit_type, x, y, stability, p_index, ID, count, ax)
-
-	# removes a unit by ID from both the board and self.units
-	def remove_unit(self, ID):
-		for key, val in self.units.items():
-			if val == ID:
-				self.units[ID].remove()
-				self.units.pop(ID, None)
-				break
-
-	# clears the entire board - not used anymore (very inefficient mode of updating)
-	def clear_board(self):
+	def __init__(self, ax):
+		self.ax = ax 					# reference to the board ax
+		self.loc = {}					# stores the number of units at a location with each location tuple (x,y) as the key
+		self.lbls = []					# pool of text labels for locations with more than 1 unit, unused ones are hidden
+		self.color = {1:'C0', 2:'r'}	# constants for player color
+
+		# one layer per part of a unit, in the order they are drawn
+		self.layers = {}
+		for unit_type in [FILTER, ENCRYPTOR, DESTRUCTOR]:
+			for part in range(len(WEDGES[unit_type])):
+				self.layers[(unit_type, part)] = UnitLayer(ax)
+		for unit_type in [PING, EMP, SCRAMBLER]:
+			self.layers[(unit_type, 0)] = UnitLayer(ax)
+			self.layers[(unit_type, SHIELD)] = UnitLayer(ax, linewidth=4)
+
+	# moves every layer to the units given by the engine
+	def update_units(self, units):
+		for layer in self.layers.values():
+			layer.clear()
 		self.loc = {}
 
-		for ID in self.units:
-			self.units[ID].remove()
-		
-		self.units = {}
-		self.remove_lbls()
-
-	# removes all number labels from the board and from self.lbls
-	def remove_lbls(self):
-		for lbl in self.lbls:
-			lbl.remove()
-		self.lbls = []
-
-	# removes all previous labels and creates new ones at locations with more than one unit, then resets self.loc
-	def update_lbls(self, ax):
-		self.remove_lbls()
-		for pos, val in self.loc.items():
-			if val > 1:
-				self.plot_text(val, pos, ax)
-		self.loc = {}
+		for unit_type, (x, y), stability, p_index, ID in units:
+			# update the board locations count of units
+			count = self.loc.get((x,y), 0) + 1
+			self.loc[(x,y)] = count
+
+			color = self.color[p_index]
+			upgraded = stability > MAX_HP[unit_type]
+
+			if unit_type in WEDGES:
+				# static units are rings that deplete as they lose stability
+				angle = hp_to_angle(unit_type, stability)
+				for part, (r, width) in enumerate(WEDGES[unit_type]):
+					if part == 1 and upgraded:
+						self.layers[(unit_type, part)].add(x, y, wedge_path(r, width, angle), color, fill=False, alpha=0.5)
+					elif part == 1 and unit_type == ENCRYPTOR:
+						self.layers[(unit_type, part)].add(x, y, wedge_path(r, width, angle), color, alpha=0.3)
+					else:
+						self.layers[(unit_type, part)].add(x, y, wedge_path(r, width, angle), color)
+			else:
+				self.layers[(unit_type, 0)].add(x, y, unit_path(unit_type), color, fill=unit_type == PING)
 
-	# updates all units
-	def update_units(self, units, ax):
-		ids = [u[4] for u in units]
+				# a circle shows how much extra stability a mobile unit has, only drawn once per location
+				if upgraded and count == 1:
+					self.layers[(unit_type, SHIELD)].add(x, y, circle_path(hp_to_r(unit_type, stability)), color, fill=False, alpha=0.5)
 
-		# get all units that are no longer on the board
-		# (you cannot use the engines remove since using the slider does not remove them)
-		remove = []
-		for unit in self.units.values():
-			if unit not in ids:
-				remove.append(unit.ID)
+		for layer in self.layers.values():
+			layer.draw()
 
-		# remove all the units (cannot do it from the above loop - RuntimeError)
-		for ID in remove:
-			self.remove_unit(ID)
+	# shows the number of units at every location with more than one unit, reusing the labels from the last frame
+	def update_lbls(self):
+		stacked = [(pos, val) for pos, val in self.loc.items() if val > 1]
 
-		# loop through all the units given by the engine
-		for unit_raw in units:
-			unit_type, (x, y), stability, p_index, ID = unit_raw
+		while len(self.lbls) < len(stacked):
+			self.lbls.append(self.ax.text(0, 0, '', fontsize=10))
 
-			# update the board locations count of units
-			try:
-				self.loc[(x,y)] += 1
-			except KeyError:
-				self.loc[(x,y)] = 1
-
-			# if a unit already exists, update it. If not, create it
-			try:
-				self.units[ID].update(x, y, stability, p_index, ID, self.loc[(x,y)], ax)
-			except KeyError:
-				self.create_unit(unit_type, (x,y), stability, p_index, ID, self.loc[(x,y)], ax)
+		for lbl, ((x, y), val) in zip(self.lbls, stacked):
+			lbl.set_position((x+.4, y-.4))
+			lbl.set_text(str(val))
+			lbl.set_visible(True)
 
+		for lbl in self.lbls[len(stacked):]:
+			lbl.set_visible(False)
 
-	# adds the count lable to a position on the board
-	def plot_text(self, txt, pos, ax):
-		x,y = pos
-		self.lbls.append(ax.text(x+.4, y-.4, str(txt), fontsize=10))
-
-	# return all the patches that need to be updated every animation
+	# return all the artists that need to be updated every animation
 	def values(self):
-		return [patch for unit in self.units.values() for patch in unit.patches]
+		return [layer.collection for layer in self.layers.values()] + self.lbls
 
 
 # this class is for the right side (information side) except for the plot (see Plot class)
 class Info:
 	def __init__(self, endStats, ax, slider_exists=False):
-		self.lbls = []											# holds every text object that needs to be updated
+		self.lbls = []											# holds every text object that needs to be updated, they are reused every frame
+		self.values = {}										# the text objects for each data value, keys are (data type, player index)
 		self.color = {True:'C0', False:'r', 1:'C0', 2:'r'}		# color reference based on player index
 		self.ax = ax 											# reference to the right plt axes
 
@@ -560,17 +497,21 @@ class Info:
 		self.hide_graph()						# remove everything from the ax
 		self.disp_reference(slider_exists)		# display the keyboard reference
 		self.disp_static(endStats)				# display text that won't change
+		self.create_lbls()						# create the text objects for everything that changes
 
-	# adds a data value to the information page (health, cores, etc)
-	def add_data(self, d_dype, p_index, data, fontsize=14):
-		self.lbls.append(self.ax.text(self.x_pos[p_index]+.15, self.y_pos[d_dype], str(data), fontsize=fontsize, verticalalignment='bottom', horizontalalignment='left'))
+	# creates a text object for every data value (health, cores, etc) and the winner
+	def create_lbls(self):
+		for d_type, pos in self.y_pos.items():
+			if type(d_type) == str:
+				for p_index in [1, 2]:
+					self.values[(d_type, p_index)] = self.ax.text(self.x_pos[p_index]+.15, pos, '', fontsize=14, verticalalignment='bottom', horizontalalignment='left')
 
-	# clear all dynamic text
-	def clear_info(self):
-		for lbl in self.lbls:
-			lbl.remove()
+		self.winner_lbl = self.ax.text(.5, .67, '', verticalalignment='bottom', horizontalalignment='center', fontsize=24)
+		self.lbls = list(self.values.values()) + [self.winner_lbl]
 
-		self.lbls = []
+	# sets a data value on the information page (health, cores, etc)
+	def set_data(self, d_type, p_index, data):
+		self.values[(d_type, p_index)].set_text(str(data))
 
 	# display all text that won't change
 	def disp_static(self, endStats):
@@ -599,39 +540,43 @@ class Info:
 		self.ax.text(.8, .075, 'Pause and Play\nNext/Previous Frame\nNext/Previous Turn\nChange Speed\nFast-Fwd', fontsize=12, verticalalignment='bottom', horizontalalignment='right')
 
 		# if the slider doesn't exist, don't show the prompt for it
-		if not BLIT and slider_exists:
+		if slider_exists:
 			self.ax.text(.5, .03, 'You can also scrub the turn slider with your mouse', fontsize=12, verticalalignment='bottom', horizontalalignment='center')
 
-	# remove previous information and add all new data
+	# replace the previous information with the new data
 	def update(self, p1Stats, p2Stats):
-		self.clear_info()
+		self.winner_lbl.set_text('')
 
-		self.add_data('health', 1, int(p1Stats[0]))
-		self.add_data('cores', 1, p1Stats[1])
-		self.add_data('bits', 1, p1Stats[2])
-		self.add_data('time', 1, p1Stats[3])
+		self.set_data('health', 1, int(p1Stats[0]))
+		self.set_data('cores', 1, p1Stats[1])
+		self.set_data('bits', 1, p1Stats[2])
+		self.set_data('time', 1, p1Stats[3])
 
-		self.add_data('health', 2, int(p2Stats[0]))
-		self.add_data('cores', 2, p2Stats[1])
-		self.add_data('bits', 2, p2Stats[2])
-		self.add_data('time', 2, p2Stats[3])
+		self.set_data('health', 2, int(p2Stats[0]))
+		self.set_data('cores', 2, p2Stats[1])
+		self.set_data('bits', 2, p2Stats[2])
+		self.set_data('time', 2, p2Stats[3])
 
 	# if the end of game is reached, show the winner
 	def show_winner(self):
 		try:
-			self.lbls.append(self.ax.text(.5, .67, '{} wins!'.format(self.winner_name), color=self.color[self.winner], verticalalignment='bottom', horizontalalignment='center', fontsize=24))
-		except TypeError:
+			self.winner_lbl.set_text('{} wins!'.format(self.winner_name))
+			self.winner_lbl.set_color(self.color[self.winner])
+		except AttributeError:
 			print ('tried and failed to show winner - no endStats')
 
 
 # this contains all data for the health plot on the right side
 class Plot:
-	def __init__(self, data, ax, frame=0):
+	def __init__(self, data, ax, lbl_ax, frame=0):
 		ax.clear() 													# clear the plot
+		lbl_ax.clear()												# clear the old x_labels
+		lbl_ax.axis('off')
 
 		self.ax = ax 												# reference to the ax containing the plot
 		self.data = data 											# all known health data, tuple containing two lists, player1 and player2 healths
 		self.lines = []												# the lines of the plot
+		self.lbls = []												# the x_labels, drawn as text on lbl_ax so they can be updated without redrawing the axis
 
 		self.ax.set_ylabel('Health')								# set the y_axis label
 		self.ax.set_xlabel('Frame')									# set the x_axis label
@@ -645,6 +590,14 @@ class Plot:
 		self.lines[1].set_xdata(list(range(0, 100)))				# set the x_range for the line to always be 100
 
 		self.ax.set_xlim(0, 100)									# set the x_range for the plot to always be 100
+		self.ax.set_xticks(list(range(0, 101, 20)))					# the x_labels always sit at the same place
+		self.ax.tick_params(axis='x', labelcolor='none')			# hide the axis' own labels, but keep their space
+
+		# the labels are below the plot, so they belong to lbl_ax (the whole window) which gets cleared before each frame is blitted
+		pad = (plt.rcParams['xtick.major.size'] + plt.rcParams['xtick.major.pad']) / 72
+		lbl_transform = self.ax.get_xaxis_transform() + ScaledTranslation(0, -pad, self.ax.figure.dpi_scale_trans)
+		for x in range(0, 101, 20):
+			self.lbls.append(lbl_ax.text(x, 0, '', transform=lbl_transform, fontsize=plt.rcParams['xtick.labelsize'], verticalalignment='top', horizontalalignment='center'))
 
 		self.update(frame)											# update the plot
 
@@ -668,7 +621,8 @@ class Plot:
 			line1 = nulls + self.data[0][x_0:frame]
 			line2 = nulls + self.data[1][x_0:frame]
 
-		self.ax.set_xticklabels(list(range(x_0, frames+1, 20)))		# updates the x_labels
+		for lbl, val in zip(self.lbls, range(x_0, frames+1, 20)):	# updates the x_labels
+			lbl.set_text(str(val))
 
 		self.lines[0].set_ydata(line1)								# set the data for line1
 		self.lines[1].set_ydata(line2)								# set the data for line2
@@ -676,7 +630,7 @@ class Plot:
 
 # this class contains all information regarding the entire window
 class Graph:
-	def __init__(self, data, frames_in_turn, healths, writers, keep_trying, save='', fh=None):
+	def __init__(self, data, frames_in_turn, healths, writers, keep_trying, save='', fh=None, show=True):
 
 		# pretty clear, if no data, raise an Error
 		if len(data) < 1:
@@ -684,6 +638,8 @@ class Graph:
 
 		self.fh = fh 																# reference to file handler
 		self.real_time = False if self.fh == None else True 						# tracks whether real-time
+		self.interactive = save == '' and show										# whether the window is shown (export_replays.py draws frames itself)
+		self.blit = BLIT and self.interactive and not self.real_time				# only redraw what changes (real-time redraws everything, saving draws whole frames anyway)
 
 		plt.style.use('dark_background')											# sets black background
 
@@ -691,8 +647,9 @@ class Graph:
 		self.fig, ax = plt.subplots(nrows=1, ncols=2)								# splits the plot into two halves and gets the references
 		self.board_ax, self.info_ax = ax 											# assign left and right side references
 		self.plot_ax = self.fig.add_subplot(324)									# add the plot and assing it's reference
+		self.lbl_ax = self.fig.add_axes([0, 0, 1, 1], zorder=-1)					# the whole window, for labels outside of the other axes (behind them so it never takes mouse clicks)
 
-		self.general_init(data, frames_in_turn, healths)							# handles general initialization (called again if in real-time)
+		self.general_init(data, frames_in_turn, healths)							# handles general initialization
 
 		self.head = (0,-1)															# tracks the current turn, frame pair
 		self.end_of_game = False													# end of game flag
@@ -700,7 +657,7 @@ class Graph:
 		self.single_advance = False													# true when user is scrubbing, but still want to move forward one frame
 		self.stop_slider_evt = False												# stop the slider event from triggereing when the code changes it
 
-		self.patches = PatchWrapper()												# creates the PatchWrapper object
+		self.patches = PatchWrapper(self.board_ax)									# creates the PatchWrapper object
 
 		self.stream = self.data_stream()											# gets a data_reference - this passes all data to the animation
 
@@ -710,18 +667,18 @@ class Graph:
 
 		# if in real-time, use a generator function to update number of frames, otherwise frames is static
 		if not self.real_time:
-			self.anim = animation.FuncAnimation(self.fig, self.update, init_func=self.init, frames=self.num_frames, interval=100, blit=BLIT, repeat=False)
+			self.anim = animation.FuncAnimation(self.fig, self.update, init_func=self.init, frames=self.num_frames, interval=100, blit=self.blit, repeat=False)
 		else:
 			self.frame_generator = self.gen_frames()
-			self.anim = animation.FuncAnimation(self.fig, self.update, init_func=self.init, frames=self.frame_generator, interval=100, blit=BLIT, repeat=False)
+			self.anim = animation.FuncAnimation(self.fig, self.update, init_func=self.init, frames=self.frame_generator, interval=100, blit=self.blit, repeat=False)
 
 		self.change_play_speed('3')													# initialize the playback speed ('3' is default)
 
 		# if you don't save, show the plot. Otherwise save the animation (nothing is shown)
-		if save == '':
-			self.show()
-		else:
+		if save != '':
 			self.save_animation(save, writers, keep_trying)
+		elif show:
+			self.show()
 
 	# saves all animations passed from the command line
 	def save_animation(self, save_name, writers, keep_trying):
@@ -815,7 +772,7 @@ class Graph:
 					return False
 			return False
 
-	# extension of __init__(), called every frame when real-time
+	# extension of __init__()
 	def general_init(self, data, frames_in_turn, healths):
 		self.data = data 													# dict with keys of (turn, frame) tuple and values of a Frame object
 		self.frames_in_turn = frames_in_turn								# dict with keys of turn and values of number of frames in that turn
@@ -823,25 +780,32 @@ class Graph:
 		self.num_frames = len(self.data)									# the number of total frames
 		self.slider_exists = False											# begin by assuming the slider does not exist
 
-		self.plot = Plot(self.healths, self.plot_ax)						# create the Plot object (plots the health)
+		self.plot = Plot(self.healths, self.plot_ax, self.lbl_ax)			# create the Plot object (plots the health)
 
 		# try and get endStats, if not then file is still being created by engine (game is still running)
+		if not self.end_stats_init():
+			self.info = Info(None, self.info_ax)							# endStats doesn't exist, create Info with default values
+
+	# adds the slider and the Info with endStats once the whole game is known, returns False if the game is still running
+	def end_stats_init(self):
 		try:
 			last_frame = max(self.data, key=lambda f: (f[0], f[1]))			# the last frame of the entire match (single number)
 			endStats = self.data[last_frame].data['endStats']				# here is where the error would be thrown - if endStats exists
+		except KeyError as e:
+			return False
 
-			# From here on we know we have all data for entire game - endStats exists
+		# From here on we know we have all data for entire game - endStats exists
 
-			# if blit is on, do not create the slider
-			if not BLIT:
-				self.slider = Slider(self.fig.add_axes([0.6, 0.03, 0.3, 0.03]), 'Turn Slider', 0, self.num_frames, valfmt='%1i', valstep=1, color='w')
-				self.slider.on_changed(self.slider_active)
-				self.slider_exists = True 									# tracks whether the slider exists
+		# when blitting, the slider is drawn with the rest of the animation instead of redrawing the whole window
+		self.slider = Slider(self.fig.add_axes([0.6, 0.03, 0.3, 0.03]), 'Turn Slider', 0, self.num_frames, valfmt='%1i', valstep=1, color='w')
+		self.slider.drawon = self.interactive and not self.blit
+		self.slider.on_changed(self.slider_active)
+		self.slider_exists = True 										# tracks whether the slider exists
 
-			self.info = Info(endStats, self.info_ax, True)					# create the Info (right side) with endStates information
-			self.real_time = False											# not longer running in real-time
-		except KeyError as e:
-			self.info = Info(None, self.info_ax)							# endStats doesn't exist, create Info with default values
+		self.info_ax.clear()											# remove the Info made while the game was running
+		self.info = Info(endStats, self.info_ax, True)					# create the Info (right side) with endStates information
+		self.real_time = False											# not longer running in real-time
+		return True
 
 	# change the interval speed between frames
 	def change_play_speed(self, speed):
@@ -902,7 +866,7 @@ class Graph:
 			self.change_play_speed(speed)
 
 		# only update the slider if it exists
-		if not BLIT and self.slider_exists:
+		if self.slider_exists:
 			self.update_slider(self.head)
 		self.update()							# something was changed, so update the board
 
@@ -964,7 +928,7 @@ class Graph:
 		if self.head[1] < 0: self.head = self.head[0], -1
 
 		# only update the slider if it exits
-		if not BLIT and self.slider_exists:
+		if self.slider_exists:
 			self.update_slider(self.head)
 		self.single_advance = False				# reset the single advance (used with arrow keys)
 
@@ -990,7 +954,7 @@ class Graph:
 
 
 		# only update the slider if it exits
-		if not BLIT and self.slider_exists:
+		if self.slider_exists:
 			self.update_slider(self.head)
 		self.single_advance = False				# reset the single advance (used with arrow keys)
 
@@ -999,18 +963,19 @@ class Graph:
 	def data_stream(self):
 		while True:
 
-			# everything in this block (real-time) is extrememly inefficient, becuase it has to constantly load new data
+			# in real-time, only the frames the engine has added since the last tick are read
+			# they go straight into self.data, self.frames_in_turn and self.healths (the replay's own dicts and lists)
 			if self.real_time:
-				self.info_ax.clear()															# clear the inforation side
-
-				self.fh.load_files(1,False,args['file']) 										# load latest replay (again)
-				replay = self.fh.get_last_replay()												# get latest replay (again)
+				replay = self.fh.get_last_replay()												# the replay being followed
 
 				# user paused game, don't advance
 				if not self.is_manual:
 					self.advance()
 
-				self.general_init(replay.frames, replay.frames_in_turn, replay.healths)			# call general initialization
+				if replay.update() > 0:
+					self.num_frames = len(self.data)											# the number of frames known so far
+					if replay.finished:
+						self.end_stats_init()													# the game is over, add the slider and the winner
 
 				# this is for the first call - cannot send before yield is reached (function called)
 				try:
@@ -1025,8 +990,8 @@ class Graph:
 			p2Stats = self.data[self.head]['p2Stats']
 
 			units = self.cache_units(p1Units, 1) + self.cache_units(p2Units, 2)						# format the unit data into how it is passed to my functions
-			self.patches.update_units(units, self.board_ax)											# update all the units
-			self.patches.update_lbls(self.board_ax)													# update all the unit count labels
+			self.patches.update_units(units)														# update all the units
+			self.patches.update_lbls()																# update all the unit count labels
 
 			self.info.update(p1Stats, p2Stats)														# update the information board
 			self.plot.update(self.frame_turn_to_val(self.head[0], self.head[1]))					# update the health plot
@@ -1034,11 +999,22 @@ class Graph:
 			self.advance()																			# move the head forward 1
 			self.check_end_of_game()																# if end of game, display winner
 
-			yield self.patches.values() + self.patches.lbls + self.info.lbls + self.plot.lines		# send all dynamic data to the matplotlib animator
+			yield self.patches.values() + self.info.lbls + self.plot.lines + self.plot.lbls + self.slider_artists()		# send all dynamic data to the matplotlib animator
+
+	# draws the frame at head, a (turn, frame) pair, without running the animation (see export_replays.py)
+	def draw_frame(self, head):
+		self.is_manual = False
+		self.head = head
+		next(self.stream)
+
+	# returns the parts of the slider that move, these are blitted with the board
+	def slider_artists(self):
+		if not self.slider_exists:
+			return []
+		return [self.slider.poly, self.slider.valtext] + [line for line in self.slider.ax.lines if line is not self.slider.vline]
 
 	# called by the animator everytime it's interval finishes
 	def update(self, i=0):
-		# self.patches.clear_board()	# inefficient, no longer used
 		return next(self.stream) 		# sends the data to the animator
 
 	# if blit is used, animator requires an init function to get intial graph values
@@ -1129,10 +1105,11 @@ class Graph:
 
 # a simple data storage class to hold the data for a single frame
 class Frame:
-	def __init__(self, t, f, data):
+	def __init__(self, t, f, data, load=None):
 		self.turn = t 					# the turn for this frame
 		self.frame = f 					# the local frame for this frame
-		self.data = data 				# the data for this frame
+		self._data = data 				# the data for this frame
+		self.load = load 				# if data is None, this is called to get it the first time it is used
 
 	def __repr__(self):
 		return ('({}, {})'.format(self.turn, self.frame))
@@ -1140,17 +1117,73 @@ class Frame:
 	def __getitem__(self, key):
 		return self.data[key]
 
+	@property
+	def data(self):
+		if self._data is None:
+			self._data = self.load()
+		return self._data
+
+
+# Works like a dict of (turn, frame) -> Frame, but a frame is only read when its data is used
+# and only the FRAME_WINDOW most recently used frames are kept
+class FrameWindow:
+	def __init__(self, locations, load, size=FRAME_WINDOW):
+		self.locations = locations				# dict, keys are (turn, frame) and values are passed to load to read that frame
+		self.load = load 						# reads the data for a frame from its location
+		self.size = size 						# the number of frames to keep
+		self.window = collections.OrderedDict()	# the most recently used Frame objects, oldest first
+
+	def __len__(self):
+		return len(self.locations)
+
+	def __iter__(self):
+		return iter(self.locations)
+
+	def __contains__(self, key):
+		return key in self.locations
+
+	def __getitem__(self, key):
+		try:
+			frame = self.window.pop(key)
+		except KeyError:
+			frame = Frame(key[0], key[1], None, functools.partial(self.load, self.locations[key]))
+
+		self.window[key] = frame
+		if len(self.window) > self.size:
+			self.window.popitem(last=False)
+		return frame
+
+
+# returns the (turn, frame) pairs of frames (anything that can be checked with 'in') in the order they are played
+def frame_order(frames):
+	heads = []
+	head = (0, -1)
+	while head in frames and len(heads) < len(frames):
+		heads.append(head)
+		if (head[0], head[1]+1) in frames:
+			head = head[0], head[1]+1
+		else:
+			head = head[0]+1, -1
+	return heads
+
 
 # Stores data from a single replay
 class Replay:
-	def __init__(self, f_name):
+	def __init__(self, f_name, live=False):
 		self.fname = f_name 			# the file name of the replay
 		self.ref = None					# stores the raw dict data as a reference
-		self.frames = {}				# dict containing all data, keys are turn, frame tuple with Frame objects as values
+		self.frames = {}				# FrameWindow of all frames, keys are turn, frame tuple with Frame objects as values
 		self.frames_in_turn = {}		# number of frames in each turn
 		self.healths = ([], [])			# contains the healths for player1 and player2
+		self.offset = 0					# where the part of the file that hasn't been read starts (when following a live match)
+		self.finished = False			# whether the last frame (with endStats) has been read (only tracked when following a live match)
 
-		self.load_data()				# handles loading all the data from file into python variables
+		# a live replay is still being written by the engine, update() reads whatever was added to it
+		if live:
+			self.frames = FrameWindow({}, functools.partial(replay_stream.read_frame, self.fname, fields=FRAME_FIELDS))
+			self.update()
+		else:
+			self.load_data()			# handles loading all the data from file into python variables
 
 	def __eq__(self, other):
 		return self.fname == other.fname
@@ -1161,32 +1194,64 @@ class Replay:
 	def __repr__(self):
 		return self.__string()
 
-	# loads all data from a replay into the python variables
+	# loads everything but the frames themselves from a replay into the python variables
+	# frames are read from the file when they are drawn, using an index of where each one starts
 	def load_data(self):
-		with open(self.fname) as f:
-			i = 0
-			for line in f:
-				line = line.replace("\n", "")
-				line = line.replace("\t", "")
-
-				if (line != ''):
-					data = json.loads(line)
-
-					try:
-						data['debug']
-						self.ref = data
-					except:
-						turn_num = data['turnInfo'][1]
-						frame_num = data['turnInfo'][2]
-						self.frames[(turn_num, frame_num)] = Frame(turn_num, frame_num, data)
-
-						self.healths[0].append(data['p1Stats'][0])
-						self.healths[1].append(data['p2Stats'][0])
-
-						try:
-							self.frames_in_turn[turn_num] += 1
-						except KeyError:
-							self.frames_in_turn[turn_num] = 1
+		cache = replay_stream.load_cache(self.fname)
+		if cache is not None:
+			self.load_cached(cache)
+			return
+
+		self.ref = replay_stream.read_config(self.fname, use_cache=False)
+		self.frames = FrameWindow({}, functools.partial(replay_stream.read_frame, self.fname, fields=FRAME_FIELDS))
+		self.add_frames(replay_stream.frame_index(self.fname))
+
+	# reads the frames the engine has written since the last call (only the new part of the file), returns how many there were
+	# the new frames are added to frames, frames_in_turn and healths, so anything holding them sees the new data
+	def update(self):
+		entries, finished, self.offset = replay_stream.index_from(self.fname, self.offset)
+		self.finished = self.finished or finished
+
+		if self.ref is None and self.offset > 0:
+			self.ref = replay_stream.read_config(self.fname, use_cache=False)
+
+		self.add_frames(entries)
+		return len(entries)
+
+	# adds frame index entries (see replay_stream.frame_index) to the frames and their healths
+	def add_frames(self, entries):
+		for turn_num, frame_num, offset, p1_health, p2_health in entries:
+			self.frames.locations[(turn_num, frame_num)] = offset
+
+			self.healths[0].append(p1_health)
+			self.healths[1].append(p2_health)
+
+			try:
+				self.frames_in_turn[turn_num] += 1
+			except KeyError:
+				self.frames_in_turn[turn_num] = 1
+
+	# returns every (turn, frame) pair in the order they are played
+	def frame_order(self):
+		return frame_order(self.frames)
+
+	# same as load_data, but the healths come straight from the cache's columns and frames are read from the cache
+	def load_cached(self, cache):
+		self.ref = cache.config
+
+		self.healths[0].extend(cache.stats('p1Stats')[:, 0].tolist())
+		self.healths[1].extend(cache.stats('p2Stats')[:, 0].tolist())
+
+		rows = {}
+		for i, (turn_num, frame_num) in enumerate(cache.turn_info[:, 1:3].tolist()):
+			rows[(turn_num, frame_num)] = i
+
+			try:
+				self.frames_in_turn[turn_num] += 1
+			except KeyError:
+				self.frames_in_turn[turn_num] = 1
+
+		self.frames = FrameWindow(rows, lambda i: cache.frame(i, FRAME_FIELDS))
 
 # handles opening multiple games (replays)
 class FileHandler:
@@ -1205,13 +1270,34 @@ class FileHandler:
 			return None
 		return self.replays[i]
 
+	# returns every replay in the replays folder
+	def replay_files(self):
+		return glob.glob('{}*.replay'.format(REPLAY_DIR))
+
+	# waits until a replay that isn't in known is created (by a match that was just started), then loads it to follow it live
+	# the folder is only listed again when it changes (or every few seconds, in case its modified time is too coarse to tell)
+	def follow_new_replay(self, known, delay=.5, relist=5):
+		known = set(known)
+		last_change = None
+		last_list = 0
+		while True:
+			try:
+				change = os.stat(REPLAY_DIR).st_mtime_ns
+			except OSError:								# the engine hasn't created the replays folder yet
+				change = None
+
+			if change != last_change or time.time() - last_list > relist:
+				last_change = change
+				last_list = time.time()
+				new = [f for f in self.replay_files() if f not in known]
+				if len(new) > 0:
+					break
+			time.sleep(delay)
+
+		self.replays = [Replay(max(new, key=os.path.getctime), live=True)]
+
 	def __latest_replays(self, num=1, a=False):
-		replay_dir = '{}/../../replays/'.format(os.path.dirname(os.path.realpath(__file__)))
-		files = glob.glob('{}*.replay'.format(replay_dir))
-		files = sorted(files, key=os.path.getctime, reverse=True)
-		if a:
-			return files
-		return files[:num]
+		return replay_catalog.latest_replays(num, a, REPLAY_DIR)
 
 	def load_files(self, num=1, a=False, f_names=[]):
 		self.replays = []
@@ -1286,7 +1372,7 @@ def run_match(a1='', a2=''):
 
 def main(args):
 	global BLIT
-	BLIT = args['blit']				# get whether blit is enabled
+	BLIT = not args['no_blit']		# get whether blit is enabled
 	save = args['save']				# get whether  save is enabled
 	writers = args['writers']		# get save modes
 	keep_trying = args['keep_trying']		# get whether to keep trying writer types
@@ -1303,26 +1389,23 @@ def main(args):
 			print ('\n\nWARNING: You specified keep trying writers, but nothing will be saved since this is running real time. Wait for the match to end.')
 
 		fh = FileHandler()																		# create a file handler object
-		fh.load_files(1,False,args['file'])														# load latest replay
-		previous_replay = str(fh.get_last_replay())												# get the replay that was last created
+		known_replays = fh.replay_files()														# the replays from before, the match's replay is the one that isn't here
 
 		if len(args['run_match']) > 1: run_match(args['run_match'][0], args['run_match'][1])	# run the match with both algos specified
 		else: run_match(args['run_match'][0])													# run the match with one algo specified
 
-		# wait to open visualizer until a new replay has been created
-		while str(fh.get_last_replay()) == previous_replay:
-			fh.load_files()
-			time.sleep(.5)
+		# wait to open visualizer until a new replay has been created, from then on only what the engine adds to it is read
+		fh.follow_new_replay(known_replays)
+		replay = fh.get_last_replay()
 
-		# keep trying to load the replay file until it is capable of getting data from it - then start the visualizer
+		# keep reading the replay file until it has a frame in it - then start the visualizer
 		while True:
 			try:
-				fh.load_files(1,False,args['file'])
-				replay = fh.get_last_replay()
 				animatedReplay = Graph(replay.frames, replay.frames_in_turn, replay.healths, writers, keep_trying, fh=fh)		# create our Graph object
 				break
 			except RuntimeError:																		# we raised this error when data was nothing in Graph init()
 				time.sleep(.5)
+				replay.update()
 	else:
 		# here we know the replay file is already created an finished
 